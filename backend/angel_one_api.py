@@ -6,9 +6,10 @@ import pandas as pd
 import time
 warnings.filterwarnings('ignore')
 import logging
-import requests
 import os
-import json
+from data_writer import write_json_atomic
+from symbol_resolver import symbols, download_scrip_master
+from index_history import append_snapshot
 # Configure the logging settings
 logging.basicConfig(
     level=logging.INFO,  # Set the logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
@@ -72,8 +73,7 @@ def order():
     return None
 
 def get_scrips():
-    BASE_URL = 'https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json'
-    data = requests.get(BASE_URL).json()
+    data = download_scrip_master()
     df = pd.DataFrame(data)
     df=df[df['instrumenttype'].isin(['FUTSTK','OPTSTK'])]
     df= df[df['exch_seg'] == 'NFO']
@@ -405,11 +405,14 @@ def write_top_gainers_file(exchange: str = "NSE",client=None) -> str:
     print(f"\n💾 Writing top_gainers.json file...")
     data = get_top_gainers(exchange,client)
     print(f"📊 Data received: count={data.get('count', 0)}")
+    # Store each row's underlying name so readers don't have to resolve it
+    data["gainers"] = symbols.annotate(data.get("gainers") or [])
     path = os.path.join(_ensure_data_dir(), "top_gainers.json")
     print(f"📁 Writing to: {path}")
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    print(f"✅ File written successfully")
+    if write_json_atomic(path, data):
+        print(f"✅ File written successfully")
+    else:
+        print(f"⏭️ Data unchanged, file not rewritten")
     return path
 
 
@@ -417,11 +420,14 @@ def write_top_losers_file(exchange: str = "NSE",client=None) -> str:
     print(f"\n💾 Writing top_losers.json file...")
     data = get_top_losers(exchange,client)
     print(f"📊 Data received: count={data.get('count', 0)}")
+    # Store each row's underlying name so readers don't have to resolve it
+    data["losers"] = symbols.annotate(data.get("losers") or [])
     path = os.path.join(_ensure_data_dir(), "top_losers.json")
     print(f"📁 Writing to: {path}")
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    print(f"✅ File written successfully")
+    if write_json_atomic(path, data):
+        print(f"✅ File written successfully")
+    else:
+        print(f"⏭️ Data unchanged, file not rewritten")
     return path
 
 
@@ -429,11 +435,14 @@ def write_put_call_ratio_file(exchange: str = "NSE",client=None) -> str:
     print(f"\n💾 Writing put_call_ratio.json file...")
     data = get_put_call_ratio(exchange,client)
     print(f"📊 Data received: status={data.get('status', 'unknown')}")
+    if isinstance(data.get("data"), list):
+        data["data"] = symbols.annotate(data["data"])
     path = os.path.join(_ensure_data_dir(), "put_call_ratio.json")
     print(f"📁 Writing to: {path}")
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    print(f"✅ File written successfully")
+    if write_json_atomic(path, data):
+        print(f"✅ File written successfully")
+    else:
+        print(f"⏭️ Data unchanged, file not rewritten")
     return path
 
 
@@ -449,9 +458,16 @@ def write_index_quotes_file(indexes=None,client=None) -> str:
         print(f"✅ {idx}: {result[idx].get('status', 'unknown')}")
     path = os.path.join(_ensure_data_dir(), "index_quotes.json")
     print(f"📁 Writing to: {path}")
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
-    print(f"✅ File written successfully with {len(result)} indexes")
+    if write_json_atomic(path, result):
+        print(f"✅ File written successfully with {len(result)} indexes")
+    else:
+        print(f"⏭️ Data unchanged, file not rewritten")
+    # Every run is a point in the intraday history, even when quotes are unchanged
+    try:
+        recorded = append_snapshot(result)
+        print(f"✅ History recorded for {recorded} indexes")
+    except Exception as e:
+        print(f"⚠️ Could not record index history: {e}")
     return path
 
 
@@ -490,6 +506,14 @@ if __name__ == "__main__":
     else:
         print("✅ Client obtained successfully!")
     
+    # Refresh the symbol master once a day (used to name gainers/losers/PCR rows)
+    if symbols.is_stale():
+        try:
+            print(f"\n📥 Refreshing symbol master...")
+            print(f"✅ Stored {symbols.refresh()} instruments")
+        except Exception as e:
+            print(f"⚠️ Could not refresh symbol master: {e}")
+    
     # Write index quotes file (always called, even if not requested)
     print(f"\n📊 Processing index quotes (always executed)...")
     write_index_quotes_file(args.indexes, client)
@@ -1,13 +1,27 @@
 # app.py (FastAPI)
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
-import csv
-from typing import List, Dict
 import os
-from datetime import datetime
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 # News is served from local CSV; external APIs temporarily disabled
-from cache_manager import cached, CACHE_TTL
+from cache_manager import cached, CACHE_TTL, CacheHeadersMiddleware, RawJSON, EncodedResponse, encode_json
+from snapshot_store import snapshots
+from shared_snapshots import shared_snapshots
+from market_db import market_db, parse_date
+from pcr_view import PCRView, ORDERS
+from pagination import InvalidCursor, encode_cursor, decode_cursor
+from symbol_resolver import symbols
+from news_store import news
+from news_search import news_search
+from live_stream import LiveStream
+from deltas import VersionedView
+from index_history import index_history, INTERVALS as HISTORY_INTERVALS
 
 # Load environment variables
 load_dotenv()
@@ -19,6 +33,12 @@ try:
 except Exception as e:
     print(f"Warning: Could not initialize data files: {e}")
 
+# Seed the market database from the data files on first run
+try:
+    market_db.import_if_empty()
+except Exception as e:
+    print(f"Warning: Could not import data files into the market database: {e}")
+
 app = FastAPI(
     title="Sharada Financial Services API",
     description="Backend API for Sharada Financial Services - Market data, news, and AI summarization",
@@ -45,8 +65,43 @@ app.add_middleware(
     expose_headers=["*"],  # Expose all headers
 )
 
+# Age / X-Cache headers for cached endpoints
+app.add_middleware(CacheHeadersMiddleware)
+
+
+@app.on_event("startup")
+def start_snapshot_watcher():
+    # Parse data files once and reload them in the background as they change
+    # (or, with SHARED_SNAPSHOTS, map what the loading worker published)
+    shared_snapshots.start()
+    # Dataset versions, the news CSV and the history listing are kept
+    # current by threads, so handlers and cache checks only read memory
+    market_db.start()
+    news.start()
+    index_history.start()
+
+
+@app.on_event("startup")
+async def start_live_stream():
+    # After the snapshot watcher: builds the stream's datasets from the loaded snapshots
+    await live.start()
+
+
+@app.on_event("shutdown")
+def stop_snapshot_watcher():
+    shared_snapshots.stop()
+    market_db.stop()
+    news.stop()
+    index_history.stop()
+
+
+def _upper(value: str) -> str:
+    """Canonical form of symbols, indices and exchanges (used for cache keys)"""
+    return value.strip().upper()
+
+
 @app.get("/")
-def root():
+async def root():
     return {
         "message": "Sharada Financial Services API",
         "version": "1.0.0",
@@ -54,139 +109,183 @@ def root():
     }
 
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "healthy", "service": "Sharada Financial API"}
 
 @app.get("/market-news")
-@cached(ttl=CACHE_TTL["NEWS"])
-def market_news(limit: int = 20):
-    # Alias to CSV-backed news
-    return marathi_news(limit)
+async def market_news(limit: int = 20, source: str = None, cursor: str = None):
+    # Same articles as /marathi-news: reuse its cache entries rather than keeping a copy
+    return await marathi_news(limit=limit, source=source, cursor=cursor)
 
 # Marathi/English combined news from CSV (local scrape)
 @app.get("/marathi-news")
-@cached(ttl=CACHE_TTL["NEWS"])
-def marathi_news(limit: int = 20):
-    try:
-        csv_path = os.path.join(os.path.dirname(__file__), "financial_news_marathi_api.csv")
-        print(csv_path)
-        articles: List[Dict] = []
-        with open(csv_path, mode="r", encoding="utf-8", newline="") as f:
-            reader = csv.DictReader(f)
-            # Normalize header names to handle BOM and whitespace
-            if reader.fieldnames:
-                reader.fieldnames = [
-                    (name or "").lstrip("\ufeff").strip() for name in reader.fieldnames
-                ]
-            for row in reader:
-                # Normalize per-row keys in case of BOM
-                if "\ufeffSource" in row and "Source" not in row:
-                    row["Source"] = row.get("\ufeffSource")
-                # Validate essential fields and skip malformed rows
-                source = (row.get("Source") or "").strip()
-                en_title = (row.get("English Title") or "").strip()
-                mr_title = (row.get("Marathi Title") or "").strip()
-                url = (row.get("URL") or "").strip()
-                if not (source and (en_title or mr_title) and url):
-                    continue
-                articles.append({
-                    "source": source,
-                    "english_title": en_title,
-                    "marathi_title": mr_title,
-                    "url": url
-                })
-        articles = articles[:limit]
-        return {"count": len(articles), "articles": articles}
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="financial_news_marathi_api.csv not found")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading Marathi news: {str(e)}")
+@cached(
+    ttl=CACHE_TTL["NEWS"],
+    depends_on=[news.dependency()],
+    as_response=True,
+    normalize={"source": lambda value: value.strip().lower()},
+)
+async def marathi_news(limit: int = 20, source: str = None, cursor: str = None):
+    """
+    Latest scraped news, newest first
 
-    
+    Args:
+        limit: Articles per page (1-1000)
+        source: Only articles from this source, e.g. "Moneycontrol"
+        cursor: next_cursor from the previous page
+    """
+    try:
+        if not 1 <= limit <= 1000:
+            raise HTTPException(status_code=400, detail="limit must be 1-1000")
+        page = news.query(limit, source, cursor)
+        if page is None:
+            raise HTTPException(status_code=404, detail="financial_news_marathi_api.csv not found")
+        articles, matched, next_cursor = page
+        return {"count": len(articles), "matched": matched, "next_cursor": next_cursor, "articles": articles}
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/news/search")
+@cached(
+    ttl=CACHE_TTL["NEWS"],
+    depends_on=[news.dependency()],
+    as_response=True,
+    normalize={"q": lambda value: " ".join(value.split())},
+)
+async def news_search_endpoint(q: str, limit: int = 20, offset: int = 0):
+    """
+    Search English and Marathi headlines, best BM25 match first
 
-DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+    Args:
+        q: Words to search for, e.g. "Adani ports" or "सेन्सेक्स"
+        limit: Results per page (1-100)
+        offset: Results to skip
+    """
+    if not 1 <= limit <= 100 or offset < 0:
+        raise HTTPException(status_code=400, detail="limit must be 1-100 and offset >= 0")
+    # Waits on the index lock while the news watcher merges articles
+    results, matched = await run_in_threadpool(news_search.search, q, limit, offset)
+    return {"query": q, "count": len(results), "matched": matched, "results": results}
 
 
 def _read_json_file(filename: str):
-    path = os.path.join(DATA_DIR, filename)
-    if not os.path.exists(path):
-        # Try to initialize data files if missing
-        try:
-            from init_data import init_data_files
-            init_data_files()
-            # Try to read again after initialization
-            if os.path.exists(path):
-                with open(path, "r", encoding="utf-8") as f:
-                    return json.load(f)
-        except Exception:
-            pass
-        # If still missing, return default empty structure
+    """Parsed contents of data/<filename> from the snapshot store (shared, don't modify)"""
+    snapshot = snapshots.get(filename)
+    if snapshot is None:
+        # Missing file: return default empty structure
         from init_data import DEFAULT_DATA
         return DEFAULT_DATA.get(filename, {"status": "unavailable", "reason": "Data file not found"})
-    try:
-        import json
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading {filename}: {str(e)}")
+    return snapshot.data
 
 
 # File-backed endpoints (Top gainers/losers, PCR, Index quotes)
-def _extract_stock_name(trading_symbol: str) -> str:
-    """Extract clean stock name from trading symbol like 'ADANIGREEN25NOV25FUT'"""
-    if not trading_symbol:
-        return "N/A"
-    
-    import re
-    # Pattern examples: ADANIGREEN25NOV25FUT, VBL25NOV25FUT, SAIL25NOV25FUT
-    # Strategy: Remove date pattern (digits + 3 letters + digits) + FUT
-    
-    # First remove the date pattern with FUT: 25NOV25FUT
-    cleaned = re.sub(r'\d{2}[A-Z]{3}\d{2}FUT$', '', trading_symbol)
-    
-    # If that didn't work, try removing just FUT suffix
-    if cleaned == trading_symbol:
-        cleaned = re.sub(r'FUT$', '', trading_symbol)
-    
-    # Remove any trailing numbers that might remain
-    cleaned = re.sub(r'\d+$', '', cleaned)
-    
-    # Clean up and return
-    result = cleaned.strip()
-    
-    # Debug: print if extraction seems wrong
-    if not result or len(result) < 2:
-        print(f"Warning: Symbol extraction for '{trading_symbol}' resulted in '{result}', using original")
-        return trading_symbol[:20]  # Return first 20 chars of original as fallback
-    
-    return result
+# Each keeps its builds for the last few snapshot versions, so polls with
+# ?since_version= can be answered with only the rows that changed
+
+
+def _movers(key: str):
+    """Builder of the frontend's shape (top 10 rows) for a top_gainers/top_losers.json payload"""
+    def build(data):
+        if not isinstance(data, dict):
+            return None
+        items = [] if data.get("error") else data.get(key) or []
+        top = items[:10]  # Limit to top 10
+        rows = [
+            {
+                "symbol": name,
+                "price": float(item.get("ltp", 0)),
+                "change": float(item.get("netChange", 0)),
+                "changePercent": float(item.get("percentChange", 0)),
+                "symbolToken": item.get("symbolToken")
+            }
+            for item, name in zip(top, symbols.names(top))
+        ]
+        return {"count": len(items), "rows": rows, "exchange": data.get("exchange"), "error": data.get("error")}
+    return build
 
 
-@app.get("/top-gainers")
-@cached(ttl=CACHE_TTL["MARKET_DATA"])
-def api_top_gainers(exchange: str = "NSE"):
-    try:
-        data = _read_json_file("top_gainers.json")
-        # Transform data for frontend compatibility
-        if isinstance(data, dict):
-            gainers = data.get("gainers", [])
-            transformed = {
-                "count": len(gainers),
-                "gainers": [
-                    {
-                        "symbol": _extract_stock_name(item.get("tradingSymbol", "")),
-                        "price": float(item.get("ltp", 0)),
-                        "change": float(item.get("netChange", 0)),
-                        "changePercent": float(item.get("percentChange", 0)),
-                        "symbolToken": item.get("symbolToken")
-                    }
-                    for item in gainers[:10]  # Limit to top 10
-                ],
-                "exchange": data.get("exchange", exchange),
+def _ranked(rows: list) -> dict:
+    """Mover rows keyed by symbol token, with their rank so reorders show up as changes"""
+    return {str(row.get("symbolToken") or row["symbol"]): {**row, "rank": rank} for rank, row in enumerate(rows, 1)}
+
+
+def _index_quotes(data: dict) -> dict:
+    """index_quotes.json payload with change and changePercent for the ok quotes"""
+    quotes = {}
+    for key, quote in data.items():
+        if quote.get("status") == "ok":
+            quotes[key] = {
+                "status": "ok",
+                "symbol": quote.get("symbol", key),
+                "exchange": quote.get("exchange", "NSE"),
+                "price": quote.get("price", 0),
+                "open": quote.get("open", 0),
+                "high": quote.get("high", 0),
+                "low": quote.get("low", 0),
+                "close": quote.get("close", 0),
+                "change": round(quote.get("price", 0) - quote.get("close", 0), 2),
+                "changePercent": round(((quote.get("price", 0) - quote.get("close", 0)) / quote.get("close", 1)) * 100, 2) if quote.get("close", 0) != 0 else 0
+            }
+        else:
+            quotes[key] = quote
+    return quotes
+
+
+_gainers_view = VersionedView(snapshots, "top_gainers.json", _movers("gainers"))
+_losers_view = VersionedView(snapshots, "top_losers.json", _movers("losers"))
+# Sorted PCR rows and aggregates, rebuilt when put_call_ratio.json changes
+_pcr_view = VersionedView(
+    snapshots, "put_call_ratio.json", lambda payload: PCRView.build(payload, symbols.names)
+)
+_index_quotes_view = VersionedView(snapshots, "index_quotes.json", _index_quotes)
+
+
+def _movers_response(view: VersionedView, key: str, exchange: str, since_version: int = None):
+    latest = view.latest()
+    # Missing file: the default empty structure, without a version
+    version, movers = latest if latest is not None else (None, view.builder(_read_json_file(view.name)))
+    if movers is None:
+        return _read_json_file(view.name)
+    if since_version is not None:
+        delta = view.delta(since_version, lambda build: _ranked(build["rows"]))
+        if delta is not None:
+            return {
+                **delta,
+                "count": movers["count"],
+                "exchange": movers["exchange"] or exchange,
                 "timestamp": datetime.now().isoformat()
             }
-            return transformed
-        return data
+    response = {
+        "count": movers["count"],
+        key: movers["rows"],
+        "exchange": movers["exchange"] or exchange,
+        "version": version,
+        "timestamp": datetime.now().isoformat()
+    }
+    if movers["error"]:
+        response["error"] = movers["error"]
+    return response
+
+
+@app.get("/top-gainers")
+@cached(
+    ttl=CACHE_TTL["MARKET_DATA"],
+    stale_ttl=CACHE_TTL["MARKET_STALE"],
+    depends_on=[snapshots.dependency("top_gainers.json")],
+    as_response=True,
+    normalize={"exchange": _upper},
+)
+async def api_top_gainers(exchange: str = "NSE", since_version: int = None):
+    """
+    Top 10 gainers
+
+    Args:
+        since_version: "version" of an earlier response; if it's still kept, only
+            the rows added, changed and removed since then are returned
+    """
+    try:
+        return _movers_response(_gainers_view, "gainers", exchange, since_version)
     except HTTPException:
         raise
     except Exception as e:
@@ -194,45 +293,23 @@ def api_top_gainers(exchange: str = "NSE"):
 
 
 @app.get("/top-losers")
-@cached(ttl=CACHE_TTL["MARKET_DATA"])
-def api_top_losers(exchange: str = "NSE"):
+@cached(
+    ttl=CACHE_TTL["MARKET_DATA"],
+    stale_ttl=CACHE_TTL["MARKET_STALE"],
+    depends_on=[snapshots.dependency("top_losers.json")],
+    as_response=True,
+    normalize={"exchange": _upper},
+)
+async def api_top_losers(exchange: str = "NSE", since_version: int = None):
+    """
+    Top 10 losers
+
+    Args:
+        since_version: "version" of an earlier response; if it's still kept, only
+            the rows added, changed and removed since then are returned
+    """
     try:
-        data = _read_json_file("top_losers.json")
-        # Handle error case and empty data
-        if isinstance(data, dict) and data.get("error"):
-            return {
-                "count": 0, 
-                "losers": [], 
-                "exchange": exchange, 
-                "error": data.get("error"),
-                "timestamp": datetime.now().isoformat()
-            }
-        
-        losers = data.get("losers", [])
-        if not losers or len(losers) == 0:
-            return {
-                "count": 0, 
-                "losers": [], 
-                "exchange": exchange,
-                "timestamp": datetime.now().isoformat()
-            }
-        
-        transformed = {
-            "count": len(losers),
-            "losers": [
-                {
-                    "symbol": _extract_stock_name(item.get("tradingSymbol", "")),
-                    "price": float(item.get("ltp", 0)),
-                    "change": float(item.get("netChange", 0)),
-                    "changePercent": float(item.get("percentChange", 0)),
-                    "symbolToken": item.get("symbolToken")
-                }
-                for item in losers[:10]  # Limit to top 10
-            ],
-            "exchange": data.get("exchange", exchange),
-            "timestamp": datetime.now().isoformat()
-        }
-        return transformed
+        return _movers_response(_losers_view, "losers", exchange, since_version)
     except HTTPException:
         raise
     except Exception as e:
@@ -240,35 +317,79 @@ def api_top_losers(exchange: str = "NSE"):
 
 
 @app.get("/putcallratio")
-@cached(ttl=CACHE_TTL["MARKET_DATA"])
-def api_put_call_ratio(exchange: str = "NSE", limit: int = 100):
+@cached(
+    ttl=CACHE_TTL["MARKET_DATA"],
+    stale_ttl=CACHE_TTL["MARKET_STALE"],
+    depends_on=[snapshots.dependency("put_call_ratio.json")],
+    as_response=True,
+    normalize={"exchange": _upper, "q": _upper},
+)
+async def api_put_call_ratio(
+    exchange: str = "NSE",
+    limit: int = 100,
+    offset: int = 0,
+    cursor: str = None,
+    min_pcr: float = None,
+    max_pcr: float = None,
+    order: str = "desc",
+    q: str = None,
+    since_version: int = None,
+):
+    """
+    Put/Call Ratio by symbol, highest first by default
+
+    Args:
+        limit: Rows per page (1-1000)
+        offset: Rows to skip (within the cursor's page when both are given)
+        cursor: next_cursor from the previous page
+        min_pcr / max_pcr: Inclusive PCR range
+        order: "desc" (highest PCR first) or "asc"
+        q: Symbol prefix, e.g. "ADANI"
+        since_version: "version" of an earlier response; if it's still kept, only
+            the rows (matching min_pcr, max_pcr and q, on any page) added,
+            changed and removed since then are returned
+    """
     try:
-        data = _read_json_file("put_call_ratio.json")
-        if isinstance(data, dict) and data.get("status") == "ok":
-            pcr_data = data.get("data", [])
-            # Transform data with extracted symbols and sort by PCR
-            transformed = [
-                {
-                    "symbol": _extract_stock_name(item.get("tradingSymbol", "")),
-                    "pcr": float(item.get("pcr", 0)),
-                    "tradingSymbol": item.get("tradingSymbol", "")
+        if not 1 <= limit <= 1000 or offset < 0:
+            raise HTTPException(status_code=400, detail="limit must be 1-1000 and offset >= 0")
+        if order not in ORDERS:
+            raise HTTPException(status_code=400, detail=f"order must be one of {', '.join(ORDERS)}")
+        latest = _pcr_view.latest()
+        if latest is None or latest[1] is None:
+            return _read_json_file("put_call_ratio.json")
+        version, view = latest
+        if since_version is not None:
+            delta = _pcr_view.delta(since_version, lambda build: build.records(min_pcr, max_pcr, q))
+            if delta is not None:
+                return {
+                    "status": "ok",
+                    "exchange": view.exchange or exchange,
+                    **delta,
+                    "total_symbols": view.total_symbols,
+                    "avg_pcr": view.avg_pcr,
+                    "max_pcr": view.max_pcr,
+                    "min_pcr": view.min_pcr,
+                    "timestamp": datetime.now().isoformat()
                 }
-                for item in pcr_data
-            ]
-            # Sort by PCR descending (highest first)
-            transformed.sort(key=lambda x: x["pcr"], reverse=True)
-            
-            return {
-                "status": "ok",
-                "exchange": data.get("exchange", exchange),
-                "data": transformed[:limit],  # Return top N symbols
-                "total_symbols": len(pcr_data),
-                "avg_pcr": sum(item["pcr"] for item in transformed) / len(transformed) if transformed else 0,
-                "max_pcr": transformed[0]["pcr"] if transformed else 0,
-                "min_pcr": transformed[-1]["pcr"] if transformed else 0,
-                "timestamp": datetime.now().isoformat()
-            }
-        return data
+        rows, matched, next_cursor = view.query(
+            min_pcr=min_pcr, max_pcr=max_pcr, order=order, limit=limit, offset=offset, cursor=cursor, prefix=q,
+        )
+        return {
+            "status": "ok",
+            "exchange": view.exchange or exchange,
+            "version": version,
+            "data": rows,
+            "count": len(rows),
+            "matched": matched,
+            "next_cursor": next_cursor,
+            "total_symbols": view.total_symbols,
+            "avg_pcr": view.avg_pcr,
+            "max_pcr": view.max_pcr,
+            "min_pcr": view.min_pcr,
+            "timestamp": datetime.now().isoformat()
+        }
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -276,29 +397,55 @@ def api_put_call_ratio(exchange: str = "NSE", limit: int = 100):
 
 
 @app.get("/index-quotes")
-@cached(ttl=CACHE_TTL["MARKET_DATA"])
-def api_all_index_quotes():
+@cached(
+    ttl=CACHE_TTL["MARKET_DATA"],
+    stale_ttl=CACHE_TTL["MARKET_STALE"],
+    depends_on=[snapshots.dependency("index_quotes.json")],
+    as_response=True,
+)
+async def api_all_index_quotes():
     """Get all index quotes at once"""
     try:
-        data = _read_json_file("index_quotes.json")
-        quotes = {}
-        for key, quote in data.items():
-            if quote.get("status") == "ok":
-                quotes[key] = {
-                    "status": "ok",
-                    "symbol": quote.get("symbol", key),
-                    "exchange": quote.get("exchange", "NSE"),
-                    "price": quote.get("price", 0),
-                    "open": quote.get("open", 0),
-                    "high": quote.get("high", 0),
-                    "low": quote.get("low", 0),
-                    "close": quote.get("close", 0),
-                    "change": round(quote.get("price", 0) - quote.get("close", 0), 2),
-                    "changePercent": round(((quote.get("price", 0) - quote.get("close", 0)) / quote.get("close", 1)) * 100, 2) if quote.get("close", 0) != 0 else 0
-                }
-            else:
-                quotes[key] = quote
-        return quotes
+        latest = _index_quotes_view.latest()
+        if latest is None:
+            return _index_quotes(_read_json_file("index_quotes.json"))
+        return latest[1]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing index quotes: {str(e)}")
+
+
+@app.get("/index-quotes/changes")
+@cached(
+    ttl=CACHE_TTL["MARKET_DATA"],
+    stale_ttl=CACHE_TTL["MARKET_STALE"],
+    depends_on=[snapshots.dependency("index_quotes.json")],
+    as_response=True,
+)
+async def api_index_quote_changes(since_version: int = None):
+    """
+    Index quotes for polling clients, always as a versioned envelope
+    (/index-quotes itself stays a bare map of quotes)
+
+    Args:
+        since_version: "version" of an earlier response; if it's still kept, only
+            the quotes added, changed and removed since then are returned
+
+    Returns:
+        {"delta": true, "version", "since_version", "added", "changed", "removed"},
+        or {"delta": false, "version", "data"} with every quote
+    """
+    try:
+        latest = _index_quotes_view.latest()
+        if latest is None:
+            return {"delta": False, "version": None, "data": _index_quotes(_read_json_file("index_quotes.json"))}
+        version, quotes = latest
+        if since_version is not None:
+            delta = _index_quotes_view.delta(since_version, lambda build: build)
+            if delta is not None:
+                return delta
+        return {"delta": False, "version": version, "data": quotes}
     except HTTPException:
         raise
     except Exception as e:
@@ -306,8 +453,14 @@ def api_all_index_quotes():
 
 
 @app.get("/index-quote/{index}")
-@cached(ttl=CACHE_TTL["MARKET_DATA"])
-def api_index_quote(index: str):
+@cached(
+    ttl=CACHE_TTL["MARKET_DATA"],
+    stale_ttl=CACHE_TTL["MARKET_STALE"],
+    depends_on=[snapshots.dependency("index_quotes.json")],
+    as_response=True,
+    normalize={"index": _upper},
+)
+async def api_index_quote(index: str):
     try:
         data = _read_json_file("index_quotes.json")
         key = index.upper()
@@ -334,95 +487,262 @@ def api_index_quote(index: str):
         raise HTTPException(status_code=500, detail=f"Error processing index quote: {str(e)}")
 
 
+# Index history ranges without a timezone are market (IST) times
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def _parse_history_time(value: str, name: str, end_of_day: bool = False):
+    """Epoch seconds from epoch seconds, an ISO date/datetime or DD-MM-YYYY (naive times are IST)"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+        date_only = len(value) == 10
+    except ValueError:
+        iso = parse_date(value)
+        if iso is None:
+            raise HTTPException(status_code=400, detail=f"Invalid {name}: {value} (expected epoch seconds or ISO date)")
+        parsed, date_only = datetime.fromisoformat(iso), True
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=IST)
+    ts = parsed.timestamp()
+    return ts + 86399 if date_only and end_of_day else ts
+
+
+@app.get("/index-quote/{index}/history")
+@cached(
+    ttl=CACHE_TTL["MARKET_DATA"],
+    stale_ttl=CACHE_TTL["MARKET_STALE"],
+    depends_on=[index_history.dependency()],
+    as_response=True,
+    normalize={"index": _upper, "interval": lambda value: value.strip().lower()},
+)
+async def api_index_history(
+    index: str,
+    from_: str = Query(None, alias="from"),
+    to: str = None,
+    interval: str = "auto",
+    max_points: int = 1000,
+):
+    """
+    Intraday price history of an index
+
+    Args:
+        from / to: Inclusive range as epoch seconds, ISO date/datetime or DD-MM-YYYY (IST)
+        interval: auto, raw, 1m, 5m, 15m, 30m, 1h, 1d or 1w; buckets carry OHLC and point counts
+        max_points: Most points returned (1-10000); auto picks the finest interval under it
+
+    Returns:
+        Parallel arrays t (bucket start, epoch seconds), open, high, low, close, count
+        (or t, price for interval=raw)
+    """
+    try:
+        if interval not in HISTORY_INTERVALS and interval not in ("auto", "raw"):
+            raise HTTPException(
+                status_code=400,
+                detail=f"interval must be auto, raw or one of {', '.join(HISTORY_INTERVALS)}",
+            )
+        if not 1 <= max_points <= 10000:
+            raise HTTPException(status_code=400, detail="max_points must be 1-10000")
+        start = _parse_history_time(from_, "from")
+        end = _parse_history_time(to, "to", end_of_day=True)
+        # Tails the history file and resamples with NumPy: keep it off the event loop
+        series = await run_in_threadpool(index_history.series, index, start, end, interval, max_points)
+        if series is None:
+            raise HTTPException(status_code=404, detail=f"No history for index: {index}")
+        return {"status": "ok", "from": start, "to": end, **series}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading index history: {str(e)}")
+
+
 # Cache management endpoints
 @app.post("/cache/clear")
-def clear_cache():
+async def clear_cache():
     try:
         from cache_manager import cache_invalidate
-        cache_invalidate()
+        await run_in_threadpool(cache_invalidate)
         return {"message": "Cache cleared successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error clearing cache: {str(e)}")
 
 @app.get("/cache/stats")
-def cache_stats():
+async def cache_stats():
     try:
-        from cache_manager import cache
-        return {
-            "size": cache.size(),
-            "default_ttl": cache.default_ttl
-        }
+        from cache_manager import cache_stats as get_cache_stats
+        return await run_in_threadpool(get_cache_stats)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting cache stats: {str(e)}")
 
+@app.get("/metrics")
+async def metrics():
+    """Cache metrics in Prometheus text format"""
+    try:
+        from cache_manager import cache_metrics_text
+        return PlainTextResponse(await run_in_threadpool(cache_metrics_text), media_type="text/plain; version=0.0.4")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting metrics: {str(e)}")
+
 
 # Manual trigger endpoint for NSE data fetch
 @app.post("/nse/fetch-data")
-def trigger_nse_data_fetch():
+async def trigger_nse_data_fetch():
     """
     Manually trigger NSE data fetch (block deals, bulk deals, FII/DII, past results)
     This will run the fetch_nse_data.py script and update JSON files
     """
     try:
-        import subprocess
-        import os
-        
         script_path = os.path.join(os.path.dirname(__file__), "fetch_nse_data.py")
         python_cmd = "python"  # or "python3" depending on your setup
-        
-        result = subprocess.run(
-            [python_cmd, script_path],
+
+        # Awaiting the child process keeps the fetch from holding a worker thread
+        process = await asyncio.create_subprocess_exec(
+            python_cmd, script_path,
             cwd=os.path.dirname(__file__),
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minute timeout
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
         )
-        
-        if result.returncode == 0:
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=300)  # 5 minute timeout
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise HTTPException(status_code=500, detail="NSE data fetch timed out after 5 minutes")
+
+        if process.returncode == 0:
+            output = stdout.decode(errors="replace")
             return {
                 "status": "success",
                 "message": "NSE data fetch completed successfully",
-                "output": result.stdout[:500] if result.stdout else "No output"
+                "output": output[:500] if output else "No output"
             }
         else:
+            error = stderr.decode(errors="replace")
             return {
                 "status": "error",
                 "message": "NSE data fetch failed",
-                "error": result.stderr[:500] if result.stderr else "Unknown error"
+                "error": error[:500] if error else "Unknown error"
             }
-    except subprocess.TimeoutExpired:
-        raise HTTPException(status_code=500, detail="NSE data fetch timed out after 5 minutes")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error triggering NSE data fetch: {str(e)}")
 
 
-# NSE Data endpoints (read from JSON files)
+# NSE Data endpoints (deals and past results from the market database,
+# FII/DII from its JSON file)
+def _parse_deal_date(value: str, name: str):
+    parsed = parse_date(value)
+    if parsed is None:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: {value} (expected DD-MM-YYYY)")
+    return parsed
+
+
+def _display_date(value: str):
+    """DD-MM-YYYY for an ISO date, None for None"""
+    return datetime.strptime(value, "%Y-%m-%d").strftime("%d-%m-%Y") if value else None
+
+
+_DEAL_CURSOR_TYPES = (str, int)
+
+
+def _deals_response(
+    kind: str,
+    from_date: str = None,
+    to_date: str = None,
+    symbol: str = None,
+    client: str = None,
+    limit: int = 100,
+    cursor: str = None,
+    order: str = "desc",
+    fields: str = None,
+):
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be 1-1000")
+    if order not in ORDERS:
+        raise HTTPException(status_code=400, detail=f"order must be one of {', '.join(ORDERS)}")
+    dataset = f"{kind}_deals"
+    meta = market_db.meta(dataset)
+    if meta is None:
+        from init_data import DEFAULT_DATA
+        return DEFAULT_DATA.get(f"{dataset}.json", {"status": "unavailable", "reason": "Data file not found"})
+    if from_date or to_date:
+        start = _parse_deal_date(from_date, "from_date") if from_date else None
+        end = _parse_deal_date(to_date, "to_date") if to_date else None
+    elif symbol or client:
+        # A symbol's or client's history spans every stored fetch
+        start = end = None
+    else:
+        # Default to the window of the last fetch, as the JSON file did
+        start = parse_date(meta.get("from_date"))
+        end = parse_date(meta.get("to_date"))
+    after = decode_cursor(cursor, _DEAL_CURSOR_TYPES) if cursor else None
+    projection = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip())) if fields else None
+
+    deals, last = market_db.deals(
+        kind, start, end, symbol=symbol, client=client, after=after, limit=limit,
+        descending=order == "desc", fields=projection,
+    )
+    matched, first_date, last_date = market_db.summarize_deals(kind, start, end, symbol=symbol, client=client)
+    return {
+        **meta,
+        # The range queried, or where it's open, that of the matching deals
+        # (null when there are none)
+        "from_date": _display_date(start or first_date),
+        "to_date": _display_date(end or last_date),
+        "count": len(deals),
+        "matched": matched,
+        "next_cursor": encode_cursor(last) if last else None,
+        "data": deals,
+    }
+
+
 @app.get("/nse/block-deals")
-@cached(ttl=CACHE_TTL["MARKET_DATA"])
-def api_block_deals(from_date: str = None, to_date: str = None):
+@cached(
+    ttl=CACHE_TTL["DATA_FILE"],
+    stale_ttl=CACHE_TTL["MARKET_STALE"],
+    depends_on=[market_db.dependency("block_deals")],
+    as_response=True,
+    normalize={"symbol": _upper},
+)
+async def api_block_deals(
+    from_date: str = None,
+    to_date: str = None,
+    symbol: str = None,
+    client: str = None,
+    limit: int = 100,
+    cursor: str = None,
+    order: str = "desc",
+    fields: str = None,
+):
     """
-    Get NSE Block Deals data from JSON file
-    
+    Get NSE Block Deals data from the market database, newest first
+
     Args:
-        from_date: Start date in DD-MM-YYYY format (for filtering, optional)
-        to_date: End date in DD-MM-YYYY format (for filtering, optional)
-    
+        from_date: Start date in DD-MM-YYYY format (optional)
+        to_date: End date in DD-MM-YYYY format (optional)
+        symbol: Exact NSE symbol, e.g. "RELIANCE" (optional)
+        client: Case-insensitive part of the client name (optional)
+        limit: Rows per page (1-1000)
+        cursor: next_cursor from the previous page
+        order: "desc" (newest first) or "asc"
+        fields: Comma-separated fields to return, e.g. "date,symbol,quantity,price"
+
     Returns:
-        List of block deals from saved JSON file
+        Block deals in the date range (default: the last fetched window, or all
+        stored history when filtering by symbol or client)
     """
     try:
-        data = _read_json_file("block_deals.json")
-        
-        # If dates provided, filter the data (optional filtering)
-        if from_date or to_date:
-            # This is a simple implementation - you can enhance filtering logic
-            if isinstance(data, dict) and "data" in data:
-                filtered_data = data["data"]
-                # Add date filtering logic here if needed
-                data["data"] = filtered_data
-                data["count"] = len(filtered_data)
-        
-        return data
+        return await run_in_threadpool(
+            _deals_response, "block", from_date, to_date, symbol, client, limit, cursor, order, fields
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -430,30 +750,46 @@ def api_block_deals(from_date: str = None, to_date: str = None):
 
 
 @app.get("/nse/bulk-deals")
-@cached(ttl=CACHE_TTL["MARKET_DATA"])
-def api_bulk_deals(from_date: str = None, to_date: str = None):
+@cached(
+    ttl=CACHE_TTL["DATA_FILE"],
+    stale_ttl=CACHE_TTL["MARKET_STALE"],
+    depends_on=[market_db.dependency("bulk_deals")],
+    as_response=True,
+    normalize={"symbol": _upper},
+)
+async def api_bulk_deals(
+    from_date: str = None,
+    to_date: str = None,
+    symbol: str = None,
+    client: str = None,
+    limit: int = 100,
+    cursor: str = None,
+    order: str = "desc",
+    fields: str = None,
+):
     """
-    Get NSE Bulk Deals data from JSON file
-    
+    Get NSE Bulk Deals data from the market database, newest first
+
     Args:
-        from_date: Start date in DD-MM-YYYY format (for filtering, optional)
-        to_date: End date in DD-MM-YYYY format (for filtering, optional)
-    
+        from_date: Start date in DD-MM-YYYY format (optional)
+        to_date: End date in DD-MM-YYYY format (optional)
+        symbol: Exact NSE symbol, e.g. "RELIANCE" (optional)
+        client: Case-insensitive part of the client name (optional)
+        limit: Rows per page (1-1000)
+        cursor: next_cursor from the previous page
+        order: "desc" (newest first) or "asc"
+        fields: Comma-separated fields to return, e.g. "date,symbol,quantity,price"
+
     Returns:
-        List of bulk deals from saved JSON file
+        Bulk deals in the date range (default: the last fetched window, or all
+        stored history when filtering by symbol or client)
     """
     try:
-        data = _read_json_file("bulk_deals.json")
-        
-        # If dates provided, filter the data (optional filtering)
-        if from_date or to_date:
-            if isinstance(data, dict) and "data" in data:
-                filtered_data = data["data"]
-                # Add date filtering logic here if needed
-                data["data"] = filtered_data
-                data["count"] = len(filtered_data)
-        
-        return data
+        return await run_in_threadpool(
+            _deals_response, "bulk", from_date, to_date, symbol, client, limit, cursor, order, fields
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -461,8 +797,13 @@ def api_bulk_deals(from_date: str = None, to_date: str = None):
 
 
 @app.get("/nse/fii-dii")
-@cached(ttl=CACHE_TTL["MARKET_DATA"])
-def api_fii_dii():
+@cached(
+    ttl=CACHE_TTL["DATA_FILE"],
+    stale_ttl=CACHE_TTL["MARKET_STALE"],
+    depends_on=[snapshots.dependency("fii_dii.json")],
+    as_response=True,
+)
+async def api_fii_dii():
     """
     Get FII/DII Trading Activity data from JSON file
     
@@ -479,24 +820,29 @@ def api_fii_dii():
 
 
 @app.get("/nse/past-results/{symbol}")
-@cached(ttl=CACHE_TTL["MARKET_DATA"])
-def api_past_results(symbol: str):
+@cached(
+    ttl=CACHE_TTL["DATA_FILE"],
+    stale_ttl=CACHE_TTL["MARKET_STALE"],
+    depends_on=[market_db.dependency("past_results")],
+    as_response=True,
+    normalize={"symbol": _upper},
+)
+async def api_past_results(symbol: str):
     """
-    Get NSE Past Results for a company from JSON file
+    Get NSE Past Results for a company from the market database
     
     Args:
         symbol: Stock symbol (e.g., RELIANCE, TCS, INFY)
     
     Returns:
-        Past financial results for the company from saved JSON file
+        Past financial results for the company
     """
     try:
-        all_results = _read_json_file("past_results.json")
-        print(all_results)
         symbol_upper = symbol.upper()
-        
-        if isinstance(all_results, dict) and symbol_upper in all_results:
-            return all_results[symbol_upper]
+        # One indexed row per symbol, served as stored without decoding
+        raw = await run_in_threadpool(market_db.past_result_raw, symbol_upper)
+        if raw is not None:
+            return RawJSON(raw)
         else:
             # Return not found response
             return {
@@ -510,6 +856,147 @@ def api_past_results(symbol: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading past results for {symbol}: {str(e)}")
 
+# Batched home-page data
+# Section name -> cache_entry of the endpoint serving it (with its default arguments)
+DASHBOARD_SECTIONS = {
+    "index_quotes": api_all_index_quotes.cache_entry,
+    "top_gainers": api_top_gainers.cache_entry,
+    "top_losers": api_top_losers.cache_entry,
+    "putcallratio": api_put_call_ratio.cache_entry,
+    "fii_dii": api_fii_dii.cache_entry,
+    "marathi_news": marathi_news.cache_entry,
+}
+DASHBOARD_SECTION_TIMEOUT = float(os.getenv("DASHBOARD_SECTION_TIMEOUT", "5"))
+
+# Assembled dashboards by ETag, so repeat requests skip re-encoding and compression
+_dashboards: "OrderedDict[str, EncodedResponse]" = OrderedDict()
+_DASHBOARDS_KEPT = 16
+
+
+async def _dashboard_section(name: str):
+    """(section JSON bytes, validator) for one section; failures become an error section"""
+    try:
+        encoded, stale = await asyncio.wait_for(DASHBOARD_SECTIONS[name](), timeout=DASHBOARD_SECTION_TIMEOUT)
+    except asyncio.TimeoutError:
+        error = {"status": "error", "detail": f"Timed out after {DASHBOARD_SECTION_TIMEOUT}s"}
+    except HTTPException as e:
+        error = {"status": "error", "code": e.status_code, "detail": e.detail}
+    except Exception as e:
+        error = {"status": "error", "code": 500, "detail": str(e)}
+    else:
+        meta = encode_json({"status": "ok", "stale": stale, "last_modified": encoded.last_modified})
+        # Splice the endpoint's cached body in as "data" without decoding it
+        return meta[:-1] + b',"data":' + encoded.body + b"}", f"{encoded.etag}:{stale}"
+    body = encode_json(error)
+    return body, body.decode()
+
+
+@app.get("/dashboard")
+async def api_dashboard(sections: str = None):
+    """
+    Home-page datasets in one response, built concurrently from the response cache
+
+    Args:
+        sections: Comma-separated subset of index_quotes, top_gainers, top_losers,
+            putcallratio, fii_dii, marathi_news (default: all)
+
+    Returns:
+        {"sections": {name: {"status", "stale", "last_modified", "data"}}}; a
+        section that fails has status "error" and a detail instead of data.
+        Compressed and ETagged like the individual endpoints.
+    """
+    names = list(dict.fromkeys(n.strip() for n in sections.split(",") if n.strip())) if sections else list(DASHBOARD_SECTIONS)
+    unknown = [n for n in names if n not in DASHBOARD_SECTIONS]
+    if unknown or not names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown sections {unknown}; choose from {', '.join(DASHBOARD_SECTIONS)}",
+        )
+    results = await asyncio.gather(*(_dashboard_section(name) for name in names))
+
+    validator = "|".join(f"{name}={tag}" for name, (_, tag) in zip(names, results))
+    etag = f'"{hashlib.blake2b(validator.encode(), digest_size=16).hexdigest()}"'
+    response = _dashboards.get(etag)
+    if response is None:
+        body = b'{"sections":{' + b",".join(
+            encode_json(name) + b":" + section for name, (section, _) in zip(names, results)
+        ) + b"}}"
+        response = EncodedResponse(body, etag=etag)
+        _dashboards[etag] = response
+        while len(_dashboards) > _DASHBOARDS_KEPT:
+            _dashboards.popitem(last=False)
+    return response.to_response()
+
+
+# Live push of quotes and movers
+async def _mover_records(view: VersionedView) -> dict:
+    """Current gainers/losers keyed by symbol token, with their rank so reorders are pushed too"""
+    movers = view()
+    return _ranked(movers["rows"]) if movers else {}
+
+
+live = LiveStream(snapshots)
+live.register("index_quotes", "index_quotes.json", api_all_index_quotes.__wrapped__)
+live.register("top_gainers", "top_gainers.json", lambda: _mover_records(_gainers_view))
+live.register("top_losers", "top_losers.json", lambda: _mover_records(_losers_view))
+
+
+@app.get("/stream")
+async def api_stream(datasets: str = None):
+    """
+    Server-Sent Events stream of index quotes, top gainers and top losers
+
+    Sends a "snapshot" event per dataset on connect, then an "update" event
+    with only the changed and removed records each time a dataset's file is
+    refreshed. Event ids are the dataset's snapshot version (the same on
+    every worker, increasing per dataset), as is each event's "version".
+
+    Args:
+        datasets: Comma-separated subset of index_quotes, top_gainers, top_losers (default: all)
+    """
+    names = [n.strip() for n in datasets.split(",") if n.strip()] if datasets else live.datasets
+    unknown = [n for n in names if n not in live.datasets]
+    if unknown or not names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown datasets {unknown}; choose from {', '.join(live.datasets)}",
+        )
+    return StreamingResponse(
+        live.events_for(names),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+
+def _diagnostics() -> dict:
+    return {
+        "snapshots": snapshots.stats(),
+        "shared_snapshots": shared_snapshots.stats(),
+        "deltas": {view.name: view.stats() for view in (_index_quotes_view, _gainers_view, _losers_view, _pcr_view)},
+        "news": news.stats(),
+        "news_search": news_search.stats(),
+        "index_history": index_history.stats(),
+        "symbols": symbols.stats(),
+    }
+
+
+@app.get("/diagnostics")
+async def diagnostics():
+    """
+    In-memory state of this worker's data layers (snapshots, delta
+    versions, news and search indexes, live stream, index history, symbol
+    tables, shared snapshots); cache counters are at /cache/stats
+    """
+    try:
+        # The stream's clients live on the event loop; the rest may load from disk
+        stream = live.stats()
+        return {**await run_in_threadpool(_diagnostics), "live_stream": stream}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting diagnostics: {str(e)}")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark sync (threadpool) vs async endpoints as concurrency rises
+
+Both apps serve the same cached handlers for /top-gainers, /putcallratio
+and /index-quotes:
+- threadpool: plain `def` routes, so every request takes one of
+  Starlette's 40 worker threads (how the endpoints used to run)
+- async:      `async def` routes, run on the event loop
+
+One request in ten goes to a /slow route standing in for a blocking read
+(SLOW_SECONDS of sleep): in the threadpool app it holds a worker thread for
+its whole duration like any other request, in the async app it's offloaded
+with run_in_threadpool. Throughput counts every request; latency
+percentiles are for the fast endpoints only.
+
+Requests are driven straight through the ASGI app (no sockets).
+
+Usage: python bench_async.py [requests_per_level]
+"""
+
+import sys
+import time
+import asyncio
+import inspect
+
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+
+import app as backend
+from bench_cache import request
+from cache_manager import cached, cache_invalidate, CACHE_TTL
+
+ENDPOINTS = [
+    ("/top-gainers", backend.api_top_gainers),
+    ("/putcallratio", backend.api_put_call_ratio),
+    ("/index-quotes", backend.api_all_index_quotes),
+]
+CONCURRENCY = (1, 10, 50, 100, 200, 400)
+SLOW_EVERY = 10
+SLOW_SECONDS = 0.02
+
+
+def as_sync(func):
+    """Plain-def twin of a coroutine function that never awaits"""
+    def run(*args, **kwargs):
+        coro = func(*args, **kwargs)
+        try:
+            coro.send(None)
+        except StopIteration as done:
+            return done.value
+        coro.close()
+        raise RuntimeError(f"{func.__name__} awaits something; it can't run as a plain def")
+    # Not functools.wraps: FastAPI follows __wrapped__ and would treat run as async
+    run.__name__ = func.__name__
+    run.__signature__ = inspect.signature(func)
+    return run
+
+
+def build_app(mode: str) -> FastAPI:
+    bench_app = FastAPI()
+    for route, handler in ENDPOINTS:
+        # Undecorated handler re-wrapped in the mode under test
+        func = handler.__wrapped__ if mode == "async" else as_sync(handler.__wrapped__)
+        bench_app.get(route)(cached(ttl=CACHE_TTL["DATA_FILE"], as_response=True)(func))
+
+    if mode == "async":
+        @bench_app.get("/slow")
+        async def slow():
+            await run_in_threadpool(time.sleep, SLOW_SECONDS)
+            return {"slow": True}
+    else:
+        @bench_app.get("/slow")
+        def slow():
+            time.sleep(SLOW_SECONDS)
+            return {"slow": True}
+    return bench_app
+
+
+async def run_level(asgi_app, concurrency: int, n: int) -> dict:
+    paths = [route for route, _ in ENDPOINTS]
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def one(i: int):
+        path = "/slow" if i % SLOW_EVERY == 0 else paths[i % len(paths)]
+        async with semaphore:
+            start = time.perf_counter()
+            await request(asgi_app, path)
+            if path != "/slow":
+                timings.append((time.perf_counter() - start) * 1e3)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        "rps": n / elapsed,
+        "p50_ms": timings[len(timings) // 2],
+        "p99_ms": timings[int(len(timings) * 0.99) - 1],
+    }
+
+
+async def main(n: int):
+    apps = {"threadpool": build_app("threadpool"), "async": build_app("async")}
+    cache_invalidate()
+    for asgi_app in apps.values():
+        for route, _ in ENDPOINTS:
+            await request(asgi_app, route)  # fill the cache
+
+    print(f"{'concurrency':>11}{'mode':>12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for concurrency in CONCURRENCY:
+        for mode, asgi_app in apps.items():
+            r = await run_level(asgi_app, concurrency, n)
+            print(f"{concurrency:>11}{mode:>12}{r['rps']:>10.0f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark cache-hit latency of the file-backed endpoints
+
+Compares, for the same handler and data:
+- value:   @cached stores the dict, FastAPI encodes it on every hit
+- encoded: @cached(as_response=True) stores the orjson bytes and replays them
+
+Requests are driven straight through the ASGI app (no sockets), so the
+numbers are the server-side cost of a hit.
+
+Usage: python bench_cache.py [requests_per_endpoint]
+"""
+
+import sys
+import time
+import asyncio
+import statistics
+
+from fastapi import FastAPI
+
+import app as backend
+from cache_manager import cached, cache_invalidate, CACHE_TTL
+
+ENDPOINTS = [
+    ("/putcallratio", backend.api_put_call_ratio, "/putcallratio"),
+    ("/nse/past-results/{symbol}", backend.api_past_results, "/nse/past-results/RELIANCE"),
+    ("/index-quotes", backend.api_all_index_quotes, "/index-quotes"),
+]
+
+
+def build_app(as_response: bool) -> FastAPI:
+    bench_app = FastAPI()
+    for route, handler, _ in ENDPOINTS:
+        # Undecorated handler re-wrapped in the mode under test
+        func = cached(ttl=CACHE_TTL["DATA_FILE"], as_response=as_response)(handler.__wrapped__)
+        bench_app.get(route)(func)
+    return bench_app
+
+
+async def request(asgi_app, path: str) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+    }
+    body_size = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal body_size
+        if message["type"] == "http.response.body":
+            body_size += len(message.get("body", b""))
+
+    await asgi_app(scope, receive, send)
+    return body_size
+
+
+async def bench(asgi_app, path: str, n: int):
+    # Both modes wrap the same handler and so share cache keys
+    cache_invalidate()
+    size = await request(asgi_app, path)  # fill the cache
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        await request(asgi_app, path)
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return {
+        "bytes": size,
+        "mean_us": statistics.mean(timings),
+        "p50_us": timings[len(timings) // 2],
+        "p99_us": timings[int(len(timings) * 0.99) - 1],
+    }
+
+
+async def main(n: int):
+    apps = {"value": build_app(False), "encoded": build_app(True)}
+    print(f"{'endpoint':<32}{'mode':<10}{'bytes':>9}{'mean us':>11}{'p50 us':>10}{'p99 us':>10}")
+    for _, _, path in ENDPOINTS:
+        results = {}
+        for mode, asgi_app in apps.items():
+            results[mode] = await bench(asgi_app, path, n)
+            r = results[mode]
+            print(f"{path:<32}{mode:<10}{r['bytes']:>9}{r['mean_us']:>11.1f}{r['p50_us']:>10.1f}{r['p99_us']:>10.1f}")
+        speedup = results["value"]["mean_us"] / results["encoded"]["mean_us"]
+        print(f"{'':<32}{'speedup':<10}{'':>9}{speedup:>10.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark past-results lookups as the number of stored symbols grows
+
+Compares, for one symbol, the cost of a cache miss in /nse/past-results:
+- json:   parse the whole past_results.json and take one key (old behaviour)
+- sqlite: read one row's stored JSON from the market database (no decode)
+
+Symbols are synthesized by cloning the entries in data/past_results.json,
+up to the size of the Nifty 500.
+
+Usage: python bench_past_results.py [lookups_per_size]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import statistics
+
+from market_db import MarketDB, DATA_DIR
+
+SIZES = (10, 50, 100, 250, 500)
+
+
+def synthesize(base: dict, n: int) -> dict:
+    entries = list(base.values())
+    results = {}
+    for i in range(n):
+        symbol = f"SYM{i:04d}"
+        results[symbol] = {**entries[i % len(entries)], "symbol": symbol}
+    return results
+
+
+def timed(fn, symbols, n):
+    timings = []
+    for _ in range(n):
+        symbol = random.choice(symbols)
+        start = time.perf_counter()
+        fn(symbol)
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return statistics.mean(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main(n: int):
+    with open(os.path.join(DATA_DIR, "past_results.json"), encoding="utf-8") as f:
+        base = json.load(f)
+    with tempfile.TemporaryDirectory(prefix="bench_past_results_") as workdir:
+        print(f"{'symbols':>8}{'file KB':>10}{'json mean us':>15}{'json p99 us':>14}{'sqlite mean us':>17}{'sqlite p99 us':>16}")
+        for size in SIZES:
+            results = synthesize(base, size)
+            symbols = list(results)
+
+            path = os.path.join(workdir, f"past_results_{size}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+
+            def from_json(symbol):
+                with open(path, "r", encoding="utf-8") as f:
+                    return json.load(f)[symbol]
+
+            db = MarketDB(os.path.join(workdir, f"market_{size}.db"))
+            db.upsert_past_results(results)
+
+            json_mean, json_p99 = timed(from_json, symbols, max(20, n // 10))
+            db_mean, db_p99 = timed(db.past_result_raw, symbols, n)
+            db.close()
+            print(f"{size:>8}{os.path.getsize(path) / 1024:>10.0f}{json_mean:>15.1f}{json_p99:>14.1f}{db_mean:>17.1f}{db_p99:>16.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
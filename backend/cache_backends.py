@@ -0,0 +1,639 @@
+# cache_backends.py
+"""
+Storage engines behind cache_manager.cached
+
+- SimpleCache: in-process LRU with per-entry TTL and a memory budget
+- RedisCache: shared by every worker process, values pickled and compressed
+- TieredCache: SimpleCache in front of RedisCache; writes and invalidations
+  are broadcast over Redis pub/sub so each worker drops its local copy
+
+create_cache() picks one from the CACHE_BACKEND env var (memory, redis,
+tiered) and falls back to memory if Redis is not reachable.
+"""
+
+import os
+import sys
+import time
+import uuid
+import zlib
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # Only needed for the redis / tiered backends
+    redis = None
+
+
+class CacheBackend:
+    """Interface shared by the cache engines"""
+
+    name = "base"
+
+    def __init__(self, default_ttl: int = 300):
+        self.default_ttl = default_ttl
+        # Called with the key of every entry evicted to stay within limits
+        self.on_evict: Optional[Callable[[str], None]] = None
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get value from cache (fresh values only)"""
+        entry = self.get_entry(key)
+        if entry is None or entry[2]:
+            return None
+        return entry[0]
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float, bool]]:
+        """Get (value, age_seconds, is_stale) from cache, or None if missing/expired"""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, stale_ttl: int = 0,
+            tags: Tuple[str, ...] = ()) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def invalidate_tag(self, tag: str) -> int:
+        """Delete every entry stored with tag, returns how many were removed"""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def size(self) -> int:
+        raise NotImplementedError
+
+    def keys(self) -> List[str]:
+        raise NotImplementedError
+
+    def memory_by_prefix(self) -> Dict[str, int]:
+        """Estimated bytes held per key prefix (function name), where the backend can tell"""
+        return {}
+
+    def set_evict_hook(self, callback: Optional[Callable[[str], None]]) -> None:
+        self.on_evict = callback
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "size": self.size(),
+            "default_ttl": self.default_ttl,
+        }
+
+    def close(self) -> None:
+        pass
+
+
+def _estimate_size(value: Any, _seen: Optional[set] = None) -> int:
+    """
+    Rough deep size of a value in bytes (walks containers and object attributes)
+
+    Values with an integer nbytes (encoded responses, NumPy arrays) report
+    their own size, so as_response entries cost O(1) to measure. Plain
+    values are walked once per fill, which is proportional to the work that
+    just built them.
+    """
+    if _seen is None:
+        _seen = set()
+    obj_id = id(value)
+    if obj_id in _seen:
+        return 0
+    _seen.add(obj_id)
+
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += _estimate_size(k, _seen) + _estimate_size(v, _seen)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += _estimate_size(item, _seen)
+    elif hasattr(value, "__slots__"):
+        for slot in value.__slots__:
+            size += _estimate_size(getattr(value, slot, None), _seen)
+    elif hasattr(value, "__dict__"):
+        size += _estimate_size(vars(value), _seen)
+    return size
+
+
+class _Entry:
+    __slots__ = ("value", "created_at", "fresh_until", "expires_at", "size", "tags")
+
+    def __init__(self, value: Any, created_at: float, fresh_until: float, expires_at: float, size: int,
+                 tags: Tuple[str, ...] = ()):
+        self.value = value
+        self.created_at = created_at
+        # Served as fresh until fresh_until, as stale until expires_at
+        self.fresh_until = fresh_until
+        self.expires_at = expires_at
+        self.size = size
+        self.tags = tags
+
+
+class SimpleCache(CacheBackend):
+    """
+    In-process cache: entries carry their own expiry and are kept in LRU
+    order, bounded by entry count and by an estimated memory budget. A
+    background janitor thread drops expired entries so unused keys don't sit
+    in memory until the next lookup.
+    """
+
+    name = "memory"
+
+    def __init__(
+        self,
+        default_ttl: int = 300,  # 5 minutes default TTL
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        cleanup_interval: float = 30,
+    ):
+        super().__init__(default_ttl)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cleanup_interval = cleanup_interval
+        self._data: "OrderedDict[str, _Entry]" = OrderedDict()
+        # tag -> keys stored with it, so invalidation only touches matching entries
+        self._tags: Dict[str, set] = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.evictions = 0
+        self.expirations = 0
+        self._stop = threading.Event()
+        self._janitor = None
+        if cleanup_interval and cleanup_interval > 0:
+            self._janitor = threading.Thread(
+                target=self._janitor_loop, name="cache-janitor", daemon=True
+            )
+            self._janitor.start()
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float, bool]]:
+        """Get (value, age_seconds, is_stale) from cache, or None if missing/expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            now = time.monotonic()
+            if entry.expires_at <= now:
+                # Expired, remove from cache
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._data.move_to_end(key)
+            return entry.value, now - entry.created_at, entry.fresh_until <= now
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, stale_ttl: int = 0,
+            tags: Tuple[str, ...] = (), age: float = 0) -> None:
+        """Set value in cache, optionally keeping it servable as stale for stale_ttl seconds"""
+        ttl = self.default_ttl if ttl is None else ttl
+        size = _estimate_size(value)
+        if self.max_bytes and size > self.max_bytes:
+            # Larger than the whole budget - don't let it flush everything else
+            self.delete(key)
+            return
+        now = time.monotonic()
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = _Entry(value, now - age, now + ttl, now + ttl + stale_ttl, size, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            self._bytes += size
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        """Delete key from cache"""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def invalidate_tag(self, tag: str) -> int:
+        with self._lock:
+            keys = self._tags.pop(tag, ())
+            for key in keys:
+                if key in self._data:
+                    self._remove(key)
+            return len(keys)
+
+    def clear(self) -> None:
+        """Clear all cache"""
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def size(self) -> int:
+        """Get cache size"""
+        return len(self._data)
+
+    def keys(self) -> List[str]:
+        """Snapshot of the keys currently held (including not-yet-purged expired ones)"""
+        with self._lock:
+            return list(self._data.keys())
+
+    def memory_usage(self) -> int:
+        """Estimated bytes held by cached values"""
+        return self._bytes
+
+    def memory_by_prefix(self) -> Dict[str, int]:
+        with self._lock:
+            sizes = [(key.split(":", 1)[0], entry.size) for key, entry in self._data.items()]
+        totals: Dict[str, int] = {}
+        for prefix, size in sizes:
+            totals[prefix] = totals.get(prefix, 0) + size
+        return totals
+
+    def purge_expired(self) -> int:
+        """Remove all expired entries, returns the number removed"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, entry in self._data.items() if entry.expires_at <= now]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self) -> dict:
+        """Size, memory and eviction counters"""
+        stats = super().stats()
+        stats.update({
+            "max_entries": self.max_entries,
+            "memory_bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        })
+        return stats
+
+    def close(self) -> None:
+        """Stop the background janitor thread"""
+        self._stop.set()
+
+    def _remove(self, key: str) -> None:
+        entry = self._data.pop(key)
+        self._bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _evict(self) -> None:
+        # Least recently used entries sit at the front of the OrderedDict
+        while self._data and (
+            (self.max_entries and len(self._data) > self.max_entries)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._data))
+            self._remove(key)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(key)
+
+    def _janitor_loop(self) -> None:
+        while not self._stop.wait(self.cleanup_interval):
+            try:
+                self.purge_expired()
+            except Exception as e:
+                print(f"Warning: cache cleanup failed: {e}")
+
+
+# Tag sets live at least this long (seconds) in Redis
+_TAG_TTL = 86400
+
+# Payloads above this size are zlib-compressed before going to Redis
+_COMPRESS_THRESHOLD = 1024
+_RAW, _ZLIB = b"r", b"z"
+
+
+def _dumps(record) -> bytes:
+    data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) > _COMPRESS_THRESHOLD:
+        return _ZLIB + zlib.compress(data, 1)
+    return _RAW + data
+
+
+def _loads(blob: bytes):
+    if blob[:1] == _ZLIB:
+        return pickle.loads(zlib.decompress(blob[1:]))
+    return pickle.loads(blob[1:])
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache shared by all worker processes through Redis
+
+    Each key holds a pickled (value, created_at, fresh_until, expires_at)
+    record with a Redis expiry covering the fresh and stale windows. Tags are
+    Redis sets of keys under a separate namespace. Only point this at a
+    Redis instance you trust - values are unpickled on read.
+
+    Connecting and every command time out after socket_timeout seconds, so
+    an unreachable or hung server costs a cache miss, not a stuck request.
+    """
+
+    name = "redis"
+    channel = "invalidate"
+
+    def __init__(self, url: str = None, client=None, default_ttl: int = 300, namespace: str = "sharda:cache:",
+                 socket_timeout: float = 0.5):
+        super().__init__(default_ttl)
+        if client is None:
+            if redis is None:
+                raise RuntimeError("redis package is not installed")
+            client = redis.Redis.from_url(
+                url or "redis://localhost:6379/0",
+                socket_timeout=socket_timeout,
+                socket_connect_timeout=socket_timeout,
+            )
+        self.client = client
+        self.namespace = namespace
+        self.tag_namespace = f"{namespace.rstrip(':')}-tags:"
+        self.channel = f"{namespace}{RedisCache.channel}"
+        self.errors = 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}{key}"
+
+    def get_record(self, key: str) -> Optional[Tuple[Any, float, float, float]]:
+        """Raw (value, created_at, fresh_until, expires_at) record, wall-clock timestamps"""
+        try:
+            blob = self.client.get(self._key(key))
+        except Exception as e:
+            # Redis being down degrades to cache misses, not failed requests
+            self.errors += 1
+            print(f"Warning: redis cache get failed: {e}")
+            return None
+        if blob is None:
+            return None
+        try:
+            return _loads(blob)
+        except Exception:
+            return None
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float, bool]]:
+        record = self.get_record(key)
+        if record is None:
+            return None
+        value, created_at, fresh_until, _ = record
+        now = time.time()
+        return value, max(0.0, now - created_at), fresh_until <= now
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, stale_ttl: int = 0,
+            tags: Tuple[str, ...] = ()) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        blob = _dumps((value, now, now + ttl, now + ttl + stale_ttl))
+        expire_ms = max(1, int((ttl + stale_ttl) * 1000))
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.set(self._key(key), blob, px=expire_ms)
+            for tag in tags:
+                tag_key = f"{self.tag_namespace}{tag}"
+                pipe.sadd(tag_key, key)
+                # Keys expire on their own; the set only has to outlive them
+                pipe.expire(tag_key, max(_TAG_TTL, ttl + stale_ttl))
+            pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            print(f"Warning: redis cache set failed: {e}")
+
+    def invalidate_tag(self, tag: str) -> int:
+        tag_key = f"{self.tag_namespace}{tag}"
+        try:
+            members = self.client.smembers(tag_key)
+            keys = [m.decode() if isinstance(m, bytes) else m for m in members]
+            pipe = self.client.pipeline(transaction=False)
+            for key in keys:
+                pipe.delete(self._key(key))
+            pipe.delete(tag_key)
+            pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            print(f"Warning: redis cache tag invalidation failed: {e}")
+            return 0
+        for key in keys:
+            self.publish(key)
+        return len(keys)
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete(self._key(key))
+        except Exception as e:
+            self.errors += 1
+            print(f"Warning: redis cache delete failed: {e}")
+        self.publish(key)
+
+    def clear(self) -> None:
+        try:
+            for namespace in (self.namespace, self.tag_namespace):
+                batch = []
+                for redis_key in self.client.scan_iter(match=f"{namespace}*", count=500):
+                    batch.append(redis_key)
+                    if len(batch) >= 500:
+                        self.client.delete(*batch)
+                        batch = []
+                if batch:
+                    self.client.delete(*batch)
+        except Exception as e:
+            self.errors += 1
+            print(f"Warning: redis cache clear failed: {e}")
+        self.publish("*")
+
+    def publish(self, key: str, sender: str = "") -> None:
+        """Tell every worker that key ("*" for everything) has changed"""
+        try:
+            self.client.publish(self.channel, f"{sender}|{key}")
+        except Exception as e:
+            self.errors += 1
+            print(f"Warning: redis cache publish failed: {e}")
+
+    def keys(self) -> List[str]:
+        prefix_len = len(self.namespace)
+        try:
+            return [
+                (k.decode() if isinstance(k, bytes) else k)[prefix_len:]
+                for k in self.client.scan_iter(match=f"{self.namespace}*", count=500)
+            ]
+        except Exception as e:
+            self.errors += 1
+            print(f"Warning: redis cache scan failed: {e}")
+            return []
+
+    def size(self) -> int:
+        return len(self.keys())
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["errors"] = self.errors
+        return stats
+
+
+class TieredCache(CacheBackend):
+    """
+    Two-tier cache: a small in-process SimpleCache (L1) in front of a shared
+    RedisCache (L2)
+
+    Lookups try L1, then L2 (copying the entry into L1 with its remaining
+    lifetime). Every set/delete/clear is published on Redis and a listener
+    thread in each worker evicts the matching L1 entries, so a value
+    recomputed or invalidated by one worker is not served stale by another.
+    """
+
+    name = "tiered"
+
+    def __init__(self, l1: SimpleCache, l2: RedisCache):
+        super().__init__(l2.default_ttl)
+        self.l1 = l1
+        self.l2 = l2
+        self.instance_id = uuid.uuid4().hex
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self._stop = threading.Event()
+        self._listener = threading.Thread(
+            target=self._listen_loop, name="cache-invalidation", daemon=True
+        )
+        self._listener.start()
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float, bool]]:
+        entry = self.l1.get_entry(key)
+        if entry is not None:
+            self.l1_hits += 1
+            return entry
+
+        record = self.l2.get_record(key)
+        if record is None:
+            return None
+        value, created_at, fresh_until, expires_at = record
+        now = time.time()
+        if expires_at <= now:
+            return None
+        age = max(0.0, now - created_at)
+        fresh_left = max(0.0, fresh_until - now)
+        self.l1.set(key, value, fresh_left, expires_at - now - fresh_left, age=age)
+        self.l2_hits += 1
+        return value, age, fresh_until <= now
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, stale_ttl: int = 0,
+            tags: Tuple[str, ...] = ()) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        self.l1.set(key, value, ttl, stale_ttl, tags)
+        self.l2.set(key, value, ttl, stale_ttl, tags)
+        self.l2.publish(key, self.instance_id)
+
+    def invalidate_tag(self, tag: str) -> int:
+        # L1 copies pulled from L2 carry no tags; other workers hear about
+        # each key from L2's publish, this worker drops its own below
+        self.l1.invalidate_tag(tag)
+        tag_key = f"{self.l2.tag_namespace}{tag}"
+        try:
+            keys = [m.decode() if isinstance(m, bytes) else m for m in self.l2.client.smembers(tag_key)]
+        except Exception:
+            keys = []
+        count = self.l2.invalidate_tag(tag)
+        for key in keys:
+            self.l1.delete(key)
+        return count
+
+    def delete(self, key: str) -> None:
+        self.l1.delete(key)
+        self.l2.delete(key)
+
+    def clear(self) -> None:
+        self.l1.clear()
+        self.l2.clear()
+
+    def keys(self) -> List[str]:
+        return self.l2.keys()
+
+    def memory_by_prefix(self) -> Dict[str, int]:
+        return self.l1.memory_by_prefix()
+
+    def set_evict_hook(self, callback: Optional[Callable[[str], None]]) -> None:
+        super().set_evict_hook(callback)
+        self.l1.set_evict_hook(callback)
+
+    def size(self) -> int:
+        return self.l2.size()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update({
+            "l1": self.l1.stats(),
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "errors": self.l2.errors,
+        })
+        return stats
+
+    def close(self) -> None:
+        self._stop.set()
+        self.l1.close()
+
+    def _on_message(self, data) -> None:
+        if isinstance(data, bytes):
+            data = data.decode()
+        sender, _, key = data.partition("|")
+        if sender == self.instance_id:
+            return
+        if key == "*":
+            self.l1.clear()
+        else:
+            self.l1.delete(key)
+
+    def _listen_loop(self) -> None:
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self.l2.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.l2.channel)
+                # Anything published while we weren't subscribed is unknown
+                self.l1.clear()
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._on_message(message["data"])
+            except Exception as e:
+                print(f"Warning: cache invalidation listener error: {e}")
+                self._stop.wait(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+def create_cache() -> CacheBackend:
+    """Build the cache backend selected by CACHE_BACKEND (memory, redis or tiered)"""
+    backend = os.getenv("CACHE_BACKEND", "memory").lower()
+    default_ttl = int(os.getenv("CACHE_DEFAULT_TTL", 300))
+
+    def memory_cache(max_entries=None):
+        return SimpleCache(
+            default_ttl=default_ttl,
+            max_entries=max_entries or int(os.getenv("CACHE_MAX_ENTRIES", 1024)),
+            max_bytes=int(os.getenv("CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+            cleanup_interval=float(os.getenv("CACHE_CLEANUP_INTERVAL", 30)),
+        )
+
+    if backend in ("redis", "tiered"):
+        try:
+            l2 = RedisCache(
+                url=os.getenv("REDIS_URL"),
+                default_ttl=default_ttl,
+                socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", 0.5)),
+            )
+            l2.client.ping()
+            if backend == "redis":
+                return l2
+            return TieredCache(memory_cache(int(os.getenv("CACHE_L1_MAX_ENTRIES", 256))), l2)
+        except Exception as e:
+            print(f"Warning: {backend} cache backend unavailable ({e}), using in-memory cache")
+    elif backend != "memory":
+        print(f"Warning: unknown CACHE_BACKEND '{backend}', using in-memory cache")
+    return memory_cache()
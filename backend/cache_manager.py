@@ -1,89 +1,688 @@
 # cache_manager.py
 """
-Simple in-memory cache manager for API responses
+Cache manager for API responses
+
+The @cached decorator, request coalescing and file-dependency tracking live
+here; the storage engines (in-process LRU, Redis, two-tier) are in
+cache_backends.py.
 """
 
+import os
+import gzip
+import json
 import time
-from typing import Any, Optional
+import hashlib
+import asyncio
+import inspect
+import threading
+import contextvars
+from email.utils import formatdate, parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
 from functools import wraps
 
-class SimpleCache:
-    def __init__(self, default_ttl: int = 300):  # 5 minutes default TTL
-        self.cache = {}
-        self.default_ttl = default_ttl
-    
-    def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
-        if key in self.cache:
-            value, timestamp = self.cache[key]
-            if time.time() - timestamp < self.default_ttl:
-                return value
-            else:
-                # Expired, remove from cache
-                del self.cache[key]
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Only gzip variants are built without it
+    brotli = None
+
+from cache_backends import CacheBackend, SimpleCache, RedisCache, TieredCache, create_cache
+from cache_metrics import metrics, key_prefix
+
+
+# Global cache instance (backend chosen by CACHE_BACKEND: memory, redis or tiered)
+cache = create_cache()
+cache.set_evict_hook(lambda key: metrics.incr(key_prefix(key), "evictions"))
+
+# Per-request cache metadata: the request's conditional headers going in,
+# hit/miss/stale and age coming out. CacheHeadersMiddleware puts a fresh dict
+# in the context for each request; the threadpool copies the context so sync
+# endpoints read and update the same dict.
+_request_meta: "contextvars.ContextVar[Optional[dict]]" = contextvars.ContextVar(
+    "cache_request_meta", default=None
+)
+
+
+def _note_cache_result(status: str, age: float) -> None:
+    meta = _request_meta.get()
+    if meta is not None:
+        meta["status"] = status
+        meta["age"] = age
+
+
+class CacheHeadersMiddleware:
+    """
+    ASGI middleware adding Age and X-Cache (HIT / STALE / MISS) headers to
+    responses produced by @cached endpoints, and passing If-None-Match /
+    If-Modified-Since / Accept-Encoding through to them
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        meta = {}
+        for name, value in scope.get("headers", ()):
+            if name == b"if-none-match":
+                meta["if_none_match"] = value.decode("latin-1")
+            elif name == b"if-modified-since":
+                meta["if_modified_since"] = value.decode("latin-1")
+            elif name == b"accept-encoding":
+                meta["accept_encoding"] = value.decode("latin-1")
+        token = _request_meta.set(meta)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and "status" in meta:
+                headers = list(message.get("headers", []))
+                headers.append((b"age", str(int(meta["age"])).encode()))
+                headers.append((b"x-cache", meta["status"].encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _request_meta.reset(token)
+
+
+# Content fingerprints of data files that cache entries depend on:
+# path -> (checked_at, mtime_ns, size, digest). stat() is re-run at most once
+# per FILE_CHECK_INTERVAL and the file is only re-hashed when mtime/size move.
+FILE_CHECK_INTERVAL = float(os.getenv("CACHE_FILE_CHECK_INTERVAL", 1.0))
+_file_state = {}
+_file_state_lock = threading.Lock()
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path: str) -> str:
+    """Content hash of a file ("missing" if it doesn't exist), cheap to call repeatedly"""
+    now = time.monotonic()
+    state = _file_state.get(path)
+    if state is not None and now - state[0] < FILE_CHECK_INTERVAL:
+        return state[3]
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        _file_state[path] = (now, None, None, "missing")
+        return "missing"
+
+    if state is not None and state[1] == st.st_mtime_ns and state[2] == st.st_size:
+        digest = state[3]
+    else:
+        try:
+            digest = _hash_file(path)
+        except OSError:
+            digest = "missing"
+    with _file_state_lock:
+        _file_state[path] = (now, st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def file_mtime(path: str) -> Optional[float]:
+    """Modification time (epoch seconds) last seen by file_fingerprint"""
+    state = _file_state.get(path)
+    if state is None or state[1] is None:
         return None
-    
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        """Set value in cache"""
-        ttl = ttl or self.default_ttl
-        self.cache[key] = (value, time.time())
-    
-    def delete(self, key: str) -> None:
-        """Delete key from cache"""
-        if key in self.cache:
-            del self.cache[key]
-    
-    def clear(self) -> None:
-        """Clear all cache"""
-        self.cache.clear()
-    
-    def size(self) -> int:
-        """Get cache size"""
-        return len(self.cache)
-
-# Global cache instance
-cache = SimpleCache()
-
-def cached(ttl: int = 300):
+    return state[1] / 1e9
+
+
+# depends_on entries are file paths, or objects with .path, .fingerprint()
+# and .mtime() (e.g. snapshot_store.SnapshotDependency) whose fingerprint
+# moves when the data they stand for is replaced
+
+
+def _dep_path(dep) -> str:
+    return dep if isinstance(dep, str) else dep.path
+
+
+def _dep_fingerprint(dep) -> str:
+    return file_fingerprint(dep) if isinstance(dep, str) else dep.fingerprint()
+
+
+def _dep_mtime(dep) -> Optional[float]:
+    return file_mtime(dep) if isinstance(dep, str) else dep.mtime()
+
+
+def _snapshot_deps(sources: tuple) -> Tuple[Tuple[str, str], ...]:
+    return tuple((_dep_path(dep), _dep_fingerprint(dep)) for dep in sources)
+
+
+def _deps_changed(sources: tuple, deps: Tuple[Tuple[str, str], ...]) -> bool:
+    for dep, (_, digest) in zip(sources, deps):
+        if _dep_fingerprint(dep) != digest:
+            return True
+    return False
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so ignore W/ prefixes
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _not_modified_since(if_modified_since: str, last_modified: str) -> bool:
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", 1024))
+
+
+def _accepted_encodings(accept_encoding: Optional[str]) -> set:
+    """Codings the client accepts (q > 0) from an Accept-Encoding header"""
+    accepted = set()
+    if not accept_encoding:
+        return accepted
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class EncodedResponse:
+    """
+    A response body encoded once when the cache is filled and replayed on
+    every hit, with gzip / brotli variants built at the same time
+    """
+    __slots__ = ("body", "media_type", "etag", "last_modified", "variants")
+
+    def __init__(self, body: bytes, media_type: str = "application/json",
+                 etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.body = body
+        self.media_type = media_type
+        self.etag = etag
+        self.last_modified = last_modified
+        # content-coding -> compressed body
+        self.variants = {}
+        if len(body) >= COMPRESS_MIN_BYTES:
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body, quality=5)
+            self.variants["gzip"] = gzip.compress(body, compresslevel=6)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the body and its compressed variants (the cache's size estimate)"""
+        return len(self.body) + sum(len(v) for v in self.variants.values())
+
+    def to_response(self) -> Response:
+        """
+        Full response in the best encoding the client accepts, or 304 Not
+        Modified if the request's validators still match
+        """
+        meta = _request_meta.get() or {}
+        coding = None
+        if self.variants:
+            accepted = _accepted_encodings(meta.get("accept_encoding"))
+            coding = next((c for c in ("br", "gzip") if c in accepted and c in self.variants), None)
+
+        headers = {}
+        if self.variants:
+            headers["Vary"] = "Accept-Encoding"
+        if coding is not None:
+            headers["Content-Encoding"] = coding
+        body = self.variants[coding] if coding else self.body
+
+        if self.etag is None:
+            return Response(content=body, media_type=self.media_type, headers=headers)
+
+        # Each representation needs its own strong validator
+        etag = f'{self.etag[:-1]}-{coding}"' if coding else self.etag
+        headers["ETag"] = etag
+        headers["Cache-Control"] = "no-cache"
+        if self.last_modified:
+            headers["Last-Modified"] = self.last_modified
+
+        if_none_match = meta.get("if_none_match")
+        if if_none_match is not None:
+            not_modified = _etag_matches(if_none_match, etag)
+        elif self.last_modified and meta.get("if_modified_since"):
+            not_modified = _not_modified_since(meta["if_modified_since"], self.last_modified)
+        else:
+            not_modified = False
+
+        if not_modified:
+            headers.pop("Content-Encoding", None)
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+
+def _validators(cache_key: str, sources: tuple, deps) -> Tuple[Optional[str], Optional[str]]:
+    """Strong ETag and Last-Modified for a result computed from the files in deps"""
+    if not deps:
+        return None, None
+    digest = hashlib.blake2b(cache_key.encode(), digest_size=12)
+    for path, file_digest in deps:
+        digest.update(file_digest.encode())
+    mtimes = [m for m in (_dep_mtime(dep) for dep in sources) if m is not None]
+    last_modified = formatdate(max(mtimes), usegmt=True) if mtimes else None
+    return f'"{digest.hexdigest()}"', last_modified
+
+
+class RawJSON(bytes):
+    """
+    Already-encoded JSON a cached function can return as is: with
+    as_response the bytes become the response body without being decoded
+    and re-encoded
+    """
+    __slots__ = ()
+
+
+def encode_json(value) -> bytes:
+    """Compact JSON bytes for a response payload (orjson when available)"""
+    if isinstance(value, RawJSON):
+        return bytes(value)
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class _Flight:
+    """A computation in progress that concurrent callers for the same key wait on"""
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# In-flight computations keyed by cache key (sync callers block on the event,
+# async callers await a shared task)
+_flights = {}
+_async_flights = {}
+_flights_lock = threading.Lock()
+
+# Background revalidation of stale entries for sync functions
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+# Background revalidation tasks for async functions; the event loop only keeps
+# weak references to tasks, so they're held here until they finish
+_refresh_tasks = set()
+
+
+def _compute_sync(cache_key: str, compute):
+    """Run compute() once per key; concurrent callers wait for the same result"""
+    with _flights_lock:
+        flight = _flights.get(cache_key)
+        leader = flight is None
+        if leader:
+            flight = _flights[cache_key] = _Flight()
+
+    if not leader:
+        metrics.incr(key_prefix(cache_key), "coalesced")
+        flight.event.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        # Another leader may have filled the key between our miss and taking the flight
+        result = cache.get(cache_key)
+        if result is None:
+            result = compute()
+        flight.result = result
+        return result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(cache_key, None)
+        flight.event.set()
+
+
+async def _cache_call(method, *args):
+    """
+    Call a cache backend method from async code: the in-memory backend runs
+    inline, anything that may go to Redis runs in the threadpool so a slow
+    server can't stall the event loop
+    """
+    if isinstance(cache, SimpleCache):
+        return method(*args)
+    return await run_in_threadpool(method, *args)
+
+
+async def _compute_async(cache_key: str, compute):
+    """Async counterpart of _compute_sync, compute() returns an awaitable"""
+    task = _async_flights.get(cache_key)
+    if task is None:
+        async def run():
+            try:
+                result = await _cache_call(cache.get, cache_key)
+                if result is None:
+                    result = await compute()
+                return result
+            finally:
+                _async_flights.pop(cache_key, None)
+
+        task = asyncio.ensure_future(run())
+        _async_flights[cache_key] = task
+    else:
+        metrics.incr(key_prefix(cache_key), "coalesced")
+    # Shield so a cancelled caller (client disconnect) doesn't cancel the
+    # computation the other waiters depend on
+    return await asyncio.shield(task)
+
+
+def _revalidate_sync(cache_key: str, compute) -> None:
+    """Recompute a stale key in the background unless a refresh is already running"""
+    with _flights_lock:
+        if cache_key in _flights:
+            return
+
+    def run():
+        try:
+            _compute_sync(cache_key, compute)
+        except Exception as e:
+            print(f"Warning: background refresh of {cache_key} failed: {e}")
+
+    _refresh_executor.submit(run)
+
+
+def _revalidate_async(cache_key: str, compute) -> None:
+    if cache_key in _async_flights:
+        return
+
+    async def run():
+        try:
+            await _compute_async(cache_key, compute)
+        except Exception as e:
+            print(f"Warning: background refresh of {cache_key} failed: {e}")
+
+    task = asyncio.ensure_future(run())
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+def cached(
+    ttl: int = 300,
+    stale_ttl: int = 0,
+    depends_on: Optional[Iterable[str]] = None,
+    as_response: bool = False,
+    normalize: Optional[Dict[str, Callable]] = None,
+):
     """
     Decorator to cache function results
-    
+
+    Concurrent misses for the same key are coalesced: one caller computes the
+    value and the others wait for it. Works for plain functions (FastAPI runs
+    these in its threadpool) and for async functions.
+
+    With stale_ttl, a value past its ttl is still returned immediately for up
+    to stale_ttl more seconds while a single background task recomputes it.
+
+    With depends_on, entries record the content fingerprint of each file at
+    fill time and are dropped as soon as any of those files changes, so the
+    ttl only needs to bound how long a value may live, not data freshness.
+
+    With as_response, the result is JSON-encoded once when the entry is
+    filled and every call returns a raw Response with those bytes, so a hit
+    skips FastAPI's jsonable_encoder and JSON encoding. Only use it on route
+    handlers, not on functions other code calls for their return value.
+    Combined with depends_on, responses carry a strong ETag derived from the
+    files' content hashes and a Last-Modified from their mtime, and matching
+    If-None-Match / If-Modified-Since requests get a bodyless 304.
+    Wrappers also have cache_entry(*args, **kwargs) (a coroutine function
+    for async functions), returning the stored value (the EncodedResponse
+    with as_response) and whether it is stale, for endpoints that combine
+    other cached responses.
+
+    Keys are built from the call bound to the function's signature with
+    defaults applied, so f(), f("NSE") and f(exchange="NSE") share one entry.
+    normalize maps parameter names to functions applied to the bound value
+    before both keying and calling (e.g. {"symbol": str.upper}). The key is
+    the function name plus a fixed-size hash of the arguments, and entries
+    are tagged "fn:<name>" and "file:<path>" for each dependency so
+    cache_invalidate_function / cache_invalidate_file only touch matching
+    entries.
+
     Args:
         ttl: Time to live in seconds
+        stale_ttl: Seconds an expired value may still be served while refreshing
+        depends_on: Paths of files (or snapshot dependencies) the result is computed from
+        as_response: Cache the encoded response body instead of the value
+        normalize: Per-parameter functions canonicalizing argument values
     """
+    dep_sources = tuple(depends_on or ())
+    normalizers = dict(normalize or {})
+
     def decorator(func):
+        name = func.__name__
+        signature = inspect.signature(func)
+        unknown = set(normalizers) - set(signature.parameters)
+        if unknown:
+            raise TypeError(f"{name}() has no parameters {sorted(unknown)} to normalize")
+        tags = (f"fn:{name}",) + tuple(
+            f"file:{os.path.abspath(_dep_path(dep))}" for dep in dep_sources
+        )
+
+        def bind(args, kwargs):
+            """Cache key plus the normalized (args, kwargs) to call func with"""
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            for param, normalizer in normalizers.items():
+                value = bound.arguments.get(param)
+                if value is not None:
+                    bound.arguments[param] = normalizer(value)
+            # bound.arguments is in signature order, so the repr is canonical
+            digest = hashlib.blake2b(repr(tuple(bound.arguments.items())).encode(), digest_size=16)
+            return f"{name}:{digest.hexdigest()}", bound.args, bound.kwargs
+
+        def prepare(cache_key, result, deps):
+            """Value to store for a freshly computed result"""
+            if as_response:
+                etag, last_modified = _validators(cache_key, dep_sources, deps)
+                return EncodedResponse(encode_json(result), etag=etag, last_modified=last_modified)
+            if isinstance(result, RawJSON):
+                # Callers of a value-mode function expect the decoded value
+                return orjson.loads(bytes(result)) if orjson is not None else json.loads(result)
+            return result
+
+        def respond(value):
+            """What callers get for a stored value"""
+            if as_response:
+                return value.to_response()
+            return value
+
+        def unpack(entry):
+            """(result, age, stale) of a stored entry, None if missing or its files changed"""
+            if entry is None:
+                return None
+            (result, deps), age, stale = entry
+            if deps and _deps_changed(dep_sources, deps):
+                return None
+            return result, age, stale
+
+        def lookup(cache_key):
+            """Cached (result, age, stale) or None; entries whose files changed are dropped"""
+            entry = cache.get_entry(cache_key)
+            unpacked = unpack(entry)
+            if entry is not None and unpacked is None:
+                cache.delete(cache_key)
+            return unpacked
+
+        async def lookup_async(cache_key):
+            """lookup() with the backend calls kept off the event loop"""
+            entry = await _cache_call(cache.get_entry, cache_key)
+            unpacked = unpack(entry)
+            if entry is not None and unpacked is None:
+                await _cache_call(cache.delete, cache_key)
+            return unpacked
+
+        if inspect.iscoroutinefunction(func):
+            async def fetch_async(args, kwargs, note=True):
+                """(stored value, stale) for a call, computing and caching it on a miss"""
+                cache_key, args, kwargs = bind(args, kwargs)
+
+                async def compute():
+                    # Fingerprint before computing so a write during compute invalidates the entry
+                    deps = _snapshot_deps(dep_sources)
+                    started = time.perf_counter()
+                    result = prepare(cache_key, await func(*args, **kwargs), deps)
+                    metrics.observe(name, time.perf_counter() - started)
+                    await _cache_call(cache.set, cache_key, (result, deps), ttl, stale_ttl, tags)
+                    return result, deps
+
+                entry = await lookup_async(cache_key)
+                if entry is not None:
+                    value, age, stale = entry
+                    if stale:
+                        metrics.incr(name, "stale")
+                        _revalidate_async(cache_key, compute)
+                    else:
+                        metrics.incr(name, "hits")
+                    if note:
+                        _note_cache_result("STALE" if stale else "HIT", age)
+                    return value, stale
+
+                metrics.incr(name, "misses")
+                if note:
+                    _note_cache_result("MISS", 0)
+                result, _ = await _compute_async(cache_key, compute)
+                return result, False
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return respond((await fetch_async(args, kwargs))[0])
+
+            async def async_cache_entry(*args, **kwargs):
+                """Like cache_entry, for coroutine functions"""
+                return await fetch_async(args, kwargs, note=False)
+
+            async_wrapper.cache_entry = async_cache_entry
+            return async_wrapper
+
+        def fetch(args, kwargs, note=True):
+            """(stored value, stale) for a call, computing and caching it on a miss"""
+            cache_key, args, kwargs = bind(args, kwargs)
+
+            # Execute function and cache result
+            def compute():
+                # Fingerprint before computing so a write during compute invalidates the entry
+                deps = _snapshot_deps(dep_sources)
+                started = time.perf_counter()
+                result = prepare(cache_key, func(*args, **kwargs), deps)
+                metrics.observe(name, time.perf_counter() - started)
+                cache.set(cache_key, (result, deps), ttl, stale_ttl, tags)
+                return result, deps
+
+            # Try to get from cache
+            entry = lookup(cache_key)
+            if entry is not None:
+                value, age, stale = entry
+                if stale:
+                    metrics.incr(name, "stale")
+                    _revalidate_sync(cache_key, compute)
+                else:
+                    metrics.incr(name, "hits")
+                if note:
+                    _note_cache_result("STALE" if stale else "HIT", age)
+                return value, stale
+
+            metrics.incr(name, "misses")
+            if note:
+                _note_cache_result("MISS", 0)
+            result, _ = _compute_sync(cache_key, compute)
+            return result, False
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Create cache key from function name and arguments
-            cache_key = f"{func.__name__}:{str(args)}:{str(sorted(kwargs.items()))}"
-            
-            # Try to get from cache
-            cached_result = cache.get(cache_key)
-            if cached_result is not None:
-                return cached_result
-            
-            # Execute function and cache result
-            result = func(*args, **kwargs)
-            cache.set(cache_key, result, ttl)
-            return result
-        
+            return respond(fetch(args, kwargs)[0])
+
+        def cache_entry(*args, **kwargs):
+            """
+            (stored value, stale) without building a response: an
+            EncodedResponse for as_response functions, so callers such as
+            the dashboard can reuse the encoded body
+            """
+            return fetch(args, kwargs, note=False)
+
+        wrapper.cache_entry = cache_entry
         return wrapper
     return decorator
 
+def cache_stats() -> dict:
+    """Backend stats plus per-function hit/miss/eviction counters and compute times"""
+    memory = cache.memory_by_prefix()
+    functions = metrics.to_json(memory)
+    stats = cache.stats()
+    stats.update({
+        "hits": sum(f["hits"] for f in functions.values()),
+        "misses": sum(f["misses"] for f in functions.values()),
+        "stale_hits": sum(f["stale"] for f in functions.values()),
+        "coalesced": sum(f["coalesced"] for f in functions.values()),
+        "memory_estimate_bytes": sum(memory.values()),
+        "functions": functions,
+    })
+    return stats
+
+
+def cache_metrics_text() -> str:
+    """Cache metrics in Prometheus text format"""
+    return metrics.to_prometheus(cache.memory_by_prefix(), cache.size())
+
+
 def cache_invalidate(pattern: str = None):
     """
     Invalidate cache entries matching pattern
-    
+
     Args:
-        pattern: Pattern to match cache keys (if None, clears all)
+        pattern: Function name, or substring of cache keys (if None, clears all)
     """
     if pattern is None:
         cache.clear()
-    else:
-        keys_to_delete = [key for key in cache.cache.keys() if pattern in key]
+    elif cache.invalidate_tag(f"fn:{pattern}") == 0:
+        # Not a cached function's name: fall back to scanning every key
+        keys_to_delete = [key for key in cache.keys() if pattern in key]
         for key in keys_to_delete:
             cache.delete(key)
 
+
+def cache_invalidate_tag(tag: str) -> int:
+    """Drop every entry stored with tag, returns how many were removed"""
+    return cache.invalidate_tag(tag)
+
+
+def cache_invalidate_function(name: str) -> int:
+    """Drop every cached result of the function called name"""
+    return cache.invalidate_tag(f"fn:{name}")
+
+
+def cache_invalidate_file(path: str) -> int:
+    """Drop every entry computed from the file at path"""
+    return cache.invalidate_tag(f"file:{os.path.abspath(path)}")
+
 # Cache TTL constants
 CACHE_TTL = {
     "MARKET_DATA": 60,      # 1 minute for market data
@@ -91,4 +690,6 @@ CACHE_TTL = {
     "SUMMARIES": 600,       # 10 minutes for summaries
     "COMPANY_NEWS": 300,    # 5 minutes for company news
     "OVERVIEW": 60,         # 1 minute for market overview
+    "MARKET_STALE": 60,     # serve market data up to 1 minute stale while refreshing
+    "DATA_FILE": 3600,      # 1 hour for slow-moving files (invalidated on change anyway)
 }
@@ -0,0 +1,163 @@
+# cache_metrics.py
+"""
+Per-function cache metrics: hits, misses, stale serves, evictions, coalesced
+waits and a compute-time histogram, keyed by cache key prefix (the decorated
+function's name).
+
+Each thread writes to its own shard, so recording a hit is a thread-local dict
+update with no lock; shards are only summed when /cache/stats or /metrics is
+read.
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+COUNTERS = ("hits", "misses", "stale", "evictions", "coalesced")
+
+# Upper bounds (seconds) of the compute-time histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def key_prefix(cache_key: str) -> str:
+    """Function name part of a cache key"""
+    return cache_key.split(":", 1)[0]
+
+
+class _Series:
+    __slots__ = ("counters", "buckets", "compute_sum", "compute_count")
+
+    def __init__(self):
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # last bucket is +Inf
+        self.compute_sum = 0.0
+        self.compute_count = 0
+
+
+class CacheMetrics:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Dict[str, _Series]] = []
+        self._shards_lock = threading.Lock()
+
+    def _series(self, name: str) -> _Series:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            # Once per thread: register this thread's shard for aggregation
+            shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        series = shard.get(name)
+        if series is None:
+            series = shard[name] = _Series()
+        return series
+
+    def incr(self, name: str, counter: str, amount: int = 1) -> None:
+        self._series(name).counters[counter] += amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Record how long computing a value for name took"""
+        series = self._series(name)
+        index = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                index = i
+                break
+        series.buckets[index] += 1
+        series.compute_sum += seconds
+        series.compute_count += 1
+
+    def reset(self) -> None:
+        with self._shards_lock:
+            for shard in self._shards:
+                shard.clear()
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Per-function totals summed over all thread shards"""
+        totals: Dict[str, dict] = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            # Other threads may add series while we read; copy the items first
+            for name, series in list(shard.items()):
+                total = totals.get(name)
+                if total is None:
+                    total = totals[name] = {
+                        **dict.fromkeys(COUNTERS, 0),
+                        "compute_count": 0,
+                        "compute_seconds_sum": 0.0,
+                        "compute_buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+                    }
+                for counter in COUNTERS:
+                    total[counter] += series.counters[counter]
+                total["compute_count"] += series.compute_count
+                total["compute_seconds_sum"] += series.compute_sum
+                for i, count in enumerate(series.buckets):
+                    total["compute_buckets"][i] += count
+        return totals
+
+    def to_json(self, memory_by_prefix: Optional[Dict[str, int]] = None) -> dict:
+        """Per-function stats for /cache/stats"""
+        result = {}
+        memory_by_prefix = memory_by_prefix or {}
+        for name, total in sorted(self.snapshot().items()):
+            lookups = total["hits"] + total["stale"] + total["misses"]
+            cumulative = 0
+            histogram = {}
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), total["compute_buckets"]):
+                cumulative += count
+                histogram[str(bound)] = cumulative
+            result[name] = {
+                **{counter: total[counter] for counter in COUNTERS},
+                "hit_ratio": round((total["hits"] + total["stale"]) / lookups, 4) if lookups else None,
+                "compute_count": total["compute_count"],
+                "compute_avg_ms": round(total["compute_seconds_sum"] / total["compute_count"] * 1000, 3)
+                if total["compute_count"] else None,
+                "compute_histogram": histogram,
+                "memory_bytes": memory_by_prefix.get(name, 0),
+            }
+        return result
+
+    def to_prometheus(self, memory_by_prefix: Optional[Dict[str, int]] = None, entries: int = 0) -> str:
+        """Prometheus text exposition format for /metrics"""
+        memory_by_prefix = memory_by_prefix or {}
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP sharda_cache_requests_total Cache lookups by function and result",
+            "# TYPE sharda_cache_requests_total counter",
+        ]
+        for name, total in sorted(snapshot.items()):
+            for result, counter in (("hit", "hits"), ("miss", "misses"), ("stale", "stale")):
+                lines.append(f'sharda_cache_requests_total{{function="{name}",result="{result}"}} {total[counter]}')
+
+        for counter, help_text in (
+            ("evictions", "Entries evicted to stay within the cache limits"),
+            ("coalesced", "Callers that waited on another caller's computation"),
+        ):
+            lines.append(f"# HELP sharda_cache_{counter}_total {help_text}")
+            lines.append(f"# TYPE sharda_cache_{counter}_total counter")
+            for name, total in sorted(snapshot.items()):
+                lines.append(f'sharda_cache_{counter}_total{{function="{name}"}} {total[counter]}')
+
+        lines.append("# HELP sharda_cache_compute_seconds Time spent computing values on cache misses")
+        lines.append("# TYPE sharda_cache_compute_seconds histogram")
+        for name, total in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), total["compute_buckets"]):
+                cumulative += count
+                lines.append(f'sharda_cache_compute_seconds_bucket{{function="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'sharda_cache_compute_seconds_sum{{function="{name}"}} {total["compute_seconds_sum"]}')
+            lines.append(f'sharda_cache_compute_seconds_count{{function="{name}"}} {total["compute_count"]}')
+
+        lines.append("# HELP sharda_cache_memory_bytes Estimated memory held by cached values")
+        lines.append("# TYPE sharda_cache_memory_bytes gauge")
+        for name, size in sorted(memory_by_prefix.items()):
+            lines.append(f'sharda_cache_memory_bytes{{function="{name}"}} {size}')
+        lines.append("# HELP sharda_cache_entries Entries currently cached")
+        lines.append("# TYPE sharda_cache_entries gauge")
+        lines.append(f"sharda_cache_entries {entries}")
+        return "\n".join(lines) + "\n"
+
+
+# Global metrics instance
+metrics = CacheMetrics()
@@ -0,0 +1,127 @@
+# data_writer.py
+"""
+Atomic JSON writer shared by the data fetch jobs
+
+Payloads are serialized compactly (orjson when available), written to a
+temp file in the same directory, fsynced and moved over the target with
+os.replace, so readers only ever see the old or the new file. A write whose
+content matches what's already on disk (ignoring top-level volatile keys
+such as "timestamp") is skipped, so the snapshot store and the response
+cache aren't refreshed for nothing.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib encoder
+    orjson = None
+
+# Top-level keys that change on every fetch without the data changing
+VOLATILE_KEYS = ("timestamp",)
+
+# path -> (mtime_ns, size, content digest) of files this process has seen
+_digests: Dict[str, Tuple[int, int, str]] = {}
+_digests_lock = threading.Lock()
+
+
+def dumps(data: Any) -> bytes:
+    """Compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _loads(raw: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode("utf-8"))
+
+
+def _strip(data: Any, volatile: Tuple[str, ...]) -> Any:
+    # Only the envelope's keys: a nested "timestamp" may be part of the data
+    if isinstance(data, dict):
+        return {k: v for k, v in data.items() if k not in volatile}
+    return data
+
+
+def _content_digest(data: Any, volatile: Tuple[str, ...]) -> str:
+    if volatile:
+        data = _strip(data, volatile)
+    return hashlib.blake2b(dumps(data), digest_size=16).hexdigest()
+
+
+def _digest_on_disk(path: str, volatile: Tuple[str, ...]) -> Optional[str]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    known = _digests.get(path)
+    if known is not None and known[:2] == (st.st_mtime_ns, st.st_size):
+        return known[2]
+    try:
+        with open(path, "rb") as f:
+            digest = _content_digest(_loads(f.read()), volatile)
+    except (OSError, ValueError):
+        return None
+    with _digests_lock:
+        _digests[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def write_json_atomic(path: str, data: Any, volatile: Iterable[str] = VOLATILE_KEYS) -> bool:
+    """
+    Atomically replace path with data as JSON
+
+    Returns:
+        True if the file was written, False if its content was unchanged
+    """
+    volatile = tuple(volatile)
+    digest = _content_digest(data, volatile)
+    if _digest_on_disk(path, volatile) == digest:
+        return False
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # Same directory so os.replace is a rename on one filesystem; the suffix
+    # keeps watchers of *.json from picking up the temp file
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        # mkstemp creates the file 0600; data files are meant to be world-readable
+        os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, "wb") as f:
+            f.write(dumps(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(directory)
+
+    st = os.stat(path)
+    with _digests_lock:
+        _digests[path] = (st.st_mtime_ns, st.st_size, digest)
+    return True
+
+
+def _fsync_dir(directory: str) -> None:
+    """Persist the rename itself (not supported on Windows)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
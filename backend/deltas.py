@@ -0,0 +1,109 @@
+# deltas.py
+"""
+Versioned deltas of snapshot-backed datasets for polling clients
+
+A VersionedView keeps what a builder derived from the last DELTA_HISTORY
+versions of one snapshot (the snapshot store's version, which only ever
+increases). A client that polls with ?since_version=<the version it has>
+gets only the records added, changed and removed since then; one whose
+version is no longer kept (too far behind, or from before a restart) gets
+the full payload again.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Versions kept per dataset to diff against
+DELTA_HISTORY = int(os.getenv("DELTA_HISTORY", "16"))
+
+Records = Dict[str, dict]
+
+
+def diff_records(old: Records, new: Records) -> Tuple[Records, Records, List[str]]:
+    """(records added, records changed, keys removed)"""
+    added = {}
+    changed = {}
+    for key, record in new.items():
+        previous = old.get(key)
+        if previous is None:
+            added[key] = record
+        elif previous != record:
+            changed[key] = record
+    removed = [key for key in old if key not in new]
+    return added, changed, removed
+
+
+class VersionedView:
+    """
+    Derived structure of a snapshot, rebuilt on every swap and kept for its
+    last `depth` versions so older ones can be diffed against
+    """
+
+    def __init__(self, store, name: str, builder: Callable[[Any], Any], depth: int = DELTA_HISTORY):
+        self.store = store
+        self.name = name
+        self.builder = builder
+        self.depth = depth
+        # version -> build, oldest first
+        self._builds: "OrderedDict[int, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        store.subscribe(self._on_swap)
+
+    def _on_swap(self, snapshot) -> None:
+        if snapshot.name == self.name:
+            self._build(snapshot)
+
+    def _build(self, snapshot) -> Any:
+        with self._lock:
+            if snapshot.version in self._builds:
+                return self._builds[snapshot.version]
+            result = self.builder(snapshot.data)
+            self._builds[snapshot.version] = result
+            # Swaps arrive in version order, except a request building the
+            # current snapshot before the watcher thread gets to it
+            self._builds = OrderedDict(sorted(self._builds.items())[-self.depth:])
+            return result
+
+    def latest(self) -> Optional[Tuple[int, Any]]:
+        """(version, build) of the current snapshot, None while the file is missing"""
+        snapshot = self.store.get(self.name)
+        if snapshot is None:
+            return None
+        build = self._builds.get(snapshot.version)
+        if build is None and snapshot.version not in self._builds:
+            build = self._build(snapshot)
+        return snapshot.version, build
+
+    def __call__(self) -> Any:
+        latest = self.latest()
+        return latest[1] if latest is not None else None
+
+    def delta(self, since_version: int, records: Callable[[Any], Records]) -> Optional[dict]:
+        """
+        Records added, changed and removed between since_version and the
+        current version, with records(build) keying each version's rows
+
+        Returns:
+            None if since_version isn't kept (the client needs the full payload)
+        """
+        latest = self.latest()
+        if latest is None:
+            return None
+        version, build = latest
+        old = self._builds.get(since_version)
+        if build is None or old is None:
+            return None
+        added, changed, removed = diff_records(records(old), records(build)) if old is not build else ({}, {}, [])
+        return {
+            "version": version,
+            "since_version": since_version,
+            "delta": True,
+            "added": added,
+            "changed": changed,
+            "removed": removed,
+        }
+
+    def stats(self) -> dict:
+        return {"versions": list(self._builds)}
@@ -9,6 +9,9 @@ from datetime import datetime, timedelta
 from pathlib import Path
 import logging
 
+from market_db import market_db
+from data_writer import write_json_atomic
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -17,6 +20,13 @@ logging.basicConfig(
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 
+def _update_market_db(update, *args):
+    """Mirror fetched data into the market database (the JSON file is still written)"""
+    try:
+        update(*args)
+    except Exception as e:
+        logging.error(f"❌ Error updating market database: {str(e)}")
+
 def ensure_data_dir():
     """Ensure data directory exists"""
     Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
@@ -40,8 +50,8 @@ def fetch_block_deals(from_date=None, to_date=None):
                     existing["status"] = "error"
                     existing["error"] = f"Library import failed: {str(e)}"
                     existing["timestamp"] = datetime.now().isoformat()
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(existing, f, ensure_ascii=False, indent=2)
+                write_json_atomic(filepath, existing)
+                _update_market_db(market_db.set_status, "block_deals", "error", existing["error"])
             return None
         
         if not to_date:
@@ -52,6 +62,10 @@ def fetch_block_deals(from_date=None, to_date=None):
         logging.info(f"Fetching block deals from {from_date} to {to_date}")
         data = nse_largedeals_historical(from_date, to_date, "block_deals")
         
+        # nsepython returns a DataFrame; store plain records
+        if hasattr(data, 'to_dict'):
+            data = data.to_dict('records')
+        
         result = {
             "status": "success",
             "from_date": from_date,
@@ -61,8 +75,8 @@ def fetch_block_deals(from_date=None, to_date=None):
             "timestamp": datetime.now().isoformat()
         }
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        write_json_atomic(filepath, result)
+        _update_market_db(market_db.upsert_deals, "block", result)
         
         logging.info(f"✅ Saved {result['count']} block deals to block_deals.json")
         return result
@@ -77,8 +91,8 @@ def fetch_block_deals(from_date=None, to_date=None):
                 existing["status"] = "error"
                 existing["error"] = f"Library syntax error: {str(e)}"
                 existing["timestamp"] = datetime.now().isoformat()
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(existing, f, ensure_ascii=False, indent=2)
+            write_json_atomic(filepath, existing)
+            _update_market_db(market_db.set_status, "block_deals", "error", existing["error"])
         return None
     except Exception as e:
         logging.error(f"❌ Error fetching block deals: {str(e)}")
@@ -106,8 +120,8 @@ def fetch_bulk_deals(from_date=None, to_date=None):
                     existing["status"] = "error"
                     existing["error"] = f"Library import failed: {str(e)}"
                     existing["timestamp"] = datetime.now().isoformat()
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(existing, f, ensure_ascii=False, indent=2)
+                write_json_atomic(filepath, existing)
+                _update_market_db(market_db.set_status, "bulk_deals", "error", existing["error"])
             return None
         
         if not to_date:
@@ -118,6 +132,10 @@ def fetch_bulk_deals(from_date=None, to_date=None):
         logging.info(f"Fetching bulk deals from {from_date} to {to_date}")
         data = nse_largedeals_historical(from_date, to_date, "bulk_deals")
         
+        # nsepython returns a DataFrame; store plain records
+        if hasattr(data, 'to_dict'):
+            data = data.to_dict('records')
+        
         result = {
             "status": "success",
             "from_date": from_date,
@@ -127,8 +145,8 @@ def fetch_bulk_deals(from_date=None, to_date=None):
             "timestamp": datetime.now().isoformat()
         }
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        write_json_atomic(filepath, result)
+        _update_market_db(market_db.upsert_deals, "bulk", result)
         
         logging.info(f"✅ Saved {result['count']} bulk deals to bulk_deals.json")
         return result
@@ -143,8 +161,8 @@ def fetch_bulk_deals(from_date=None, to_date=None):
                 existing["status"] = "error"
                 existing["error"] = f"Library syntax error: {str(e)}"
                 existing["timestamp"] = datetime.now().isoformat()
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(existing, f, ensure_ascii=False, indent=2)
+            write_json_atomic(filepath, existing)
+            _update_market_db(market_db.set_status, "bulk_deals", "error", existing["error"])
         return None
     except Exception as e:
         logging.error(f"❌ Error fetching bulk deals: {str(e)}")
@@ -191,8 +209,7 @@ def fetch_fii_dii():
                     existing["status"] = "error"
                     existing["error"] = f"Library import failed: {str(e)}"
                     existing["timestamp"] = datetime.now().isoformat()
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(existing, f, ensure_ascii=False, indent=2)
+                write_json_atomic(filepath, existing)
             return None
         
         logging.info("Fetching FII/DII data")
@@ -250,8 +267,7 @@ def fetch_fii_dii():
             "timestamp": datetime.now().isoformat()
         }
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        write_json_atomic(filepath, result)
         
         logging.info("✅ Saved FII/DII data to fii_dii.json")
         return result
@@ -266,8 +282,7 @@ def fetch_fii_dii():
                 existing["status"] = "error"
                 existing["error"] = f"Library syntax error: {str(e)}"
                 existing["timestamp"] = datetime.now().isoformat()
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(existing, f, ensure_ascii=False, indent=2)
+            write_json_atomic(filepath, existing)
         return None
     except Exception as e:
         logging.error(f"❌ Error fetching FII/DII data: {str(e)}")
@@ -306,8 +321,7 @@ def fetch_past_results(symbols=None):
                                 "error": f"Library import failed: {str(e)}",
                                 "timestamp": datetime.now().isoformat()
                             }
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(existing, f, ensure_ascii=False, indent=2)
+                write_json_atomic(filepath, existing)
             return None
         
         results = {}
@@ -342,8 +356,9 @@ def fetch_past_results(symbols=None):
                 }
         
         # Save all results
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
+        write_json_atomic(filepath, results)
+        # Upserted per symbol, so symbols from earlier runs stay available
+        _update_market_db(market_db.upsert_past_results, results)
         
         logging.info(f"✅ Saved past results for {len(results)} symbols to past_results.json")
         return results
@@ -356,8 +371,7 @@ def fetch_past_results(symbols=None):
             try:
                 with open(filepath, 'r', encoding='utf-8') as f:
                     existing = json.load(f)
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(existing, f, ensure_ascii=False, indent=2)
+                write_json_atomic(filepath, existing)
             except:
                 pass
         return None
@@ -0,0 +1,362 @@
+# index_history.py
+"""
+Intraday price history for index quotes
+
+Every index_quotes.json snapshot the fetch job writes is also appended, one
+16-byte (timestamp, price) record per index, to data/index_history/<INDEX>.bin.
+The server tails those files into per-index NumPy ring buffers (columnar
+int64 timestamps + float64 prices), so memory stays bounded at
+INDEX_HISTORY_CAPACITY points per index: the default keeps about five years
+of 5-minute samples in ~8 MB.
+
+Queries bisect the time range with searchsorted and resample into OHLC
+buckets with reduceat, so a year of points comes back in a few milliseconds.
+In the API a watcher thread lists the files, so checking whether a cached
+response is still current reads memory only.
+"""
+
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(__file__)
+HISTORY_DIR = os.getenv("INDEX_HISTORY_DIR", os.path.join(BASE_DIR, "data", "index_history"))
+
+# Points kept per index (in memory and, after compaction, on disk)
+CAPACITY = int(os.getenv("INDEX_HISTORY_CAPACITY", "525600"))
+
+# On-disk record, appended in timestamp order
+RECORD = np.dtype([("ts", "<i8"), ("price", "<f8")])
+
+# Resampling intervals in seconds
+INTERVALS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+    "30m": 1800,
+    "1h": 3600,
+    "1d": 86400,
+    "1w": 7 * 86400,
+}
+
+# Buckets align to Indian market days (IST, UTC+5:30)
+TZ_OFFSET = 19800
+
+# 1970-01-01 was a Thursday; weekly buckets count from Monday 1970-01-05
+WEEK_START = 4 * 86400
+
+# Seconds between the watcher's listings of the history files
+POLL_INTERVAL = float(os.getenv("INDEX_HISTORY_POLL_INTERVAL", 1.0))
+
+# Upper bound on points returned; "auto" picks the finest interval under it
+MAX_POINTS = int(os.getenv("INDEX_HISTORY_MAX_POINTS", "1000"))
+
+
+def _history_path(index: str, directory: str = HISTORY_DIR) -> str:
+    return os.path.join(directory, f"{index}.bin")
+
+
+def append_snapshot(quotes: Dict[str, dict], ts: Optional[float] = None, directory: str = HISTORY_DIR) -> int:
+    """
+    Append the ok quotes of an index_quotes.json payload to their history files
+
+    Returns:
+        Number of indexes a point was recorded for
+    """
+    ts = int(ts if ts is not None else time.time())
+    os.makedirs(directory, exist_ok=True)
+    recorded = 0
+    for key, quote in quotes.items():
+        if not isinstance(quote, dict) or quote.get("status") != "ok":
+            continue
+        try:
+            price = float(quote.get("price"))
+        except (TypeError, ValueError):
+            continue
+        path = _history_path(key, directory)
+        last = _last_record(path)
+        if last is not None and ts <= last["ts"]:
+            continue
+        with open(path, "ab") as f:
+            f.write(np.array([(ts, price)], dtype=RECORD).tobytes())
+        recorded += 1
+        if os.path.getsize(path) > 2 * CAPACITY * RECORD.itemsize:
+            _compact(path)
+    return recorded
+
+
+def _last_record(path: str) -> Optional[np.void]:
+    try:
+        with open(path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size < RECORD.itemsize:
+                return None
+            f.seek((size // RECORD.itemsize - 1) * RECORD.itemsize)
+            return np.frombuffer(f.read(RECORD.itemsize), dtype=RECORD)[0]
+    except OSError:
+        return None
+
+
+def _compact(path: str) -> None:
+    """Rewrite a history file with only its newest CAPACITY records"""
+    records = np.fromfile(path, dtype=RECORD)[-CAPACITY:]
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, "wb") as f:
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class RingBuffer:
+    """
+    Fixed-capacity columnar buffer of (timestamp, price) points, oldest overwritten first
+
+    Not thread-safe: one writer at a time (IndexHistory extends and reads
+    under its lock). Arrays handed out by arrays() are copies, so they stay
+    valid after later extends.
+    """
+
+    __slots__ = ("capacity", "ts", "price", "start", "size", "_ordered")
+
+    def __init__(self, capacity: int = CAPACITY):
+        self.capacity = capacity
+        self.ts = np.empty(capacity, dtype=np.int64)
+        self.price = np.empty(capacity, dtype=np.float64)
+        self.start = 0
+        self.size = 0
+        self._ordered = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def extend(self, ts: np.ndarray, price: np.ndarray) -> None:
+        if len(ts) > self.capacity:
+            ts, price = ts[-self.capacity:], price[-self.capacity:]
+        n = len(ts)
+        if not n:
+            return
+        end = (self.start + self.size) % self.capacity
+        first = min(n, self.capacity - end)
+        self.ts[end:end + first] = ts[:first]
+        self.price[end:end + first] = price[:first]
+        self.ts[:n - first] = ts[first:]
+        self.price[:n - first] = price[first:]
+        overflow = max(0, self.size + n - self.capacity)
+        self.start = (self.start + overflow) % self.capacity
+        self.size = min(self.capacity, self.size + n)
+        self._ordered = None
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(timestamps, prices) oldest first, read-only"""
+        if self._ordered is None:
+            # Copied once per append, then shared by every query until the
+            # next one; a view would be overwritten once extend() wraps
+            end = self.start + self.size
+            wrap = max(0, end - self.capacity)
+            ts = np.concatenate((self.ts[self.start:end - wrap], self.ts[:wrap]))
+            price = np.concatenate((self.price[self.start:end - wrap], self.price[:wrap]))
+            ts.flags.writeable = False
+            price.flags.writeable = False
+            self._ordered = (ts, price)
+        return self._ordered
+
+
+def resample(ts: np.ndarray, price: np.ndarray, step: int) -> Dict[str, list]:
+    """OHLC buckets of step seconds (aligned to IST midnight, and weekly ones to Monday)"""
+    if not len(ts):
+        return {"t": [], "open": [], "high": [], "low": [], "close": [], "count": []}
+    origin = -TZ_OFFSET + (WEEK_START if step == INTERVALS["1w"] else 0)
+    buckets = (ts - origin) // step
+    starts = np.flatnonzero(np.diff(buckets)) + 1
+    starts = np.concatenate(([0], starts))
+    ends = np.concatenate((starts[1:], [len(ts)]))
+    return {
+        "t": (buckets[starts] * step + origin).tolist(),
+        "open": price[starts].tolist(),
+        "high": np.maximum.reduceat(price, starts).tolist(),
+        "low": np.minimum.reduceat(price, starts).tolist(),
+        "close": price[ends - 1].tolist(),
+        "count": (ends - starts).tolist(),
+    }
+
+
+class HistoryDependency:
+    """Cache dependency on every history file (changes whenever a point is appended)"""
+
+    def __init__(self, store: "IndexHistory"):
+        self.store = store
+        self.path = store.directory
+
+    def fingerprint(self) -> str:
+        shared = self.store.shared
+        fingerprint = shared.history_fingerprint() if shared is not None else None
+        if fingerprint:
+            return fingerprint
+        return ",".join(f"{name}:{size}:{mtime_ns}" for name, size, mtime_ns in self.store.files())
+
+    def mtime(self) -> Optional[float]:
+        files = self.store.files()
+        return max(mtime_ns for _, _, mtime_ns in files) / 1e9 if files else None
+
+
+class IndexHistory:
+    """Per-index ring buffers kept in step with the history files"""
+
+    def __init__(self, directory: str = HISTORY_DIR, capacity: int = CAPACITY, poll_interval: float = POLL_INTERVAL):
+        self.directory = directory
+        self.capacity = capacity
+        self.poll_interval = poll_interval
+        self._buffers: Dict[str, RingBuffer] = {}
+        # index -> (inode, bytes consumed) of its history file
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        # Shared-memory copy kept by another worker (shared_snapshots), used instead of the files
+        self.shared = None
+        # _files() as of the watcher's last check
+        self._listing: List[Tuple[str, int, int]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _files(self) -> List[Tuple[str, int, int]]:
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(".bin")]
+        except OSError:
+            return []
+        files = []
+        for entry in entries:
+            st = entry.stat()
+            files.append((entry.name[:-4], st.st_size, st.st_mtime_ns))
+        return sorted(files)
+
+    def files(self) -> List[Tuple[str, int, int]]:
+        """(index, size, mtime_ns) of each history file, from memory while the watcher runs"""
+        return self._listing if self._thread is not None else self._files()
+
+    def start(self) -> None:
+        """List the history files and start the thread that keeps the listing current"""
+        self._listing = self._files()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll, name="index-history-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self._listing = self._files()
+            except OSError as e:
+                print(f"Warning: index history poll failed: {e}")
+
+    def dependency(self) -> HistoryDependency:
+        return HistoryDependency(self)
+
+    def indexes(self) -> List[str]:
+        return [name for name, _, _ in self.files()]
+
+    def _sync(self, index: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Ordered arrays of an index, after reading records appended since the last call"""
+        shared = self.shared
+        if shared is not None:
+            arrays = shared.history_arrays(index)
+            if arrays is not None:
+                with self._lock:
+                    self._buffers.pop(index, None)
+                    self._offsets.pop(index, None)
+                return arrays
+        path = _history_path(index, self.directory)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            buffer = self._buffers.get(index)
+            inode, offset = self._offsets.get(index, (None, 0))
+            if buffer is None or inode != st.st_ino or st.st_size < offset:
+                # New file, or compacted/replaced: start over from its newest records
+                buffer = RingBuffer(self.capacity)
+                self._buffers[index] = buffer
+                offset = max(0, st.st_size // RECORD.itemsize - self.capacity) * RECORD.itemsize
+            complete = st.st_size - (st.st_size - offset) % RECORD.itemsize
+            if complete > offset:
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    records = np.frombuffer(f.read(complete - offset), dtype=RECORD)
+                buffer.extend(records["ts"], records["price"])
+                offset = complete
+            self._offsets[index] = (st.st_ino, offset)
+            return buffer.arrays()
+
+    def points(
+        self, index: str, start: Optional[float] = None, end: Optional[float] = None
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Raw (timestamps, prices) with start <= ts <= end, None if the index has no history"""
+        arrays = self._sync(index)
+        if arrays is None:
+            return None
+        ts, price = arrays
+        lo = np.searchsorted(ts, start, side="left") if start is not None else 0
+        hi = np.searchsorted(ts, end, side="right") if end is not None else len(ts)
+        return ts[lo:hi], price[lo:hi]
+
+    def series(
+        self,
+        index: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        interval: str = "auto",
+        max_points: int = MAX_POINTS,
+    ) -> Optional[dict]:
+        """
+        History of one index, resampled to OHLC buckets
+
+        interval is one of INTERVALS, "raw" (stored points, evenly thinned to
+        max_points) or "auto" (the finest interval with at most max_points buckets).
+
+        Returns:
+            None if the index has no history file
+        """
+        points = self.points(index, start, end)
+        if points is None:
+            return None
+        ts, price = points
+        if interval == "auto":
+            span = int(ts[-1] - ts[0]) if len(ts) else 0
+            interval = next((name for name, step in INTERVALS.items() if span // step < max_points), "1w")
+        if interval == "raw":
+            if len(ts) > max_points:
+                keep = np.linspace(0, len(ts) - 1, max_points).astype(np.int64)
+                ts, price = ts[keep], price[keep]
+            series = {"t": ts.tolist(), "price": price.tolist()}
+        else:
+            series = resample(ts, price, INTERVALS[interval])
+        return {"symbol": index, "interval": interval, "points": len(series["t"]), **series}
+
+    def stats(self) -> dict:
+        return {
+            index: {"points": len(buffer), "bytes": buffer.ts.nbytes + buffer.price.nbytes}
+            for index, buffer in self._buffers.items()
+        }
+
+
+# Global history (buffers fill from the files on first query)
+index_history = IndexHistory()
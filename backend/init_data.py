@@ -4,9 +4,10 @@ This ensures the API doesn't crash when data files are missing
 """
 
 import os
-import json
 from pathlib import Path
 
+from data_writer import write_json_atomic
+
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 
 # Default/empty data structures
@@ -57,8 +58,7 @@ def init_data_files():
         filepath = os.path.join(DATA_DIR, filename)
         if not os.path.exists(filepath):
             print(f"Initializing {filename} with default data...")
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(default_data, f, ensure_ascii=False, indent=2)
+            write_json_atomic(filepath, default_data)
             print(f"✅ Created {filename}")
         else:
             print(f"✓ {filename} already exists")
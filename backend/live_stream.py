@@ -0,0 +1,171 @@
+# live_stream.py
+"""
+Server-Sent Events push of live datasets (index quotes, gainers, losers)
+
+Each dataset is a set of keyed records built from its data file. When the
+snapshot store swaps a file in, the dataset is rebuilt on the event loop,
+diffed against the previous records, and one "update" event holding only
+the changed and removed records is encoded once and handed to every
+connected client. New clients get a "snapshot" event per dataset first.
+Event versions are the snapshot store's version of the dataset's file
+(derived from its mtime), so a client that reconnects to another worker
+keeps seeing them increase.
+
+Each client has a small bounded queue. Broadcasting never waits on a
+client: one that falls MAX_BACKLOG events behind has its backlog dropped
+and is sent fresh snapshots instead, so a slow consumer only ever costs
+itself. Idle clients are a coroutine waiting on their queue (plus a
+heartbeat comment every HEARTBEAT_INTERVAL seconds to keep proxies from
+closing the connection), which is what lets one worker hold thousands.
+"""
+
+import os
+import asyncio
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from cache_manager import encode_json
+from deltas import diff_records
+
+# Events a client may fall behind by before it is resynced with snapshots
+MAX_BACKLOG = int(os.getenv("STREAM_MAX_BACKLOG", "32"))
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", "15"))
+
+# Queued in place of a dropped backlog: send snapshots again
+_RESYNC = object()
+
+Records = Dict[str, dict]
+
+
+def format_event(event: str, data: dict, event_id: Optional[int] = None) -> bytes:
+    """One SSE message"""
+    head = f"event: {event}\n" + (f"id: {event_id}\n" if event_id is not None else "")
+    return head.encode() + b"data: " + encode_json(data) + b"\n\n"
+
+
+class StreamClient:
+    __slots__ = ("datasets", "queue", "resyncs")
+
+    def __init__(self, datasets: Iterable[str]):
+        self.datasets = frozenset(datasets)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_BACKLOG)
+        self.resyncs = 0
+
+    def offer(self, message) -> None:
+        """Queue a message without ever blocking the broadcaster"""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_RESYNC)
+            self.resyncs += 1
+
+
+class LiveStream:
+    def __init__(self, store):
+        self.store = store
+        # dataset -> (snapshot file name, async builder returning keyed records)
+        self._datasets: Dict[str, Tuple[str, Callable[[], Awaitable[Records]]]] = {}
+        self._records: Dict[str, Records] = {}
+        # dataset -> encoded snapshot event, rebuilt when the dataset changes
+        self._snapshots: Dict[str, bytes] = {}
+        # dataset -> version of its last event
+        self._versions: Dict[str, int] = {}
+        self._clients: set = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.events = 0
+
+    def register(self, name: str, filename: str, builder: Callable[[], Awaitable[Records]]) -> None:
+        self._datasets[name] = (filename, builder)
+
+    @property
+    def datasets(self) -> List[str]:
+        return list(self._datasets)
+
+    async def start(self) -> None:
+        """Build every dataset and start following snapshot swaps (call from the event loop)"""
+        first = self._loop is None
+        self._loop = asyncio.get_running_loop()
+        for name in self._datasets:
+            await self._refresh(name)
+        if first:
+            self.store.subscribe(self._on_swap)
+
+    def _on_swap(self, snapshot) -> None:
+        # Called from the snapshot watcher thread
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        for name, (filename, _) in self._datasets.items():
+            if filename == snapshot.name:
+                asyncio.run_coroutine_threadsafe(self._refresh(name), loop)
+
+    async def _refresh(self, name: str) -> None:
+        filename, builder = self._datasets[name]
+        try:
+            records = await builder()
+        except Exception as e:
+            print(f"Warning: could not rebuild stream dataset {name}: {e}")
+            return
+        old = self._records.get(name)
+        added, changed, removed = diff_records(old or {}, records)
+        changed.update(added)
+        if old is not None and not changed and not removed:
+            return
+        snapshot = self.store.get(filename)
+        previous = self._versions.get(name, 0)
+        version = snapshot.version if snapshot is not None else 0
+        if version <= previous:
+            # Records changed without a newer snapshot (e.g. a symbol name
+            # lookup filled in); versions still only move forward
+            version = previous + 1
+        self._versions[name] = version
+        self._records[name] = records
+        self._snapshots[name] = format_event(
+            "snapshot", {"dataset": name, "version": version, "records": records}, version
+        )
+        if old is None:
+            return
+        message = format_event(
+            "update",
+            {"dataset": name, "version": version, "changed": changed, "removed": removed},
+            version,
+        )
+        self.events += 1
+        for client in list(self._clients):
+            if name in client.datasets:
+                client.offer(message)
+
+    async def events_for(self, datasets: Optional[Iterable[str]] = None):
+        """Async iterator of SSE messages for one client, snapshots first"""
+        client = StreamClient(datasets or self._datasets)
+        self._clients.add(client)
+        try:
+            yield b"retry: 5000\n\n"
+            for name in self._datasets:
+                if name in client.datasets and name in self._snapshots:
+                    yield self._snapshots[name]
+            while True:
+                try:
+                    message = await asyncio.wait_for(client.queue.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if message is _RESYNC:
+                    for name in self._datasets:
+                        if name in client.datasets and name in self._snapshots:
+                            yield self._snapshots[name]
+                else:
+                    yield message
+        finally:
+            self._clients.discard(client)
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "versions": dict(self._versions),
+            "events": self.events,
+            "resyncs": sum(client.resyncs for client in self._clients),
+            "datasets": {name: len(records) for name, records in self._records.items()},
+        }
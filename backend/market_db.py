@@ -0,0 +1,507 @@
+# market_db.py
+"""
+Embedded SQLite store for market datasets
+
+One table per large dataset (block/bulk deals, past results) plus the
+symbol master, with the columns endpoints filter on indexed and the
+original record kept as compact JSON. The database runs in WAL mode, so
+API readers keep reading the last committed state while a fetch job writes.
+Every write happens in one transaction that also bumps the dataset's
+version, which cache entries depend on. The API keeps every dataset's
+version in memory, updated on its own writes and by a watcher thread that
+notices other processes' commits (PRAGMA data_version), so checking a
+cache entry never queries the database from the event loop.
+
+The small datasets (index quotes, gainers/losers, PCR, FII/DII) are served
+from the snapshot store only. fetch_nse_data.py still writes the JSON files
+as well; `python market_db.py --import` loads existing data/*.json files.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from data_writer import VOLATILE_KEYS
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib encoder
+    orjson = None
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DB_PATH = os.getenv("MARKET_DB_PATH", os.path.join(DATA_DIR, "market.db"))
+
+# Seconds between the watcher's checks for commits by other processes (and,
+# without the watcher, the longest a version read may be out of date)
+VERSION_CHECK_INTERVAL = float(os.getenv("MARKET_DB_CHECK_INTERVAL", 1.0))
+
+# JSON file each dataset is imported from
+DATASET_FILES = {
+    "block_deals": "block_deals.json",
+    "bulk_deals": "bulk_deals.json",
+    "past_results": "past_results.json",
+}
+
+# Deal fields stored in their own columns (read without decoding the payload)
+DEAL_COLUMNS = {
+    "date": "deal_date",
+    "symbol": "symbol",
+    "client_name": "client_name",
+    "buy_sell": "buy_sell",
+    "quantity": "quantity",
+    "price": "price",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    meta BLOB,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS deals (
+    kind TEXT NOT NULL,
+    deal_date TEXT,
+    symbol TEXT,
+    client_name TEXT,
+    buy_sell TEXT,
+    quantity REAL,
+    price REAL,
+    deal_key TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    UNIQUE (kind, deal_key)
+);
+CREATE INDEX IF NOT EXISTS deals_by_date ON deals (kind, deal_date);
+CREATE INDEX IF NOT EXISTS deals_by_symbol ON deals (kind, symbol, deal_date);
+CREATE TABLE IF NOT EXISTS symbols (
+    trading_symbol TEXT PRIMARY KEY,
+    token TEXT,
+    name TEXT NOT NULL,
+    exch_seg TEXT,
+    instrument_type TEXT,
+    expiry TEXT
+);
+CREATE INDEX IF NOT EXISTS symbols_by_token ON symbols (token);
+CREATE TABLE IF NOT EXISTS past_results (
+    symbol TEXT PRIMARY KEY,
+    status TEXT,
+    payload BLOB NOT NULL,
+    updated_at REAL
+);
+"""
+
+
+def _dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _loads(raw: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(str(value).replace(",", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_date(value: Any) -> Optional[str]:
+    """ISO date (YYYY-MM-DD) from the date formats NSE uses, None if unparseable"""
+    if not value:
+        return None
+    text = str(value).strip()
+    for fmt in ("%d-%m-%Y", "%d-%b-%Y", "%Y-%m-%d", "%d/%m/%Y", "%d %b %Y"):
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _field(row: dict, *names: str) -> Any:
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+class DatasetDependency:
+    """@cached depends_on entry that changes whenever a dataset is rewritten"""
+
+    def __init__(self, db: "MarketDB", name: str):
+        self.db = db
+        self.name = name
+        self.path = f"{db.path}#{name}"
+
+    def fingerprint(self) -> str:
+        # updated_at guards against a recreated database reusing version numbers
+        return f"{self.db.version(self.name)}@{self.db.updated_at(self.name)}"
+
+    def mtime(self) -> Optional[float]:
+        return self.db.updated_at(self.name)
+
+
+class MarketDB:
+    def __init__(self, path: str = DB_PATH):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        # name -> (version, updated_at); replaced wholesale, so readers need no lock
+        self._versions: Dict[str, Tuple[int, Optional[float]]] = {}
+        self._checked_at = float("-inf")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """This thread's connection (sqlite3 connections can't be shared across threads)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Autocommit mode; writes open their own transaction in _write()
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self, dataset: str, meta: Optional[dict] = None):
+        """
+        Transaction that bumps dataset's version (and replaces its meta) on
+        commit, unless it changed no rows and the meta matches what's stored
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            yield conn
+            if conn.total_changes == before and self._same_meta(conn, dataset, meta):
+                # Fetch jobs update on every run; a repeat of the stored data
+                # shouldn't invalidate cache entries that depend on it
+                conn.execute("COMMIT")
+                return
+            now = time.time()
+            conn.execute(
+                "INSERT INTO datasets (name, version, meta, updated_at) VALUES (?, 1, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET version = version + 1, "
+                "meta = COALESCE(excluded.meta, meta), updated_at = excluded.updated_at",
+                (dataset, _dumps(meta) if meta is not None else None, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._load_versions(conn)
+
+    @staticmethod
+    def _same_meta(conn: sqlite3.Connection, dataset: str, meta: Optional[dict]) -> bool:
+        row = conn.execute("SELECT meta FROM datasets WHERE name = ?", (dataset,)).fetchone()
+        if row is None:
+            return False
+        if meta is None:
+            return True
+        stored = _loads(row[0]) if row[0] is not None else None
+        if not isinstance(stored, dict):
+            return False
+        return all(
+            stored.get(k) == meta.get(k)
+            for k in stored.keys() | meta.keys()
+            if k not in VOLATILE_KEYS
+        )
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # Dataset versions and metadata
+
+    def _load_versions(self, conn: sqlite3.Connection) -> None:
+        rows = conn.execute("SELECT name, version, updated_at FROM datasets").fetchall()
+        self._versions = {name: (version, updated_at) for name, version, updated_at in rows}
+        self._checked_at = time.monotonic()
+
+    def _version_row(self, name: str) -> Tuple[int, Optional[float]]:
+        if self._thread is None and time.monotonic() - self._checked_at >= VERSION_CHECK_INTERVAL:
+            # No watcher (scripts and fetch jobs): re-read on demand
+            self._load_versions(self._connect())
+        return self._versions.get(name, (0, None))
+
+    def version(self, name: str) -> int:
+        return self._version_row(name)[0]
+
+    def updated_at(self, name: str) -> Optional[float]:
+        return self._version_row(name)[1]
+
+    def start(self) -> None:
+        """Load dataset versions and start the thread that keeps them current"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._load_versions(self._connect())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="market-db-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _watch(self) -> None:
+        conn = self._connect()
+        # Changes whenever another connection commits; reload once more in
+        # case one landed between start() and here
+        seen = conn.execute("PRAGMA data_version").fetchone()[0]
+        self._load_versions(conn)
+        while not self._stop.wait(VERSION_CHECK_INTERVAL):
+            try:
+                data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+                if data_version != seen:
+                    seen = data_version
+                    self._load_versions(conn)
+            except sqlite3.Error as e:
+                print(f"Warning: market database version check failed: {e}")
+        self.close()
+
+    def dependency(self, name: str) -> DatasetDependency:
+        return DatasetDependency(self, name)
+
+    def meta(self, name: str) -> Optional[dict]:
+        """Envelope fields (status, dates, timestamp, error) of the dataset's last write"""
+        row = self._connect().execute("SELECT meta FROM datasets WHERE name = ?", (name,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return _loads(row[0])
+
+    def set_status(self, name: str, status: str, error: Optional[str] = None) -> None:
+        """Record a failed fetch without touching the dataset's rows"""
+        meta = dict(self.meta(name) or {})
+        meta.update({"status": status, "timestamp": datetime.now().isoformat()})
+        if error is not None:
+            meta["error"] = error
+        with self._write(name, meta):
+            pass
+
+    def is_empty(self) -> bool:
+        return self._connect().execute("SELECT 1 FROM datasets LIMIT 1").fetchone() is None
+
+    # Writers
+
+    def upsert_deals(self, kind: str, payload: dict) -> int:
+        """Add block or bulk deals from a fetch; deals already stored are skipped"""
+        rows = payload.get("data") or []
+        meta = {k: v for k, v in payload.items() if k not in ("data", "count")}
+        with self._write(f"{kind}_deals", meta) as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO deals "
+                "(kind, deal_date, symbol, client_name, buy_sell, quantity, price, deal_key, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        kind,
+                        # "" rather than NULL keeps undated deals orderable for cursors
+                        parse_date(_field(row, "BD_DT_DATE", "DATE", "date", "Date")) or "",
+                        _field(row, "BD_SYMBOL", "SYMBOL", "symbol", "Symbol"),
+                        _field(row, "BD_CLIENT_NAME", "CLIENT_NAME", "client_name", "Client Name"),
+                        _field(row, "BD_BUY_SELL", "BUY_SELL", "buy_sell", "Buy/Sell"),
+                        _number(_field(row, "BD_QTY_TRD", "QTY_TRADED", "QUANTITY", "quantity", "Quantity Traded")),
+                        _number(_field(row, "BD_TP_WATP", "TRADE_PRICE", "PRICE", "price", "Trade Price / Wght. Avg. Price")),
+                        hashlib.blake2b(blob, digest_size=16).hexdigest(),
+                        blob,
+                    )
+                    for row, blob in ((row, _dumps(row)) for row in rows)
+                ],
+            )
+            return conn.total_changes - before
+
+    def upsert_past_results(self, results: Dict[str, dict]) -> None:
+        """Store each symbol's past results; symbols whose payload is unchanged are left alone"""
+        now = time.time()
+        with self._write("past_results") as conn:
+            conn.executemany(
+                "INSERT INTO past_results (symbol, status, payload, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(symbol) DO UPDATE SET status = excluded.status, payload = excluded.payload, "
+                "updated_at = excluded.updated_at WHERE payload IS NOT excluded.payload",
+                [(symbol.upper(), entry.get("status"), _dumps(entry), now) for symbol, entry in results.items()],
+            )
+
+    def replace_symbols(self, rows: List[dict]) -> None:
+        """Replace the symbol master with rows from the Angel One scrip master"""
+        with self._write("symbols", {"count": len(rows), "timestamp": datetime.now().isoformat()}) as conn:
+            conn.execute("DELETE FROM symbols")
+            conn.executemany(
+                "INSERT OR REPLACE INTO symbols (trading_symbol, token, name, exch_seg, instrument_type, expiry) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (row["symbol"], str(row.get("token", "")), row["name"], row.get("exch_seg"),
+                     row.get("instrumenttype"), row.get("expiry"))
+                    for row in rows
+                    if row.get("symbol") and row.get("name")
+                ],
+            )
+
+    # Readers
+
+    def symbols(self) -> List[tuple]:
+        """(trading_symbol, token, name, exch_seg) for every known instrument"""
+        return self._connect().execute("SELECT trading_symbol, token, name, exch_seg FROM symbols").fetchall()
+
+    def deals(
+        self,
+        kind: str,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        symbol: Optional[str] = None,
+        client: Optional[str] = None,
+        after: Optional[Tuple[str, int]] = None,
+        limit: Optional[int] = None,
+        descending: bool = False,
+        fields: Optional[List[str]] = None,
+    ) -> Tuple[List[dict], Optional[Tuple[str, int]]]:
+        """
+        Deals of kind ("block" or "bulk") between ISO dates, inclusive
+
+        Rows are ordered by (deal_date, rowid), oldest first unless descending;
+        after is the key of the last row already seen. With fields, only those
+        keys are returned, and payloads are not decoded when every field is
+        one of DEAL_COLUMNS.
+
+        Returns:
+            (rows, key of the last row if there are more, else None)
+        """
+        where, params = self._deals_filter(kind, from_date, to_date, symbol, client)
+        if after is not None:
+            where += " AND (deal_date, rowid) < (?, ?)" if descending else " AND (deal_date, rowid) > (?, ?)"
+            params.extend(after)
+        direction = "DESC" if descending else "ASC"
+        columns = [DEAL_COLUMNS[f] for f in fields if f in DEAL_COLUMNS] if fields else []
+        need_payload = not fields or any(f not in DEAL_COLUMNS for f in fields)
+        select = ", ".join(["deal_date", "rowid"] + columns + (["payload"] if need_payload else []))
+        sql = f"SELECT {select} FROM deals WHERE {where} ORDER BY deal_date {direction}, rowid {direction}"
+        if limit is not None:
+            # One extra row tells whether there's a next page
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+        found = self._connect().execute(sql, params).fetchall()
+        more = limit is not None and len(found) > limit
+        if more:
+            found = found[:limit]
+
+        rows = []
+        for row in found:
+            if not fields:
+                rows.append(_loads(row[-1]))
+                continue
+            values = dict(zip((f for f in fields if f in DEAL_COLUMNS), row[2:2 + len(columns)]))
+            payload = _loads(row[-1]) if need_payload else None
+            rows.append({f: values[f] if f in DEAL_COLUMNS else payload.get(f) for f in fields})
+        last = (found[-1][0], found[-1][1]) if more else None
+        return rows, last
+
+    def summarize_deals(
+        self,
+        kind: str,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        symbol: Optional[str] = None,
+        client: Optional[str] = None,
+    ) -> Tuple[int, Optional[str], Optional[str]]:
+        """(number of matching deals, earliest and latest ISO deal date among them)"""
+        where, params = self._deals_filter(kind, from_date, to_date, symbol, client)
+        return tuple(self._connect().execute(
+            f"SELECT COUNT(*), MIN(NULLIF(deal_date, '')), MAX(NULLIF(deal_date, '')) FROM deals WHERE {where}",
+            params,
+        ).fetchone())
+
+    @staticmethod
+    def _deals_filter(kind, from_date, to_date, symbol, client) -> Tuple[str, list]:
+        # kind + symbol + date range is covered by deals_by_symbol, kind + date range by deals_by_date
+        where, params = "kind = ?", [kind]
+        if symbol:
+            where += " AND symbol = ?"
+            params.append(symbol)
+        if from_date:
+            where += " AND deal_date >= ?"
+            params.append(from_date)
+        if to_date:
+            where += " AND deal_date <= ?"
+            params.append(to_date)
+        if client:
+            escaped = client.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where += " AND client_name LIKE ? ESCAPE '\\'"
+            params.append(f"%{escaped}%")
+        return where, params
+
+    def past_result_raw(self, symbol: str) -> Optional[bytes]:
+        """Stored JSON of one symbol's past results, not decoded"""
+        row = self._connect().execute(
+            "SELECT payload FROM past_results WHERE symbol = ?", (symbol.upper(),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def past_result(self, symbol: str) -> Optional[dict]:
+        raw = self.past_result_raw(symbol)
+        return _loads(raw) if raw is not None else None
+
+    def past_result_symbols(self) -> List[str]:
+        return [symbol for (symbol,) in self._connect().execute("SELECT symbol FROM past_results ORDER BY symbol")]
+
+    # One-off import
+
+    def import_json_dir(self, data_dir: str = DATA_DIR, names: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """Load data/*.json into the database; returns dataset -> outcome"""
+        outcome = {}
+        for name in names or DATASET_FILES:
+            path = os.path.join(data_dir, DATASET_FILES[name])
+            try:
+                with open(path, "rb") as f:
+                    payload = _loads(f.read())
+            except (OSError, ValueError) as e:
+                outcome[name] = f"skipped ({e})"
+                continue
+            if name in ("block_deals", "bulk_deals"):
+                self.upsert_deals(name.split("_", 1)[0], payload)
+            elif name == "past_results":
+                self.upsert_past_results(payload)
+            outcome[name] = "imported"
+        return outcome
+
+    def import_if_empty(self, data_dir: str = DATA_DIR) -> None:
+        """Seed a new database from the JSON files"""
+        if self.is_empty():
+            outcome = self.import_json_dir(data_dir)
+            print(f"📦 Imported data files into {self.path}: {outcome}")
+
+
+# Global database handle (connections are opened per thread on first use)
+market_db = MarketDB()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--import" in sys.argv:
+        for dataset, result in market_db.import_json_dir().items():
+            print(f"{dataset}: {result}")
+    else:
+        print("Usage: python market_db.py --import")
@@ -0,0 +1,209 @@
+# news_search.py
+"""
+Full-text search over English and Marathi news headlines
+
+An inverted index (term -> doc ids and term frequencies) kept in step with
+the news store: articles the scraper appends are tokenized and added as the
+store merges them, and articles the store drops are masked out. Queries are
+ranked with BM25, scoring each term's postings as NumPy arrays, so a query
+over tens of thousands of headlines stays well under a millisecond. Once
+dropped articles outnumber live ones the index is rebuilt from the live
+ones, so postings of evicted articles don't pile up.
+
+Tokens are Unicode-normalized runs of Latin letters/digits or Devanagari
+letters together with their vowel signs and viramas, so Marathi words aren't
+split at matras the way \\w would split them. Marathi writes case endings
+and postpositions joined to the word (सेन्सेक्समध्ये, बाजाराला), so a light
+stemmer strips those, the same way for headlines and queries.
+"""
+
+import re
+import math
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from news_store import news
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Devanagari block minus the dandas (U+0964, U+0965), which end sentences
+_TOKEN = re.compile(r"[0-9a-z\u00c0-\u024f]+|[\u0900-\u0963\u0966-\u097f]+")
+# ZWJ / ZWNJ only shape conjuncts; they shouldn't split or distinguish words
+_JOINERS = dict.fromkeys((0x200C, 0x200D))
+# Devanagari digits -> ASCII, so "२०२५" matches "2025"
+_DIGITS = {0x0966 + i: str(i) for i in range(10)}
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or s the to up with"
+    " आणि व या ते ही हे की तर पण म्हणून मध्ये साठी च्या ची चे ने वर".split()
+)
+
+# Case endings and postpositions joined to a Marathi word; the earliest
+# match wins, so the longest ending is stripped. The locative त only
+# counts after a vowel (शहरात, मुंबईत), so भारत keeps its त
+_MARATHI_SUFFIX = re.compile(
+    r"(?:मध्ये|मधील|मधून|पर्यंत|प्रमाणे|साठी|कडून|कडे|वरील|वरून|च्या|ांना|ांनी|ची|चा|चे|ला|ने|ही"
+    r"|(?<=[\u0905-\u0914\u093e-\u094c])त)$"
+)
+# Oblique vowel a case ending leaves on the stem (बाजाराला -> बाजारा -> बाजार)
+_OBLIQUE = re.compile(r"(?:ां|ा)$")
+# Consonants and independent vowels; signs and viramas don't count
+_LETTER = re.compile(r"[\u0904-\u0939\u0958-\u0961\u0972-\u097f]")
+# Letters a stem keeps, so short words (सोने, कंपनी) aren't cut to nothing
+MIN_STEM_LETTERS = 2
+
+
+def _long_enough(stem: str) -> bool:
+    return len(_LETTER.findall(stem)) >= MIN_STEM_LETTERS
+
+
+def stem(token: str) -> str:
+    """Marathi token without its case ending or postposition; other tokens unchanged"""
+    match = _MARATHI_SUFFIX.search(token)
+    if match is None or not _long_enough(token[:match.start()]):
+        return token
+    token = token[:match.start()]
+    oblique = _OBLIQUE.search(token)
+    if oblique is not None and _long_enough(token[:oblique.start()]):
+        token = token[:oblique.start()]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Search terms of a headline or query"""
+    text = unicodedata.normalize("NFC", text).casefold().translate(_JOINERS).translate(_DIGITS)
+    return [stem(token) for token in _TOKEN.findall(text) if token not in STOPWORDS]
+
+
+class NewsSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        # term -> (doc ids, term frequencies), appended to as articles arrive
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        # term -> (doc ids, BM25 weights) as arrays, built on first query after a merge
+        self._weights: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._docs: List[Optional[dict]] = []
+        self._doc_ids: Dict[str, int] = {}
+        self._lengths = np.zeros(1024, dtype=np.float64)
+        self._alive = np.zeros(1024, dtype=bool)
+        self._count = 0
+        self._total_length = 0
+        # Removed articles whose postings are still in the index
+        self._dead = 0
+
+    def apply(self, added: List[dict], dropped: List[str], reset: bool) -> None:
+        """NewsStore listener: index new articles, forget dropped ones"""
+        with self._lock:
+            if reset:
+                self._reset()
+            for article in added:
+                self._add(article)
+            for url in dropped:
+                self._remove(url)
+            if self._dead > self._count:
+                self._compact()
+            # Document count and average length moved, so every weight did
+            self._weights = {}
+
+    def _add(self, article: dict) -> None:
+        if article["url"] in self._doc_ids:
+            return
+        terms = tokenize(f"{article['english_title']} {article['marathi_title']}")
+        doc = len(self._docs)
+        if doc == len(self._lengths):
+            self._lengths = np.concatenate((self._lengths, np.zeros(doc, dtype=np.float64)))
+            self._alive = np.concatenate((self._alive, np.zeros(doc, dtype=bool)))
+        self._docs.append(article)
+        self._doc_ids[article["url"]] = doc
+        self._lengths[doc] = len(terms)
+        self._alive[doc] = True
+        self._count += 1
+        self._total_length += len(terms)
+        frequencies: Dict[str, int] = {}
+        for term in terms:
+            frequencies[term] = frequencies.get(term, 0) + 1
+        for term, tf in frequencies.items():
+            ids, tfs = self._postings.setdefault(term, ([], []))
+            ids.append(doc)
+            tfs.append(tf)
+
+    def _remove(self, url: str) -> None:
+        doc = self._doc_ids.pop(url, None)
+        if doc is None or not self._alive[doc]:
+            return
+        # Postings keep the id until the next compaction; the alive mask
+        # drops it from results
+        self._alive[doc] = False
+        self._docs[doc] = None
+        self._count -= 1
+        self._dead += 1
+        self._total_length -= int(self._lengths[doc])
+
+    def _compact(self) -> None:
+        """Rebuild from the live articles, dropping dead postings and doc slots"""
+        live = [article for article in self._docs if article is not None]
+        self._reset()
+        for article in live:
+            self._add(article)
+
+    def _term_weights(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Doc ids of a term and each one's BM25 contribution"""
+        weights = self._weights.get(term)
+        if weights is None:
+            postings = self._postings.get(term)
+            if postings is None:
+                return None
+            ids = np.asarray(postings[0], dtype=np.int64)
+            tfs = np.asarray(postings[1], dtype=np.float64)
+            # Postings of dropped articles still count toward df until the
+            # next compaction, which runs before they outnumber live ones
+            df = len(ids)
+            idf = math.log(1 + (self._count - df + 0.5) / (df + 0.5))
+            norm = K1 * (1 - B + B * self._lengths[ids] / (self._total_length / self._count))
+            weights = (ids, idf * tfs * (K1 + 1) / (tfs + norm))
+            self._weights[term] = weights
+        return weights
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> Tuple[List[dict], int]:
+        """
+        Articles matching any query term, best BM25 score first
+
+        Returns:
+            (page of articles with a "score", number of matching articles)
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            if not terms or not self._count:
+                return [], 0
+            scores = np.zeros(len(self._docs), dtype=np.float64)
+            for term in terms:
+                weights = self._term_weights(term)
+                if weights is not None:
+                    scores[weights[0]] += weights[1]
+            hits = np.flatnonzero(scores)
+            hits = hits[self._alive[hits]]
+            matched = len(hits)
+            wanted = min(matched, offset + limit)
+            if wanted == 0 or offset >= matched:
+                return [], matched
+            if wanted < matched:
+                hits = hits[np.argpartition(-scores[hits], wanted - 1)[:wanted]]
+            # Best score first; newer article (higher id) on ties
+            hits = hits[np.lexsort((-hits, -scores[hits]))][offset:wanted]
+            return [{**self._docs[doc], "score": round(float(scores[doc]), 4)} for doc in hits], matched
+
+    def stats(self) -> dict:
+        return {"documents": self._count, "dropped": self._dead, "terms": len(self._postings)}
+
+
+# Global search index, fed by the news store as articles are merged
+news_search = NewsSearchIndex()
+news.subscribe(news_search.apply)
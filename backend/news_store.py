@@ -0,0 +1,291 @@
+# news_store.py
+"""
+In-memory index of the scraped news CSV
+
+The scraper appends new articles to financial_news_marathi_api.csv, so on a
+change only the bytes past what was already read are parsed and merged in;
+a file that was rewritten or truncated is re-read from the start. Articles
+are deduplicated by URL, ordered newest first by publication time (the
+"Published" column, or when the row was first seen for files written
+before it existed) and indexed by source, so a page costs O(log n + k).
+
+Each merge builds a new immutable NewsIndex and swaps it in with one
+assignment; request threads never see a half-built index. In the API a
+watcher thread stats the file and merges changes, so requests only read
+the current index and never touch the file.
+"""
+
+import os
+import csv
+import hashlib
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pagination import encode_cursor, decode_cursor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+NEWS_CSV_PATH = os.getenv("NEWS_CSV_PATH", os.path.join(BASE_DIR, "financial_news_marathi_api.csv"))
+
+# Seconds between the watcher's checks of the CSV
+POLL_INTERVAL = float(os.getenv("NEWS_POLL_INTERVAL", 1.0))
+
+# Articles kept in memory, newest first
+MAX_ARTICLES = int(os.getenv("NEWS_MAX_ARTICLES", "5000"))
+
+# (published_at, seq) sort key carried by cursors
+_CURSOR_TYPES = (str, int)
+
+# Bytes before the read offset whose digest must still match for an append-only read
+_TAIL_CHECK = 256
+
+
+def _article(row: dict, seen_at: str) -> Optional[dict]:
+    """Article dict for a CSV row, None for malformed rows"""
+    source = (row.get("Source") or "").strip()
+    en_title = (row.get("English Title") or "").strip()
+    mr_title = (row.get("Marathi Title") or "").strip()
+    url = (row.get("URL") or "").strip()
+    if not (source and (en_title or mr_title) and url):
+        return None
+    return {
+        "source": source,
+        "english_title": en_title,
+        "marathi_title": mr_title,
+        "url": url,
+        "published_at": (row.get("Published") or "").strip() or seen_at,
+    }
+
+
+class NewsIndex:
+    """One immutable version of the article set"""
+
+    __slots__ = ("articles", "seqs", "keys", "by_source", "source_keys", "tag")
+
+    def __init__(self, entries: List[Tuple[dict, int]], tag: str):
+        # (article, seq) ascending by (published_at, -seq), so walking it
+        # backwards gives newest first and, within one time, file order
+        self.articles = [article for article, _ in entries]
+        self.seqs = [seq for _, seq in entries]
+        self.keys = [(article["published_at"], -seq) for article, seq in entries]
+        # source (lower-cased) -> positions in articles, ascending
+        self.by_source: Dict[str, List[int]] = {}
+        for i, article in enumerate(self.articles):
+            self.by_source.setdefault(article["source"].lower(), []).append(i)
+        # source -> keys of its positions, so a cursor bisects in O(log n)
+        self.source_keys = {
+            source: [self.keys[i] for i in positions] for source, positions in self.by_source.items()
+        }
+        # Identifies the file content the index was built from
+        self.tag = tag
+
+    def query(
+        self, limit: int = 20, source: Optional[str] = None, cursor: Optional[str] = None
+    ) -> Tuple[List[dict], int, Optional[str]]:
+        """
+        Newest articles first, optionally from one source
+
+        Returns:
+            (page of articles, number matching the filter, cursor for the next page)
+        """
+        positions = self.by_source.get(source.lower(), []) if source else None
+        matched = len(positions) if positions is not None else len(self.articles)
+        hi = matched
+        if cursor:
+            published_at, seq = decode_cursor(cursor, _CURSOR_TYPES)
+            key = (published_at, -seq)
+            if positions is None:
+                hi = bisect_left(self.keys, key)
+            else:
+                hi = bisect_left(self.source_keys.get(source.lower(), []), key)
+        lo = max(0, hi - limit)
+        page = range(hi - 1, lo - 1, -1) if positions is None else positions[lo:hi][::-1]
+        articles = [self.articles[i] for i in page]
+        next_cursor = None
+        if lo > 0 and articles:
+            last = page[-1]
+            next_cursor = encode_cursor((self.articles[last]["published_at"], self.seqs[last]))
+        return articles, matched, next_cursor
+
+
+class NewsDependency:
+    """@cached depends_on entry: changes whenever new articles are merged in"""
+
+    def __init__(self, store: "NewsStore"):
+        self.store = store
+        self.path = store.path
+
+    def fingerprint(self) -> str:
+        index = self.store.index()
+        return index.tag if index is not None else "missing"
+
+    def mtime(self) -> Optional[float]:
+        return self.store.loaded_mtime
+
+
+class NewsStore:
+    def __init__(self, path: str = NEWS_CSV_PATH, max_articles: int = MAX_ARTICLES, poll_interval: float = POLL_INTERVAL):
+        self.path = os.path.abspath(path)
+        self.max_articles = max_articles
+        self.poll_interval = poll_interval
+        self._index: Optional[NewsIndex] = None
+        self._lock = threading.Lock()
+        # What has been consumed of the current file
+        self._inode = None
+        self._offset = 0
+        self._tail_digest = None
+        self._stat = None
+        self._fieldnames: Optional[List[str]] = None
+        # Arrival order of articles, the tie-break within one publication time
+        self._seq = 0
+        self.loaded_mtime: Optional[float] = None
+        self._listeners: List[Callable[[List[dict], List[str], bool], None]] = []
+        self.full_reloads = 0
+        self.incremental_reloads = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def dependency(self) -> NewsDependency:
+        return NewsDependency(self)
+
+    def index(self) -> Optional[NewsIndex]:
+        """
+        Current index; without the watcher thread (scripts), after merging
+        anything written since the last call
+        """
+        if self._thread is None:
+            self.check()
+        return self._index
+
+    def check(self) -> None:
+        """Merge whatever was written to the CSV since the last check"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        if (st.st_ino, st.st_mtime_ns, st.st_size) != self._stat:
+            self._refresh(st)
+
+    def start(self) -> None:
+        """Read the CSV and start the thread that merges changes"""
+        self.check()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll, name="news-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Warning: news poll failed: {e}")
+
+    @staticmethod
+    def _tail(f, offset: int) -> str:
+        start = max(0, offset - _TAIL_CHECK)
+        f.seek(start)
+        return hashlib.blake2b(f.read(offset - start), digest_size=16).hexdigest()
+
+    def _refresh(self, st: os.stat_result) -> None:
+        with self._lock:
+            if (st.st_ino, st.st_mtime_ns, st.st_size) == self._stat:
+                return
+            try:
+                with open(self.path, "rb") as f:
+                    append_only = (
+                        self._index is not None
+                        and st.st_ino == self._inode
+                        and st.st_size >= self._offset
+                        and self._tail(f, self._offset) == self._tail_digest
+                    )
+                    start = self._offset if append_only else 0
+                    f.seek(start)
+                    raw = f.read(st.st_size - start)
+                    # Only whole lines; the rest is probably still being written
+                    end = start + raw.rfind(b"\n") + 1
+                    tail_digest = self._tail(f, end)
+            except OSError as e:
+                print(f"Warning: could not read {self.path}: {e}")
+                return
+            lines = raw[:end - start].decode("utf-8-sig" if start == 0 else "utf-8", errors="replace").splitlines()
+
+            if start == 0:
+                # utf-8-sig stripped the BOM the scraper writes before the header
+                header = next(csv.reader(lines[:1]), [])
+                self._fieldnames = [name.strip() for name in header]
+                lines = lines[1:]
+                entries: Dict[str, Tuple[dict, int]] = {}
+            else:
+                index = self._index
+                entries = {article["url"]: (article, seq) for article, seq in zip(index.articles, index.seqs)}
+
+            seen_at = datetime.fromtimestamp(st.st_mtime).isoformat(timespec="seconds")
+            added = []
+            for row in csv.DictReader(lines, fieldnames=self._fieldnames):
+                article = _article(row, seen_at)
+                if article is None or article["url"] in entries:
+                    continue
+                self._seq += 1
+                entries[article["url"]] = (article, self._seq)
+                added.append(article)
+
+            self._inode, self._offset, self._tail_digest = st.st_ino, end, tail_digest
+            self._stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+            self.loaded_mtime = st.st_mtime
+            if start:
+                self.incremental_reloads += 1
+                if not added:
+                    return
+            else:
+                self.full_reloads += 1
+
+            ordered = sorted(entries.values(), key=lambda entry: (entry[0]["published_at"], -entry[1]))
+            dropped = [article["url"] for article, _ in ordered[:-self.max_articles]]
+            tag = f"{st.st_ino}-{end}-{tail_digest[:16]}"
+            self._index = NewsIndex(ordered[-self.max_articles:], tag)
+            for listener in self._listeners:
+                try:
+                    listener(added, dropped, start == 0)
+                except Exception as e:
+                    print(f"Warning: news listener failed: {e}")
+
+    def subscribe(self, listener: Callable[[List[dict], List[str], bool], None]) -> None:
+        """
+        Call listener(added articles, dropped urls, reset) after every merge;
+        on reset, added is the whole file and earlier articles are gone.
+        The listener is first called with the current articles as a reset.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+            if self._index is not None:
+                listener(list(self._index.articles), [], True)
+
+    def query(self, limit: int = 20, source: Optional[str] = None, cursor: Optional[str] = None):
+        """NewsIndex.query on the current index; None if the CSV has never been readable"""
+        index = self.index()
+        if index is None:
+            return None
+        return index.query(limit, source, cursor)
+
+    def stats(self) -> dict:
+        index = self._index
+        return {
+            "articles": len(index.articles) if index is not None else 0,
+            "sources": sorted(index.by_source) if index is not None else [],
+            "tag": index.tag if index is not None else None,
+            "full_reloads": self.full_reloads,
+            "incremental_reloads": self.incremental_reloads,
+        }
+
+
+# Global news store (read on first use or start(), refreshed when the CSV changes)
+news = NewsStore()
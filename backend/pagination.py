@@ -0,0 +1,32 @@
+# pagination.py
+"""
+Opaque cursors for keyset pagination
+
+A cursor is the sort key of the last row of a page, JSON-encoded and
+base64url'd, so clients pass it back without interpreting it.
+"""
+
+import base64
+import json
+from typing import Sequence, Tuple
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(key: Sequence) -> str:
+    raw = json.dumps(list(key), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> Tuple:
+    """Sort key from a cursor, each part converted with the matching type"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        parts = json.loads(raw)
+        if not isinstance(parts, list) or len(parts) != len(types):
+            raise ValueError("wrong number of parts")
+        return tuple(kind(part) for kind, part in zip(types, parts))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
@@ -0,0 +1,125 @@
+# pcr_view.py
+"""
+Precomputed Put/Call Ratio view
+
+Built once per put_call_ratio.json snapshot: symbols normalized, rows
+sorted by PCR, aggregates computed, plus a prefix index mapping every
+prefix of every symbol to its rows' positions in PCR order. Queries then
+cost O(log n + k), with or without a prefix: bisect to the PCR range (or
+cursor position) and slice k rows.
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pagination import encode_cursor, decode_cursor
+
+ORDERS = ("asc", "desc")
+
+# (pcr, tradingSymbol) sort key carried by cursors
+_CURSOR_TYPES = (float, str)
+
+
+class PCRView:
+    __slots__ = ("rows", "keys", "pcrs", "prefix_rows", "exchange", "total_symbols",
+                 "avg_pcr", "max_pcr", "min_pcr")
+
+    def __init__(self, rows: List[dict], exchange: str, total_symbols: int):
+        # Ascending by (pcr, tradingSymbol); descending order walks it backwards
+        self.rows = rows
+        self.keys = [(row["pcr"], row["tradingSymbol"]) for row in rows]
+        self.pcrs = [row["pcr"] for row in rows]
+        # prefix -> ascending positions in rows of symbols starting with it
+        # (symbols are short, so this is a few entries per row)
+        self.prefix_rows: Dict[str, List[int]] = {}
+        for i, row in enumerate(rows):
+            symbol = row["symbol"] or ""
+            for end in range(1, len(symbol) + 1):
+                self.prefix_rows.setdefault(symbol[:end], []).append(i)
+        self.exchange = exchange
+        self.total_symbols = total_symbols
+        self.avg_pcr = sum(self.pcrs) / len(self.pcrs) if rows else 0
+        self.max_pcr = self.pcrs[-1] if rows else 0
+        self.min_pcr = self.pcrs[0] if rows else 0
+
+    @classmethod
+    def build(cls, payload: dict, names_of: Callable[[List[dict]], List[str]]) -> Optional["PCRView"]:
+        """View of a put_call_ratio.json payload, None unless its status is ok"""
+        if not isinstance(payload, dict) or payload.get("status") != "ok":
+            return None
+        items = payload.get("data") or []
+        rows = []
+        for item, name in zip(items, names_of(items)):
+            try:
+                pcr = float(item.get("pcr", 0))
+            except (TypeError, ValueError):
+                continue
+            rows.append({"symbol": name, "pcr": pcr, "tradingSymbol": item.get("tradingSymbol", "")})
+        rows.sort(key=lambda row: (row["pcr"], row["tradingSymbol"]))
+        return cls(rows, payload.get("exchange", "NSE"), len(items))
+
+    def query(
+        self,
+        min_pcr: Optional[float] = None,
+        max_pcr: Optional[float] = None,
+        order: str = "desc",
+        limit: int = 100,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        prefix: Optional[str] = None,
+    ) -> Tuple[List[dict], int, Optional[str]]:
+        """
+        Rows with min_pcr <= pcr <= max_pcr, optionally with symbols
+        starting with prefix, in PCR order
+
+        Returns:
+            (page of rows, number of rows matching the filters, cursor for the next page)
+        """
+        lo = bisect_left(self.pcrs, min_pcr) if min_pcr is not None else 0
+        hi = bisect_right(self.pcrs, max_pcr) if max_pcr is not None else len(self.rows)
+
+        if prefix:
+            # Positions are in PCR order, so the range and the cursor are
+            # bisections of the prefix's list just as of the full one
+            positions = self.prefix_rows.get(prefix, [])
+            start = bisect_left(positions, lo)
+            end = bisect_left(positions, hi, start)
+            matched = end - start
+            if cursor:
+                key = decode_cursor(cursor, _CURSOR_TYPES)
+                if order == "asc":
+                    start = max(start, bisect_left(positions, bisect_right(self.keys, key)))
+                else:
+                    end = min(end, bisect_left(positions, bisect_left(self.keys, key)))
+            if order == "asc":
+                page = positions[start + offset:min(end, start + offset + limit)]
+                more = start + offset + limit < end
+            else:
+                stop = max(start, end - offset - limit)
+                page = positions[stop:max(stop, end - offset)][::-1]
+                more = stop > start
+        else:
+            matched = max(0, hi - lo)
+            if cursor:
+                key = decode_cursor(cursor, _CURSOR_TYPES)
+                if order == "asc":
+                    lo = max(lo, bisect_right(self.keys, key))
+                else:
+                    hi = min(hi, bisect_left(self.keys, key))
+            if order == "asc":
+                page = range(lo + offset, min(hi, lo + offset + limit))
+                more = lo + offset + limit < hi
+            else:
+                page = range(hi - 1 - offset, max(lo, hi - offset - limit) - 1, -1)
+                more = hi - offset - limit > lo
+
+        rows = [self.rows[i] for i in page]
+        next_cursor = encode_cursor(self.keys[page[-1]]) if more and rows else None
+        return rows, matched, next_cursor
+
+    def records(
+        self, min_pcr: Optional[float] = None, max_pcr: Optional[float] = None, prefix: Optional[str] = None
+    ) -> Dict[str, dict]:
+        """Every row matching the filters, keyed by tradingSymbol (for deltas between versions)"""
+        rows, _, _ = self.query(min_pcr=min_pcr, max_pcr=max_pcr, order="asc", limit=len(self.rows), prefix=prefix)
+        return {row["tradingSymbol"]: row for row in rows}
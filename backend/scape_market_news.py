@@ -3,6 +3,8 @@ from bs4 import BeautifulSoup
 import pandas as pd
 import time
 import os
+import tempfile
+from datetime import datetime
 
 # ------------------------------------------------------
 # 1️⃣  Configuration
@@ -137,11 +139,56 @@ def scrape_all_sources():
 
     return all_articles
 
+NEWS_CSV = "financial_news_marathi_api.csv"
+NEWS_COLUMNS = ["Source", "English Title", "Marathi Title", "URL", "Published"]
+MAX_SAVED_ARTICLES = 5000
+
+def load_saved_articles():
+    if not os.path.exists(NEWS_CSV):
+        return pd.DataFrame(columns=NEWS_COLUMNS)
+    return pd.read_csv(NEWS_CSV, encoding="utf-8-sig", dtype=str).fillna("")
+
+def write_csv_atomic(frame):
+    """Replace NEWS_CSV with frame in one rename, so the API never reads a half-written file"""
+    directory = os.path.dirname(os.path.abspath(NEWS_CSV))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(NEWS_CSV)}.", suffix=".tmp")
+    try:
+        os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, "w", encoding="utf-8-sig", newline="") as f:
+            frame.to_csv(f, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, NEWS_CSV)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def save_articles(saved, data):
+    new = pd.DataFrame(data, columns=NEWS_COLUMNS)
+    if not os.path.exists(NEWS_CSV):
+        write_csv_atomic(new)
+    elif list(saved.columns) == NEWS_COLUMNS and len(saved) + len(new) <= MAX_SAVED_ARTICLES:
+        # Append only the new rows; the API reads only whole lines and merges just the appended bytes
+        new.to_csv(NEWS_CSV, mode="a", header=False, index=False, encoding="utf-8")
+    else:
+        # Older file layout, or too many rows: rewrite with the newest articles
+        merged = pd.concat([saved.reindex(columns=NEWS_COLUMNS, fill_value=""), new])
+        write_csv_atomic(merged.tail(MAX_SAVED_ARTICLES))
+
 def main():
-    articles = scrape_all_sources()
+    saved = load_saved_articles()
+    known_urls = set(saved["URL"]) if "URL" in saved else set()
+    articles = []
+    for source, title, link in scrape_all_sources():
+        if link not in known_urls:
+            known_urls.add(link)
+            articles.append((source, title, link))
     data = []
 
-    print(f"\n🔍 Found {len(articles)} articles. Translating to Marathi via Hugging Face API...\n")
+    print(f"\n🔍 Found {len(articles)} new articles. Translating to Marathi via Hugging Face API...\n")
 
     for source, title, link in articles:
         marathi_title = translate_to_marathi(title)
@@ -149,14 +196,14 @@ def main():
             "Source": source,
             "English Title": title,
             "Marathi Title": marathi_title,
-            "URL": link
+            "URL": link,
+            "Published": datetime.now().isoformat(timespec="seconds"),
         })
         time.sleep(2)  # avoid API rate limits
 
-    df = pd.DataFrame(data)
-    df.to_csv("financial_news_marathi_api.csv", index=False, encoding="utf-8-sig")
+    save_articles(saved, data)
 
-    print("\n✅ Done! Saved results to financial_news_marathi_api.csv")
+    print(f"\n✅ Done! Saved {len(data)} new articles to {NEWS_CSV}")
 
 if __name__ == "__main__":
     main()
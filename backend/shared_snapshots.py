@@ -0,0 +1,466 @@
+# shared_snapshots.py
+"""
+Data snapshots shared between uvicorn worker processes
+
+With SHARED_SNAPSHOTS=1, one worker (whichever holds the loader lock)
+watches the data files as usual and publishes what it loads as files in
+SHARED_SNAPSHOTS_DIR (/dev/shm, i.e. memory, where available); the other
+workers stop reading the data files and mmap those instead:
+
+- index history is published as columnar int64 timestamps followed by
+  float64 prices, which the other workers wrap with NumPy straight from a
+  read-only mapping, so the multi-megabyte history buffers exist once per
+  machine rather than once per worker
+- data file snapshots are published as compact JSON together with the
+  loader's version and digest, so every worker hands out the same versions
+  and ETags and no worker re-reads a file the loader already read. These
+  are decoded into each worker's own objects (the handlers and views work
+  on dicts, which can't live in shared memory); they are small, so that
+  copy is cheap, but it is a copy per worker
+
+Every dataset has one file with a stable name, {prefix}-{dataset}. A
+publish writes a temp file and renames it over that name, so a worker still
+mapping the previous file keeps a valid mapping until it lets go. Each file
+starts with the generation the manifest lists for it, so a worker can tell
+a newer file from the one the manifest described. The manifest,
+{prefix}-manifest, lists each dataset's generation, size and version behind
+a sequence counter that is odd while it is being rewritten.
+
+The loader owns the files: on taking over it replaces whatever a previous
+loader left and removes the rest, and on shutdown it removes them all. If
+the loader exits, another worker takes the lock and republishes.
+
+Without SHARED_SNAPSHOTS (or without fcntl, i.e. on Windows) every worker
+loads its own snapshots as before.
+"""
+
+import os
+import re
+import json
+import mmap
+import time
+import struct
+import hashlib
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Every worker loads its own snapshots
+    fcntl = None
+
+from cache_manager import encode_json
+from snapshot_store import DATA_DIR, POLL_INTERVAL, load_json, snapshots
+from index_history import index_history
+
+ENABLED = os.getenv("SHARED_SNAPSHOTS", "").lower() in ("1", "true", "yes")
+# Where the shared files live; a tmpfs keeps them in memory
+DIRECTORY = os.getenv("SHARED_SNAPSHOTS_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+# File names start with this; derived from the data directory by default so
+# two deployments on one host don't share files
+PREFIX = os.getenv("SHARED_SNAPSHOTS_PREFIX") or (
+    "sfs-" + hashlib.blake2b(os.path.abspath(DATA_DIR).encode(), digest_size=4).hexdigest()
+)
+# Seconds a starting worker waits for the loader before reading the files itself
+WAIT = float(os.getenv("SHARED_SNAPSHOTS_WAIT", "5"))
+
+MANIFEST_BYTES = 64 * 1024
+# Manifest header: sequence (odd while being rewritten), length of the JSON after it
+_HEADER = struct.Struct("<QI")
+# Dataset file header: generation; the payload follows (8-byte aligned for NumPy)
+_FILE_HEADER = struct.Struct("<Q")
+
+
+def _file(directory: str, prefix: str, key: str) -> str:
+    """Stable path of the manifest or a dataset key such as snapshot/index_quotes.json"""
+    return os.path.join(directory, f"{prefix}-" + re.sub(r"[^A-Za-z0-9_.-]", "_", key.replace("/", "-")))
+
+
+def _map(path: str) -> mmap.mmap:
+    """Read-only mapping of a whole file"""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class Manifest:
+    """Dataset -> file entries, readable while another process rewrites them"""
+
+    def __init__(self, mm: mmap.mmap, path: str):
+        self.mm = mm
+        self.path = path
+
+    @classmethod
+    def create(cls, path: str) -> "Manifest":
+        """Writable manifest at path, taking over one a previous loader left"""
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            # Sized before it appears under its name, so readers never map a short file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.")
+            os.fchmod(fd, 0o644)
+            os.ftruncate(fd, MANIFEST_BYTES)
+            os.replace(tmp_path, path)
+        try:
+            return cls(mmap.mmap(fd, MANIFEST_BYTES), path)
+        finally:
+            os.close(fd)
+
+    @classmethod
+    def open(cls, path: str) -> "Manifest":
+        return cls(_map(path), path)
+
+    def sequence(self) -> int:
+        return _HEADER.unpack_from(self.mm)[0]
+
+    def read(self, attempts: int = 1000) -> Optional[Tuple[int, dict]]:
+        """(sequence, content), None if the writer never finished (it died mid-write)"""
+        for _ in range(attempts):
+            sequence, length = _HEADER.unpack_from(self.mm)
+            if sequence % 2 == 0:
+                raw = self.mm[_HEADER.size:_HEADER.size + length]
+                if self.sequence() == sequence:
+                    return sequence, (json.loads(raw) if raw else {})
+            time.sleep(0.001)
+        return None
+
+    def write(self, content: dict) -> None:
+        raw = json.dumps(content, separators=(",", ":")).encode()
+        if _HEADER.size + len(raw) > MANIFEST_BYTES:
+            raise ValueError(f"Shared snapshot manifest is over {MANIFEST_BYTES} bytes")
+        sequence = self.sequence()
+        sequence += 1 if sequence % 2 == 0 else 0
+        struct.pack_into("<Q", self.mm, 0, sequence)
+        self.mm[_HEADER.size:_HEADER.size + len(raw)] = raw
+        _HEADER.pack_into(self.mm, 0, sequence + 1, len(raw))
+
+    def close(self) -> None:
+        self.mm.close()
+
+
+class SharedPublisher:
+    """Loader side: writes each dataset to its file and records it in the manifest"""
+
+    def __init__(self, prefix: str, directory: str = DIRECTORY):
+        self.prefix = prefix
+        self.directory = directory
+        self.manifest = Manifest.create(_file(directory, prefix, "manifest"))
+        # A loader that died mid-write leaves the sequence odd; write() copes
+        previous = self.manifest.read(attempts=1)
+        previous = previous[1] if previous is not None else {}
+        # Generations keep counting up across loaders, so a reader never
+        # mistakes a republished file for the one it already mapped
+        self._generation = previous.get("generation", 0)
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, key: str, meta: dict, buffers: List) -> None:
+        """Write buffers (bytes or contiguous arrays) end to end as key's file"""
+        views = [memoryview(b).cast("B") for b in buffers]
+        size = sum(len(view) for view in views)
+        path = _file(self.directory, self.prefix, key)
+        with self._lock:
+            self._generation += 1
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{os.path.basename(path)}.")
+            try:
+                os.fchmod(fd, 0o644)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(_FILE_HEADER.pack(self._generation))
+                    for view in views:
+                        f.write(view)
+                # Readers mapping the previous file keep it until they let go
+                os.replace(tmp_path, path)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+            self._entries[key] = {**meta, "generation": self._generation, "bytes": size}
+            self.manifest.write({"closed": False, "generation": self._generation, "entries": self._entries})
+
+    def drop_stale(self) -> None:
+        """Remove files of this prefix that no current entry uses (left by a previous loader)"""
+        keep = {self.manifest.path} | {_file(self.directory, self.prefix, key) for key in self._entries}
+        for path in self._files():
+            if path not in keep:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def _files(self) -> List[str]:
+        try:
+            entries = os.scandir(self.directory)
+        except OSError:
+            return []
+        with entries:
+            return [
+                entry.path for entry in entries
+                if entry.name.startswith((f"{self.prefix}-", f".{self.prefix}-"))
+            ]
+
+    def close(self) -> None:
+        """Tell readers the loader is gone and remove every file"""
+        with self._lock:
+            self.manifest.write({"closed": True, "generation": self._generation, "entries": {}})
+            self._entries = {}
+            self.manifest.close()
+            for path in self._files():
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+
+class SharedReader:
+    """Worker side: follows the manifest and maps the files it lists"""
+
+    def __init__(self, prefix: str, directory: str = DIRECTORY):
+        self.prefix = prefix
+        self.directory = directory
+        path = _file(directory, prefix, "manifest")
+        try:
+            self.manifest = Manifest.open(path)
+        except ValueError:
+            # Empty file: not a manifest
+            raise FileNotFoundError(path)
+        self.sequence: Optional[int] = None
+        self.entries: Dict[str, dict] = {}
+        self.closed = False
+        # key -> (generation, arrays viewing the file's mapping)
+        self._mapped: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def poll(self) -> Dict[str, dict]:
+        """Entries that changed since the last poll"""
+        if self.manifest.sequence() == self.sequence:
+            return {}
+        read = self.manifest.read()
+        if read is None:
+            return {}
+        self.sequence, content = read
+        entries = content.get("entries", {})
+        changed = {key: entry for key, entry in entries.items() if self.entries.get(key) != entry}
+        self.entries = entries
+        self.closed = bool(content.get("closed"))
+        return changed
+
+    def _open(self, key: str, entry: dict) -> Optional[mmap.mmap]:
+        """Read-only mapping of key's file, None unless it's the generation entry lists"""
+        try:
+            mm = _map(_file(self.directory, self.prefix, key))
+        except (OSError, ValueError):
+            return None
+        if len(mm) < _FILE_HEADER.size + entry["bytes"] or _FILE_HEADER.unpack_from(mm)[0] != entry["generation"]:
+            # Replaced since the manifest was read; the next poll lists the new one
+            mm.close()
+            return None
+        return mm
+
+    def read_bytes(self, key: str, entry: dict) -> Optional[bytes]:
+        """Contents of an entry's file, None if it was replaced meanwhile"""
+        mm = self._open(key, entry)
+        if mm is None:
+            return None
+        try:
+            return mm[_FILE_HEADER.size:_FILE_HEADER.size + entry["bytes"]]
+        finally:
+            mm.close()
+
+    def arrays(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Read-only (timestamps, prices) views of a history entry's file, without copying"""
+        with self._lock:
+            entry = self.entries.get(key)
+            mapped = self._mapped.get(key)
+            if entry is None:
+                return None
+            if mapped is not None and mapped[0] == entry["generation"]:
+                return mapped[1]
+            mm = self._open(key, entry)
+            if mm is None:
+                return mapped[1] if mapped is not None else None
+            points = entry["points"]
+            # The arrays hold the mapping; it's unmapped once the last view is gone
+            ts = np.frombuffer(mm, dtype=np.int64, count=points, offset=_FILE_HEADER.size)
+            price = np.frombuffer(mm, dtype=np.float64, count=points, offset=_FILE_HEADER.size + points * 8)
+            self._mapped[key] = (entry["generation"], (ts, price))
+            return ts, price
+
+    def close(self) -> None:
+        with self._lock:
+            self._mapped = {}
+        self.manifest.close()
+
+
+class SharedSnapshots:
+    """Loader election and the loader / reader loop for one worker"""
+
+    def __init__(self, store=snapshots, history=index_history, prefix: str = PREFIX, directory: str = DIRECTORY,
+                 enabled: bool = ENABLED, poll_interval: float = POLL_INTERVAL, wait: float = WAIT):
+        self.store = store
+        self.history = history
+        self.prefix = prefix
+        self.directory = directory
+        self.enabled = enabled and fcntl is not None
+        self.poll_interval = poll_interval
+        self.wait = wait
+        self.lock_path = os.path.join(store.data_dir, f".{prefix}.lock")
+        self.role = "off"
+        self.publisher: Optional[SharedPublisher] = None
+        self.reader: Optional[SharedReader] = None
+        self._lock_fd: Optional[int] = None
+        # index -> (points, last timestamp) last published
+        self._history_published: Dict[str, Tuple[int, int]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        store.subscribe(self._on_swap)
+
+    def start(self) -> None:
+        if not self.enabled:
+            self.store.start()
+            return
+        self._stop.clear()
+        if not self._lead():
+            self.role = "reader"
+            self.history.shared = self
+            deadline = time.monotonic() + self.wait
+            # Install the loader's snapshots before anything is read privately
+            while not self._follow() and time.monotonic() < deadline:
+                time.sleep(0.05)
+        self._thread = threading.Thread(target=self._run, name="shared-snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self.publisher is not None:
+            self.publisher.close()
+            self.publisher = None
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # Releases the lock for another worker
+            self._lock_fd = None
+        self.history.shared = None
+        self.role = "off"
+        self.store.stop()
+
+    def _lead(self) -> bool:
+        """Become the loader if no other worker is"""
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        self.history.shared = None
+        self.publisher = SharedPublisher(self.prefix, self.directory)
+        self.role = "loader"
+        self.store.start()
+        for name in self.store.names():
+            snapshot = self.store.get(name)
+            if snapshot is not None:
+                self._on_swap(snapshot)
+        self._publish_history()
+        self.publisher.drop_stale()
+        print(f"📡 Publishing data snapshots to {self.directory} ({self.prefix}-*)")
+        return True
+
+    def _on_swap(self, snapshot) -> None:
+        publisher = self.publisher
+        if self.role != "loader" or publisher is None:
+            return
+        try:
+            raw = encode_json(snapshot.data)
+        except TypeError as e:
+            print(f"Warning: not sharing {snapshot.name}: {e}")
+            return
+        meta = {
+            "version": snapshot.version,
+            "digest": snapshot.digest,
+            "mtime_ns": snapshot.mtime_ns,
+            "size": snapshot.size,
+        }
+        publisher.publish(f"snapshot/{snapshot.name}", meta, [raw])
+
+    def _publish_history(self) -> None:
+        for index in self.history.indexes():
+            points = self.history.points(index)
+            if points is None:
+                continue
+            ts, price = points
+            mark = (len(ts), int(ts[-1]) if len(ts) else 0)
+            if self._history_published.get(index) == mark:
+                continue
+            self.publisher.publish(f"history/{index}", {"points": mark[0], "last": mark[1]}, [ts, price])
+            self._history_published[index] = mark
+
+    def _follow(self) -> bool:
+        """Install snapshots the loader published since the last call; False while there is no loader"""
+        if self.reader is None:
+            try:
+                self.reader = SharedReader(self.prefix, self.directory)
+            except FileNotFoundError:
+                return False
+        changed = self.reader.poll()
+        if self.reader.closed:
+            # The loader stopped; keep serving what is installed until a worker takes over
+            self.reader.close()
+            self.reader = None
+            return False
+        for key, entry in changed.items():
+            if not key.startswith("snapshot/"):
+                continue
+            raw = self.reader.read_bytes(key, entry)
+            if raw is None:
+                self.reader.sequence = None  # Re-read the manifest next time
+                continue
+            self.store.install(
+                key[len("snapshot/"):], load_json(raw), entry["digest"], entry["version"], entry["mtime_ns"], entry["size"]
+            )
+        return bool(self.reader.entries)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                if self.role == "loader":
+                    self._publish_history()
+                elif not self._lead():
+                    self._follow()
+            except Exception as e:
+                print(f"Warning: shared snapshot sync failed: {e}")
+
+    # Index history source for IndexHistory.shared
+
+    def history_arrays(self, index: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        reader = self.reader
+        return reader.arrays(f"history/{index}") if reader is not None else None
+
+    def history_fingerprint(self) -> Optional[str]:
+        reader = self.reader
+        if reader is None:
+            return None
+        marks = sorted(
+            f"{key[len('history/'):]}:{entry['points']}:{entry['last']}"
+            for key, entry in reader.entries.items() if key.startswith("history/")
+        )
+        return ",".join(marks) or None
+
+    def stats(self) -> dict:
+        reader, publisher = self.reader, self.publisher
+        entries = reader.entries if reader is not None else publisher._entries if publisher is not None else {}
+        return {"role": self.role, "directory": self.directory, "prefix": self.prefix, "datasets": sorted(entries)}
+
+
+# Global coordinator; app.py starts it in place of snapshots.start()
+shared_snapshots = SharedSnapshots()
@@ -0,0 +1,307 @@
+# snapshot_store.py
+"""
+In-memory snapshots of the data files the API serves
+
+The small data files the API serves whole (SNAPSHOT_FILES, plus any other
+registered file) are parsed once and kept as immutable in-memory objects;
+the large datasets in the market database are not loaded. A watcher thread
+(inotify through watchfiles, or stat polling when that isn't installed)
+re-parses only the file that changed and swaps the new snapshot in with a
+single assignment, so request threads never parse files, never wait on a
+reload and never see a half-written file: a file that fails to parse keeps
+its previous snapshot until the next write.
+
+Snapshot data is shared by every request; callers must copy before
+modifying it.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib parser
+    orjson = None
+
+try:
+    import watchfiles
+except ImportError:  # Stat polling is used instead
+    watchfiles = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+# data/ files served from snapshots; block/bulk deals and past results are
+# served from the market database and never loaded here
+SNAPSHOT_FILES = (
+    "index_quotes.json",
+    "top_gainers.json",
+    "top_losers.json",
+    "put_call_ratio.json",
+    "fii_dii.json",
+)
+
+# Seconds between stat checks when polling
+POLL_INTERVAL = float(os.getenv("SNAPSHOT_POLL_INTERVAL", 1.0))
+
+
+def load_json(raw: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode("utf-8"))
+
+
+class Snapshot:
+    """One parsed version of a file"""
+    __slots__ = ("name", "path", "data", "digest", "version", "mtime_ns", "size", "loaded_at")
+
+    def __init__(self, name: str, path: str, data: Any, digest: str, version: int, mtime_ns: int, size: int):
+        self.name = name
+        self.path = path
+        self.data = data
+        self.digest = digest
+        # The file's mtime in microseconds (past the previous version if the
+        # mtime didn't move), so every worker that loads the same file hands
+        # out the same version; clients poll with it as ?since_version=
+        self.version = version
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.loaded_at = time.time()
+
+
+class SnapshotDependency:
+    """
+    @cached depends_on entry for a snapshot: entries are invalidated when
+    the snapshot is replaced, not when the file on disk changes, so a value
+    is never keyed to a file version the store hasn't loaded yet
+    """
+
+    def __init__(self, store: "SnapshotStore", name: str):
+        self.store = store
+        self.name = name
+        self.path = store.path(name)
+
+    def fingerprint(self) -> str:
+        snapshot = self.store.get(self.name)
+        return snapshot.digest if snapshot is not None else "missing"
+
+    def mtime(self) -> Optional[float]:
+        snapshot = self.store.get(self.name)
+        return snapshot.mtime_ns / 1e9 if snapshot is not None else None
+
+
+class SnapshotStore:
+    def __init__(self, data_dir: str = DATA_DIR, poll_interval: float = POLL_INTERVAL):
+        self.data_dir = data_dir
+        self.poll_interval = poll_interval
+        # name -> (path, loader); SNAPSHOT_FILES are added as they appear
+        self._sources: Dict[str, tuple] = {}
+        # Replaced wholesale on every swap, so readers need no lock
+        self._snapshots: Dict[str, Snapshot] = {}
+        # path -> (mtime_ns, size) of the last load attempt, for polling
+        self._seen: Dict[str, tuple] = {}
+        # Newest snapshot version
+        self._version = 0
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._listeners: List[Callable[[Snapshot], None]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reloads = 0
+        self.errors = 0
+
+    def register(self, name: str, path: str, loader: Callable[[bytes], Any] = load_json) -> None:
+        with self._lock:
+            self._sources[name] = (os.path.abspath(path), loader)
+
+    def path(self, name: str) -> str:
+        source = self._sources.get(name)
+        if source is not None:
+            return source[0]
+        return os.path.join(self.data_dir, name)
+
+    def _discover(self) -> None:
+        for name in SNAPSHOT_FILES:
+            path = os.path.join(self.data_dir, name)
+            if name not in self._sources and os.path.exists(path):
+                self.register(name, path)
+
+    def load_all(self) -> None:
+        """Parse every registered file (and any of SNAPSHOT_FILES) that isn't loaded yet"""
+        with self._lock:
+            self._discover()
+            for name in list(self._sources):
+                if name not in self._snapshots:
+                    self.reload(name)
+            self._loaded = True
+
+    def reload(self, name: str) -> bool:
+        """Re-parse one file and swap it in; returns True if the snapshot changed"""
+        with self._lock:
+            source = self._sources.get(name)
+            if source is None:
+                return False
+            path, loader = source
+            try:
+                st = os.stat(path)
+                with open(path, "rb") as f:
+                    raw = f.read()
+            except OSError:
+                self._seen.pop(path, None)
+                return False
+            self._seen[path] = (st.st_mtime_ns, st.st_size)
+
+            digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+            current = self._snapshots.get(name)
+            if current is not None and current.digest == digest:
+                return False
+            try:
+                data = loader(raw)
+            except Exception as e:
+                # Most likely caught mid-write: keep serving the previous snapshot
+                self.errors += 1
+                print(f"Warning: could not parse {path}, keeping previous snapshot: {e}")
+                return False
+
+            version = st.st_mtime_ns // 1000
+            if current is not None and version <= current.version:
+                # Rewritten within the filesystem's timestamp granularity (or
+                # replaced by an older file): versions only move forward
+                version = current.version + 1
+            self._version = max(self._version, version)
+            snapshot = Snapshot(name, path, data, digest, version, st.st_mtime_ns, st.st_size)
+            self._snapshots = {**self._snapshots, name: snapshot}
+            self.reloads += 1
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Warning: snapshot listener failed for {name}: {e}")
+        return True
+
+    def install(self, name: str, data: Any, digest: str, version: int, mtime_ns: int, size: int) -> bool:
+        """
+        Swap in a snapshot another process loaded (see shared_snapshots),
+        keeping its version so every worker hands out the same ones
+        """
+        with self._lock:
+            current = self._snapshots.get(name)
+            if current is not None and current.version == version:
+                return False
+            snapshot = Snapshot(name, self.path(name), data, digest, version, mtime_ns, size)
+            self._snapshots = {**self._snapshots, name: snapshot}
+            self._version = max(self._version, version)
+            self.reloads += 1
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Warning: snapshot listener failed for {name}: {e}")
+        return True
+
+    def names(self) -> List[str]:
+        """Names of the loaded snapshots"""
+        return sorted(self._snapshots)
+
+    def get(self, name: str) -> Optional[Snapshot]:
+        if not self._loaded:
+            self.load_all()
+        return self._snapshots.get(name)
+
+    def data(self, name: str, default: Any = None) -> Any:
+        snapshot = self.get(name)
+        return snapshot.data if snapshot is not None else default
+
+    def dependency(self, name: str) -> SnapshotDependency:
+        return SnapshotDependency(self, name)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def subscribe(self, listener: Callable[[Snapshot], None]) -> None:
+        """Call listener(snapshot) from the reloading thread after every swap"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def check(self) -> int:
+        """Reload files whose mtime or size moved since the last load; returns how many changed"""
+        with self._lock:
+            self._discover()
+            names = list(self._sources.items())
+        changed = 0
+        for name, (path, _) in names:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if self._seen.get(path) != (st.st_mtime_ns, st.st_size) and self.reload(name):
+                changed += 1
+        return changed
+
+    def start(self) -> None:
+        """Load everything and start the watcher thread"""
+        self.load_all()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        target = self._watch if watchfiles is not None else self._poll
+        self._thread = threading.Thread(target=target, name="snapshot-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Warning: snapshot poll failed: {e}")
+
+    def _watch(self) -> None:
+        dirs = sorted({os.path.dirname(path) for path, _ in self._sources.values()} | {self.data_dir})
+        dirs = [d for d in dirs if os.path.isdir(d)]
+        try:
+            for changes in watchfiles.watch(
+                *dirs,
+                watch_filter=lambda change, path: path.endswith((".json", ".csv")),
+                recursive=False,
+                stop_event=self._stop,
+            ):
+                # Writers may replace a file rather than modify it, so go by
+                # stat rather than the reported change type
+                self.check()
+        except Exception as e:
+            print(f"Warning: file watcher stopped ({e}), polling instead")
+            self._poll()
+
+    def stats(self) -> dict:
+        snapshots = self._snapshots
+        return {
+            "watcher": "watchfiles" if watchfiles is not None else "poll",
+            "version": self._version,
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "files": {
+                name: {"version": s.version, "bytes": s.size, "loaded_at": s.loaded_at}
+                for name, s in sorted(snapshots.items())
+            },
+        }
+
+
+def create_snapshot_store() -> SnapshotStore:
+    return SnapshotStore()
+
+
+# Global snapshot store (loaded on first use, watched once the app starts)
+snapshots = create_snapshot_store()
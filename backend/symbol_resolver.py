@@ -0,0 +1,166 @@
+# symbol_resolver.py
+"""
+Trading symbol -> underlying name resolution
+
+Names come from the Angel One scrip master (stored in the market database's
+symbols table), looked up by (exchange segment, token) or trading symbol in
+O(1) dicts; tokens are only unique within a segment. Symbols
+the master doesn't know (or before it has been downloaded) go through a
+parser with precompiled patterns whose results are memoized.
+
+Refresh the master with `python symbol_resolver.py --refresh`; the
+angel_one_api job does it once a day.
+"""
+
+import re
+import time
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from market_db import market_db
+
+SCRIP_MASTER_URL = "https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json"
+
+# Instruments kept from the scrip master (the endpoints list futures and indices)
+INSTRUMENT_TYPES = ("FUTSTK", "FUTIDX", "AMXIDX")
+
+# Exchange segment of the futures the gainers/losers and PCR feeds quote
+QUOTE_SEGMENT = "NFO"
+
+# Re-download the master when the stored copy is older than this (seconds)
+MAX_AGE = 24 * 3600
+
+# Expiry (DDMONYY) followed by FUT, or by a strike and CE/PE for options
+_DERIVATIVE = re.compile(r"^(?P<name>.+?)\d{2}[A-Z]{3}\d{2}(?:FUT|\d+(?:\.\d+)?(?:CE|PE))$")
+_FUT_SUFFIX = re.compile(r"FUT$")
+_EQ_SUFFIX = re.compile(r"-(?:EQ|BE|BZ|SM|ST)$")
+
+
+@lru_cache(maxsize=8192)
+def parse_symbol(trading_symbol: str) -> str:
+    """Best-effort underlying name from the symbol alone"""
+    if not trading_symbol:
+        return "N/A"
+    match = _DERIVATIVE.match(trading_symbol)
+    if match:
+        return match.group("name")
+    name = _EQ_SUFFIX.sub("", _FUT_SUFFIX.sub("", trading_symbol)).strip()
+    return name if len(name) >= 2 else trading_symbol[:20]
+
+
+def download_scrip_master(url: str = SCRIP_MASTER_URL) -> List[dict]:
+    """Full Angel One scrip master (list of instrument dicts)"""
+    import requests
+
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    return response.json()
+
+
+class SymbolResolver:
+    def __init__(self, db=market_db):
+        self.db = db
+        self._by_symbol: Dict[str, str] = {}
+        # (exch_seg, token) -> name
+        self._by_token: Dict[Tuple[str, str], str] = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self) -> None:
+        # db.version() is memoized, so this is a dict lookup on most calls
+        version = self.db.version("symbols")
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            by_symbol, by_token = {}, {}
+            for trading_symbol, token, name, exch_seg in self.db.symbols():
+                by_symbol[trading_symbol] = name
+                if token:
+                    by_token[(exch_seg, token)] = name
+            # Swap both maps at once; readers never see a half-built table
+            self._by_symbol, self._by_token = by_symbol, by_token
+            self._version = version
+
+    def resolve(self, trading_symbol: str, token: Optional[object] = None, exch_seg: str = QUOTE_SEGMENT) -> str:
+        """Underlying name for a trading symbol (token wins when both are known)"""
+        self._ensure_loaded()
+        if token is not None:
+            name = self._by_token.get((exch_seg, str(token)))
+            if name is not None:
+                return name
+        name = self._by_symbol.get(trading_symbol)
+        if name is not None:
+            return name
+        return parse_symbol(trading_symbol or "")
+
+    def names(
+        self,
+        items: Iterable[dict],
+        symbol_key: str = "tradingSymbol",
+        token_key: str = "symbolToken",
+        exch_seg: str = QUOTE_SEGMENT,
+    ) -> List[str]:
+        """
+        Names for a whole list of records (all quoted on exch_seg),
+        preferring a name a writer already stored
+        """
+        self._ensure_loaded()
+        by_symbol, by_token = self._by_symbol, self._by_token
+        names = []
+        for item in items:
+            name = item.get("name")
+            if not name:
+                token = item.get(token_key)
+                name = by_token.get((exch_seg, str(token))) if token is not None else None
+                if name is None:
+                    trading_symbol = item.get(symbol_key) or ""
+                    name = by_symbol.get(trading_symbol) or parse_symbol(trading_symbol)
+            names.append(name)
+        return names
+
+    def annotate(
+        self,
+        items: Iterable[dict],
+        symbol_key: str = "tradingSymbol",
+        token_key: str = "symbolToken",
+        exch_seg: str = QUOTE_SEGMENT,
+    ) -> List[dict]:
+        """Copies of items with a "name" field, for writers to store"""
+        items = list(items)
+        return [{**item, "name": name} for item, name in zip(items, self.names(items, symbol_key, token_key, exch_seg))]
+
+    def refresh(self, rows: Optional[List[dict]] = None) -> int:
+        """Reload the symbols table from the scrip master; returns how many instruments were kept"""
+        if rows is None:
+            rows = download_scrip_master()
+        kept = [row for row in rows if row.get("instrumenttype") in INSTRUMENT_TYPES]
+        self.db.replace_symbols(kept)
+        return len(kept)
+
+    def is_stale(self) -> bool:
+        updated_at = self.db.updated_at("symbols")
+        return updated_at is None or time.time() - updated_at > MAX_AGE
+
+    def stats(self) -> dict:
+        self._ensure_loaded()
+        return {
+            "symbols": len(self._by_symbol),
+            "tokens": len(self._by_token),
+            "fallback_cache": parse_symbol.cache_info()._asdict(),
+        }
+
+
+# Global resolver (tables load from the market database on first use)
+symbols = SymbolResolver()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--refresh" in sys.argv:
+        print(f"✅ Stored {symbols.refresh()} instruments from the scrip master")
+    else:
+        print("Usage: python symbol_resolver.py --refresh")
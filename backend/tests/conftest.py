@@ -0,0 +1,13 @@
+# conftest.py
+"""Point the global market database at a throwaway file before any test imports it"""
+
+import os
+import shutil
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="market_db_tests_")
+os.environ.setdefault("MARKET_DB_PATH", os.path.join(_DB_DIR, "market.db"))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_DB_DIR, ignore_errors=True)
@@ -0,0 +1,239 @@
+# test_cache_backends.py
+"""Cache engines: SimpleCache expiry and limits, RedisCache and TieredCache against fakeredis"""
+
+import time
+
+import pytest
+
+import cache_backends
+from cache_backends import RedisCache, SimpleCache, TieredCache
+from cache_manager import EncodedResponse
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class Clock:
+    """Stands in for the time module inside cache_backends"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_backends, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def memory():
+    cache = SimpleCache(default_ttl=300, cleanup_interval=0)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def server():
+    if fakeredis is None:
+        pytest.skip("fakeredis is not installed")
+    return fakeredis.FakeServer()
+
+
+def redis_cache(server):
+    return RedisCache(client=fakeredis.FakeRedis(server=server), default_ttl=60)
+
+
+@pytest.fixture
+def workers(server):
+    """Two TieredCaches sharing one Redis, as two uvicorn workers would"""
+    caches = [
+        TieredCache(SimpleCache(default_ttl=60, cleanup_interval=0), redis_cache(server))
+        for _ in range(2)
+    ]
+    client = caches[0].l2.client
+    # Both invalidation listeners must be subscribed before anything is published
+    assert wait_for(lambda: dict(client.pubsub_numsub(caches[0].l2.channel)).get(caches[0].l2.channel.encode()) == 2)
+    yield caches
+    for cache in caches:
+        cache.close()
+
+
+def test_entries_expire_at_their_own_ttl(memory, clock):
+    memory.set("quotes", 1, ttl=60)
+    memory.set("news", 2)
+    clock.now += 59
+    assert memory.get("quotes") == 1
+    clock.now += 2
+    # Gone at 60s, not at the 300s default
+    assert memory.get_entry("quotes") is None
+    assert memory.get("news") == 2
+    clock.now += 240
+    assert memory.get("news") is None
+    assert memory.expirations == 2
+
+
+def test_stale_window_follows_fresh_until(memory, clock):
+    memory.set("gainers", [1], ttl=60, stale_ttl=30)
+    clock.now += 45
+    value, age, stale = memory.get_entry("gainers")
+    assert (value, age, stale) == ([1], 45, False)
+    clock.now += 20
+    assert memory.get_entry("gainers") == ([1], 65, True)
+    # get() only returns fresh values
+    assert memory.get("gainers") is None
+    clock.now += 30
+    assert memory.get_entry("gainers") is None
+
+
+def test_lru_eviction_drops_least_recently_used(clock):
+    evicted = []
+    cache = SimpleCache(max_entries=3, cleanup_interval=0)
+    cache.set_evict_hook(evicted.append)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    cache.get("a")
+    cache.set("d", "d")
+    assert evicted == ["b"]
+    cache.set("c", "c2")
+    cache.set("e", "e")
+    assert evicted == ["b", "a"]
+    assert cache.keys() == ["d", "c", "e"]
+    assert cache.evictions == 2
+
+
+def test_byte_budget_evicts_and_skips_oversized_values(clock):
+    cache = SimpleCache(max_entries=0, max_bytes=3500, cleanup_interval=0)
+    for key in ("a", "b", "c"):
+        cache.set(key, b"x" * 1000)
+    assert cache.size() == 3
+    cache.set("d", b"x" * 1000)
+    assert cache.keys() == ["b", "c", "d"]
+    assert cache.memory_usage() <= 3500
+
+    cache.set("huge", b"x" * 5000)
+    assert cache.get("huge") is None
+    assert cache.keys() == ["b", "c", "d"]
+
+
+def test_encoded_responses_are_sized_by_their_bytes(memory):
+    body = b'{"price": 1}' * 1000
+    response = EncodedResponse(body)
+    memory.set("quotes", (response, ()))
+    assert response.nbytes > len(body)
+    assert response.nbytes <= memory.memory_usage() < response.nbytes + 200
+
+
+def test_janitor_purges_expired_entries():
+    cache = SimpleCache(cleanup_interval=0.02)
+    try:
+        cache.set("quotes", 1, ttl=0.05)
+        cache.set("news", 2, ttl=60)
+        # No lookups: only the janitor can remove it
+        assert wait_for(lambda: cache.size() == 1)
+        assert cache.keys() == ["news"]
+        assert cache.expirations == 1
+    finally:
+        cache.close()
+
+
+def test_redis_set_get_and_staleness(server):
+    cache = redis_cache(server)
+    cache.set("quotes:1", {"NIFTY": 100.0}, ttl=60, stale_ttl=30)
+    value, age, stale = cache.get_entry("quotes:1")
+    assert value == {"NIFTY": 100.0}
+    assert age < 1 and not stale
+    assert cache.get("missing") is None
+
+    cache.set("quotes:2", [1, 2], ttl=0, stale_ttl=30)
+    assert cache.get_entry("quotes:2")[2] is True
+    assert sorted(cache.keys()) == ["quotes:1", "quotes:2"]
+
+
+def test_redis_tag_invalidation_only_drops_tagged_keys(server):
+    cache = redis_cache(server)
+    cache.set("gainers:a", 1, tags=("fn:gainers", "file:/data/top_gainers.json"))
+    cache.set("gainers:b", 2, tags=("fn:gainers",))
+    cache.set("losers:a", 3, tags=("fn:losers",))
+
+    assert cache.invalidate_tag("file:/data/top_gainers.json") == 1
+    assert cache.get("gainers:a") is None
+    assert cache.get("gainers:b") == 2
+    cache.invalidate_tag("fn:gainers")
+    assert cache.get("gainers:b") is None
+    assert cache.get("losers:a") == 3
+
+    cache.clear()
+    assert cache.keys() == []
+
+
+def test_redis_instances_share_entries(server):
+    first, second = redis_cache(server), redis_cache(server)
+    first.set("pcr:1", {"pcr": 0.9})
+    assert second.get("pcr:1") == {"pcr": 0.9}
+    second.delete("pcr:1")
+    assert first.get("pcr:1") is None
+
+
+def test_tiered_reads_through_to_redis(workers):
+    first, second = workers
+    first.set("quotes:1", {"NIFTY": 100.0}, ttl=60)
+    assert second.get("quotes:1") == {"NIFTY": 100.0}
+    assert second.l2_hits == 1
+    # Now in the second worker's L1
+    assert second.get("quotes:1") == {"NIFTY": 100.0}
+    assert second.l1_hits == 1
+
+
+def test_tiered_set_evicts_other_workers_l1(workers):
+    first, second = workers
+    first.set("quotes:1", {"NIFTY": 100.0}, ttl=60)
+    second.get("quotes:1")
+    assert second.l1.get("quotes:1") is not None
+
+    first.set("quotes:1", {"NIFTY": 101.0}, ttl=60)
+    assert wait_for(lambda: second.l1.get("quotes:1") is None)
+    assert second.get("quotes:1") == {"NIFTY": 101.0}
+    # The writer's own copy is the new value, not evicted by its own message
+    assert first.l1.get("quotes:1") == {"NIFTY": 101.0}
+
+
+def test_tiered_tag_invalidation_reaches_other_workers(workers):
+    first, second = workers
+    first.set("deals:1", ["block"], ttl=60, tags=("fn:deals",))
+    first.set("news:1", ["headline"], ttl=60, tags=("fn:news",))
+    second.get("deals:1")
+    second.get("news:1")
+
+    assert first.invalidate_tag("fn:deals") == 1
+    assert first.get("deals:1") is None
+    assert wait_for(lambda: second.l1.get("deals:1") is None)
+    assert second.get("deals:1") is None
+    assert second.get("news:1") == ["headline"]
+
+
+def test_tiered_clear_empties_every_workers_l1(workers):
+    first, second = workers
+    first.set("quotes:1", 1, ttl=60)
+    second.get("quotes:1")
+    second.clear()
+    assert wait_for(lambda: first.l1.size() == 0)
+    assert first.get("quotes:1") is None
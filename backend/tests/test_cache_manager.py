@@ -0,0 +1,196 @@
+# test_cache_manager.py
+"""@cached endpoints through a TestClient: coalescing, stale-while-revalidate, dependencies, ETags"""
+
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import cache_manager
+from cache_manager import CacheHeadersMiddleware, cache_invalidate, cached
+
+
+class Dependency:
+    """depends_on entry whose fingerprint the test moves by hand"""
+
+    def __init__(self, path):
+        self.path = path
+        self.version = 1
+
+    def fingerprint(self):
+        return str(self.version)
+
+    def mtime(self):
+        return 1700000000.0 + self.version
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    # Re-stat dependency files on every lookup
+    monkeypatch.setattr(cache_manager, "FILE_CHECK_INTERVAL", 0)
+    cache_invalidate()
+
+    app = FastAPI()
+    app.add_middleware(CacheHeadersMiddleware)
+    calls = {"async": 0, "sync": 0, "stale": 0, "file": 0, "dep": 0}
+    release = threading.Event()
+    data_file = tmp_path / "quotes.json"
+    data_file.write_text('{"price": 1}')
+    dep = Dependency(str(tmp_path / "dataset"))
+
+    @app.get("/slow-async")
+    @cached(ttl=60)
+    async def slow_async():
+        calls["async"] += 1
+        await asyncio.sleep(0.2)
+        return {"calls": calls["async"]}
+
+    @app.get("/slow-sync")
+    @cached(ttl=60)
+    def slow_sync():
+        calls["sync"] += 1
+        release.wait(5)
+        return {"calls": calls["sync"]}
+
+    @app.get("/stale")
+    @cached(ttl=1, stale_ttl=60)
+    async def stale():
+        calls["stale"] += 1
+        return {"calls": calls["stale"]}
+
+    @app.get("/file")
+    @cached(ttl=60, depends_on=[str(data_file)], as_response=True)
+    async def from_file():
+        calls["file"] += 1
+        return {"body": data_file.read_text(), "calls": calls["file"]}
+
+    @app.get("/dep")
+    @cached(ttl=60, depends_on=[dep], as_response=True)
+    async def from_dep(symbol: str = "NIFTY"):
+        calls["dep"] += 1
+        return {"symbol": symbol, "version": dep.version, "pad": "x" * 2048}
+
+    with TestClient(app) as client:
+        yield client, calls, release, data_file, dep
+    cache_invalidate()
+
+
+def test_concurrent_async_misses_compute_once(api):
+    client, calls, *_ = api
+    with ThreadPoolExecutor(8) as pool:
+        responses = list(pool.map(lambda _: client.get("/slow-async"), range(8)))
+    assert calls["async"] == 1
+    assert {r.json()["calls"] for r in responses} == {1}
+    assert [r.headers["x-cache"] for r in responses] == ["MISS"] * 8
+
+
+def test_concurrent_sync_misses_compute_once(api):
+    client, calls, release, *_ = api
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(client.get, "/slow-sync") for _ in range(8)]
+        time.sleep(0.3)
+        release.set()
+        responses = [f.result() for f in futures]
+    assert calls["sync"] == 1
+    assert {r.json()["calls"] for r in responses} == {1}
+
+
+def test_stale_entry_is_served_while_one_refresh_runs(api):
+    client, calls, *_ = api
+    assert client.get("/stale").json() == {"calls": 1}
+    time.sleep(1.1)
+
+    response = client.get("/stale")
+    # The expired value comes back at once; the refresh runs in the background
+    assert response.json() == {"calls": 1}
+    assert response.headers["x-cache"] == "STALE"
+    for _ in range(50):
+        if calls["stale"] == 2:
+            break
+        time.sleep(0.02)
+    assert calls["stale"] == 2
+
+    response = client.get("/stale")
+    assert response.json() == {"calls": 2}
+    assert response.headers["x-cache"] == "HIT"
+
+
+def test_file_dependency_change_drops_the_entry(api):
+    client, calls, _, data_file, _ = api
+    assert client.get("/file").json()["body"] == '{"price": 1}'
+    assert client.get("/file").headers["x-cache"] == "HIT"
+
+    data_file.write_text('{"price": 2}')
+    response = client.get("/file")
+    assert response.headers["x-cache"] == "MISS"
+    assert response.json() == {"body": '{"price": 2}', "calls": 2}
+
+
+def test_dependency_fingerprint_change_drops_the_entry(api):
+    client, calls, _, _, dep = api
+    client.get("/dep")
+    assert client.get("/dep").headers["x-cache"] == "HIT"
+    dep.version = 2
+    response = client.get("/dep")
+    assert response.headers["x-cache"] == "MISS"
+    assert response.json()["version"] == 2
+    assert calls["dep"] == 2
+
+
+def test_etag_revalidation_returns_304(api):
+    client, calls, _, _, dep = api
+    first = client.get("/dep", headers={"Accept-Encoding": "identity"})
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"]
+
+    response = client.get("/dep", headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert response.status_code == 304
+    assert response.content == b""
+    # Different arguments are a different representation
+    other = client.get("/dep?symbol=BANKNIFTY", headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert other.status_code == 200
+
+    # Compressed variants carry their own validator
+    gzipped = client.get("/dep", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.headers["etag"] != etag
+    assert client.get("/dep", headers={"If-None-Match": gzipped.headers["etag"], "Accept-Encoding": "gzip"}).status_code == 304
+
+    # A new dataset version means a new ETag, so the old one no longer matches
+    dep.version = 2
+    response = client.get("/dep", headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert calls["dep"] == 3
+
+
+def test_redis_backend_calls_run_off_the_event_loop(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    from cache_backends import RedisCache
+
+    redis_threads = set()
+
+    class RecordingRedis(fakeredis.FakeRedis):
+        def get(self, name):
+            redis_threads.add(threading.get_ident())
+            return super().get(name)
+
+    monkeypatch.setattr(cache_manager, "cache", RedisCache(client=RecordingRedis()))
+    loop_threads = set()
+    app = FastAPI()
+
+    @app.get("/quotes")
+    @cached(ttl=60)
+    async def quotes():
+        loop_threads.add(threading.get_ident())
+        return {"price": 1}
+
+    with TestClient(app) as client:
+        assert client.get("/quotes").json() == {"price": 1}
+        assert client.get("/quotes").json() == {"price": 1}
+    assert len(loop_threads) == 1
+    assert redis_threads and not redis_threads & loop_threads
@@ -0,0 +1,70 @@
+# test_data_writer.py
+"""write_json_atomic: replace-or-keep semantics, skipped unchanged writes, no temp files left behind"""
+
+import json
+import os
+
+import pytest
+
+import data_writer
+from data_writer import write_json_atomic
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_writes_and_replaces(tmp_path):
+    path = tmp_path / "nested" / "quotes.json"
+    assert write_json_atomic(str(path), {"status": "ok", "price": 1, "name": "निफ्टी"})
+    assert read(path) == {"status": "ok", "price": 1, "name": "निफ्टी"}
+    assert oct(os.stat(path).st_mode & 0o777) == "0o644"
+    assert write_json_atomic(str(path), {"status": "ok", "price": 2})
+    assert read(path) == {"status": "ok", "price": 2}
+    assert os.listdir(path.parent) == ["quotes.json"]
+
+
+def test_only_volatile_changes_are_skipped(tmp_path):
+    path = str(tmp_path / "gainers.json")
+    assert write_json_atomic(path, {"timestamp": "10:00", "data": [{"timestamp": "09:59", "ltp": 1}]})
+    assert not write_json_atomic(path, {"timestamp": "10:05", "data": [{"timestamp": "09:59", "ltp": 1}]})
+    assert read(path)["timestamp"] == "10:00"
+    # A nested "timestamp" is data, not the envelope's
+    assert write_json_atomic(path, {"timestamp": "10:10", "data": [{"timestamp": "10:09", "ltp": 1}]})
+
+
+def test_external_edit_is_not_mistaken_for_our_last_write(tmp_path):
+    path = tmp_path / "pcr.json"
+    write_json_atomic(str(path), {"pcr": 1})
+    path.write_text(json.dumps({"pcr": 2}))
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert write_json_atomic(str(path), {"pcr": 1})
+    assert read(path) == {"pcr": 1}
+
+
+def test_failed_write_keeps_the_old_file_and_cleans_up(tmp_path, monkeypatch):
+    path = tmp_path / "fii_dii.json"
+    write_json_atomic(str(path), {"net": 1})
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(data_writer.os, "fsync", fail)
+    with pytest.raises(OSError, match="disk full"):
+        write_json_atomic(str(path), {"net": 2})
+    assert read(path) == {"net": 1}
+    assert os.listdir(tmp_path) == ["fii_dii.json"]
+
+
+def test_unserializable_data_leaves_no_file(tmp_path):
+    path = tmp_path / "index_quotes.json"
+
+    class Broken:
+        def __str__(self):
+            raise ValueError("cannot encode")
+
+    with pytest.raises(Exception):
+        write_json_atomic(str(path), {"value": Broken()})
+    assert os.listdir(tmp_path) == []
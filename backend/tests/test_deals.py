@@ -0,0 +1,85 @@
+# test_deals.py
+"""Block/bulk deal responses: date range reporting, cursor pagination, field projection"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as app_module
+from cache_manager import cache_invalidate
+from market_db import MarketDB
+
+DEALS = [
+    {"BD_DT_DATE": date, "BD_SYMBOL": symbol, "BD_CLIENT_NAME": client, "BD_BUY_SELL": "BUY",
+     "BD_QTY_TRD": str(qty), "BD_TP_WATP": "10.5", "BD_REMARKS": f"r{qty}"}
+    for date, symbol, client, qty in [
+        ("01-Apr-2024", "TCS", "ALPHA FUND", 1),
+        ("02-Apr-2024", "INFY", "BETA CAPITAL", 2),
+        ("02-Apr-2024", "TCS", "GAMMA LLP", 3),
+        ("29-Apr-2024", "SBIN", "ALPHA FUND", 4),
+        ("30-Apr-2024", "TCS", "DELTA", 5),
+        ("02-May-2024", "INFY", "ALPHA FUND", 6),
+        ("03-May-2024", "TCS", "BETA CAPITAL", 7),
+    ]
+]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    db = MarketDB(str(tmp_path / "market.db"))
+    db.upsert_deals("block", {"status": "success", "from_date": "29-04-2024", "to_date": "03-05-2024", "data": DEALS})
+    monkeypatch.setattr(app_module, "market_db", db)
+    cache_invalidate()
+    yield db
+    cache_invalidate()
+    db.close()
+
+
+def test_default_window_is_the_last_fetch(db):
+    response = app_module._deals_response("block")
+    assert (response["from_date"], response["to_date"]) == ("29-04-2024", "03-05-2024")
+    assert response["matched"] == 4
+
+
+def test_symbol_history_reports_the_range_of_its_deals(db):
+    response = app_module._deals_response("block", symbol="TCS")
+    assert response["matched"] == 4
+    assert (response["from_date"], response["to_date"]) == ("01-04-2024", "03-05-2024")
+
+    response = app_module._deals_response("block", client="beta", from_date="01-05-2024")
+    assert (response["from_date"], response["to_date"]) == ("01-05-2024", "03-05-2024")
+
+    response = app_module._deals_response("block", symbol="NOPE")
+    assert response["matched"] == 0
+    assert response["from_date"] is None and response["to_date"] is None
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_cursor_pages_cover_every_deal_once(db, order):
+    quantities, cursor = [], None
+    while True:
+        page = app_module._deals_response("block", from_date="01-01-2024", limit=3, cursor=cursor, order=order)
+        assert page["matched"] == len(DEALS)
+        assert page["count"] == len(page["data"]) <= 3
+        quantities.extend(int(row["BD_QTY_TRD"]) for row in page["data"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    expected = list(range(1, len(DEALS) + 1))
+    assert quantities == (expected if order == "asc" else expected[::-1])
+
+
+def test_fields_projection(db):
+    page = app_module._deals_response("block", symbol="SBIN", fields="symbol, quantity,BD_REMARKS,missing")
+    assert page["data"] == [{"symbol": "SBIN", "quantity": 4.0, "BD_REMARKS": "r4", "missing": None}]
+    page = app_module._deals_response("block", symbol="SBIN", fields="date,price")
+    assert page["data"] == [{"date": "2024-04-29", "price": 10.5}]
+
+
+def test_invalid_requests_are_rejected(db):
+    client = TestClient(app_module.app)
+    assert client.get("/nse/block-deals", params={"cursor": "garbage"}).status_code == 400
+    assert client.get("/nse/block-deals", params={"limit": 0}).status_code == 400
+    assert client.get("/nse/block-deals", params={"order": "sideways"}).status_code == 400
+    response = client.get("/nse/block-deals", params={"symbol": "tcs", "limit": 2})
+    assert response.status_code == 200
+    assert response.json()["matched"] == 4
@@ -0,0 +1,119 @@
+# test_deltas.py
+"""Snapshot versions from file mtimes, VersionedView deltas and the full-payload fallback"""
+
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as app_module
+from cache_manager import cache_invalidate
+from deltas import VersionedView, diff_records
+from snapshot_store import SnapshotStore
+
+MTIME_NS = 1_717_000_000_123_456_789
+
+
+def write(directory, data, mtime_ns):
+    path = os.path.join(directory, "index_quotes.json")
+    with open(path, "w") as f:
+        json.dump(data, f)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def quote(price):
+    return {"status": "ok", "price": price, "close": 100}
+
+
+@pytest.fixture
+def store(tmp_path):
+    write(tmp_path, {"NIFTY": quote(101)}, MTIME_NS)
+    return SnapshotStore(str(tmp_path))
+
+
+def test_version_is_the_file_mtime_in_microseconds(store, tmp_path):
+    assert store.get("index_quotes.json").version == MTIME_NS // 1000
+    # Another worker loading the same file agrees on the version
+    assert SnapshotStore(str(tmp_path)).get("index_quotes.json").version == MTIME_NS // 1000
+
+
+def test_version_moves_forward_when_the_mtime_does_not(store, tmp_path):
+    first = store.get("index_quotes.json").version
+    write(tmp_path, {"NIFTY": quote(102)}, MTIME_NS)
+    assert store.reload("index_quotes.json")
+    assert store.get("index_quotes.json").version == first + 1
+
+    # An older file (e.g. restored from backup) still gets a newer version
+    write(tmp_path, {"NIFTY": quote(103)}, MTIME_NS - 10**9)
+    assert store.reload("index_quotes.json")
+    assert store.get("index_quotes.json").version == first + 2
+    assert store.version == first + 2
+
+
+def test_unchanged_content_keeps_the_version(store, tmp_path):
+    first = store.get("index_quotes.json").version
+    write(tmp_path, {"NIFTY": quote(101)}, MTIME_NS + 10**9)
+    assert not store.reload("index_quotes.json")
+    assert store.get("index_quotes.json").version == first
+
+
+def test_diff_records():
+    old = {"a": {"v": 1}, "b": {"v": 2}, "c": {"v": 3}}
+    new = {"a": {"v": 1}, "b": {"v": 20}, "d": {"v": 4}}
+    assert diff_records(old, new) == ({"d": {"v": 4}}, {"b": {"v": 20}}, ["c"])
+
+
+def test_delta_between_kept_versions(store, tmp_path):
+    view = VersionedView(store, "index_quotes.json", lambda data: data, depth=3)
+    first, _ = view.latest()
+    write(tmp_path, {"NIFTY": quote(105), "BANKNIFTY": quote(200)}, MTIME_NS + 10**9)
+    store.reload("index_quotes.json")
+    second, _ = view.latest()
+
+    delta = view.delta(first, lambda build: build)
+    assert delta["delta"] is True
+    assert (delta["version"], delta["since_version"]) == (second, first)
+    assert delta["added"] == {"BANKNIFTY": quote(200)}
+    assert delta["changed"] == {"NIFTY": quote(105)}
+    assert delta["removed"] == []
+
+    current = view.delta(second, lambda build: build)
+    assert (current["added"], current["changed"], current["removed"]) == ({}, {}, [])
+
+
+def test_unknown_or_evicted_versions_get_no_delta(store, tmp_path):
+    view = VersionedView(store, "index_quotes.json", lambda data: data, depth=2)
+    first, _ = view.latest()
+    assert view.delta(first - 1, lambda build: build) is None
+    for i in range(1, 3):
+        write(tmp_path, {"NIFTY": quote(101 + i)}, MTIME_NS + i * 10**9)
+        store.reload("index_quotes.json")
+    # Only the last two versions are kept
+    assert view.delta(first, lambda build: build) is None
+    assert len(view.stats()["versions"]) == 2
+
+
+def test_changes_endpoint_falls_back_to_the_full_payload(store, tmp_path, monkeypatch):
+    view = VersionedView(store, "index_quotes.json", app_module._index_quotes)
+    monkeypatch.setattr(app_module, "_index_quotes_view", view)
+    client = TestClient(app_module.app)
+    cache_invalidate()
+    try:
+        full = client.get("/index-quotes/changes").json()
+        assert full["delta"] is False
+        assert full["data"]["NIFTY"]["change"] == 1
+
+        write(tmp_path, {"NIFTY": quote(110)}, MTIME_NS + 10**9)
+        store.reload("index_quotes.json")
+        cache_invalidate()
+        delta = client.get("/index-quotes/changes", params={"since_version": full["version"]}).json()
+        assert delta["delta"] is True and delta["since_version"] == full["version"]
+        assert delta["changed"]["NIFTY"]["price"] == 110
+
+        stale = client.get("/index-quotes/changes", params={"since_version": 12345}).json()
+        assert stale["delta"] is False
+        assert stale["version"] == delta["version"]
+        assert stale["data"]["NIFTY"]["price"] == 110
+    finally:
+        cache_invalidate()
@@ -0,0 +1,18 @@
+# test_diagnostics.py
+"""/diagnostics collects the stats of every data layer"""
+
+from fastapi.testclient import TestClient
+
+import app as app_module
+
+
+def test_diagnostics_reports_every_data_layer():
+    response = TestClient(app_module.app).get("/diagnostics")
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body) == {
+        "snapshots", "shared_snapshots", "deltas", "news", "news_search",
+        "index_history", "symbols", "live_stream",
+    }
+    assert set(body["deltas"]) == {"index_quotes.json", "top_gainers.json", "top_losers.json", "put_call_ratio.json"}
+    assert body["live_stream"]["clients"] == 0
@@ -0,0 +1,78 @@
+# test_index_history.py
+"""Index history ring buffers and OHLC resampling"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from index_history import INTERVALS, RingBuffer, resample
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def ist(*args) -> int:
+    return int(datetime(*args, tzinfo=IST).timestamp())
+
+
+def fill(buffer, first, last):
+    ts = np.arange(first, last, dtype=np.int64)
+    buffer.extend(ts, ts.astype(np.float64))
+
+
+def test_ring_buffer_wraps_oldest_first():
+    buffer = RingBuffer(5)
+    fill(buffer, 0, 3)
+    assert buffer.arrays()[0].tolist() == [0, 1, 2]
+    fill(buffer, 3, 7)
+    assert len(buffer) == 5
+    ts, price = buffer.arrays()
+    assert ts.tolist() == [2, 3, 4, 5, 6]
+    assert price.tolist() == [2.0, 3.0, 4.0, 5.0, 6.0]
+    fill(buffer, 7, 9)
+    assert buffer.arrays()[0].tolist() == [4, 5, 6, 7, 8]
+
+
+def test_ring_buffer_keeps_the_tail_of_an_oversized_batch():
+    buffer = RingBuffer(4)
+    fill(buffer, 0, 2)
+    fill(buffer, 2, 12)
+    assert buffer.arrays()[0].tolist() == [8, 9, 10, 11]
+    fill(buffer, 12, 12)
+    assert buffer.arrays()[0].tolist() == [8, 9, 10, 11]
+
+
+def test_arrays_survive_later_extends():
+    buffer = RingBuffer(4)
+    fill(buffer, 0, 4)
+    ts, price = buffer.arrays()
+    fill(buffer, 4, 7)
+    assert ts.tolist() == [0, 1, 2, 3]
+    assert price.tolist() == [0.0, 1.0, 2.0, 3.0]
+    assert not ts.flags.writeable
+
+
+def test_daily_buckets_start_at_ist_midnight():
+    ts = np.array([
+        ist(2024, 1, 1, 9, 15), ist(2024, 1, 1, 23, 59, 59),
+        ist(2024, 1, 2, 0, 0), ist(2024, 1, 2, 15, 30),
+    ], dtype=np.int64)
+    price = np.array([10.0, 12.0, 11.0, 9.0])
+    series = resample(ts, price, INTERVALS["1d"])
+    assert series["t"] == [ist(2024, 1, 1), ist(2024, 1, 2)]
+    assert series["open"] == [10.0, 11.0]
+    assert series["close"] == [12.0, 9.0]
+    assert series["low"] == [10.0, 9.0]
+    assert series["count"] == [2, 2]
+
+
+def test_weekly_buckets_start_on_monday():
+    # 2024-01-07 is a Sunday, 2024-01-08 a Monday
+    ts = np.array([
+        ist(2024, 1, 4, 10), ist(2024, 1, 7, 23, 59, 59),
+        ist(2024, 1, 8, 0, 0), ist(2024, 1, 11, 10),
+    ], dtype=np.int64)
+    price = np.array([1.0, 2.0, 3.0, 4.0])
+    series = resample(ts, price, INTERVALS["1w"])
+    assert series["t"] == [ist(2024, 1, 1), ist(2024, 1, 8)]
+    assert series["high"] == [2.0, 4.0]
+    assert series["count"] == [2, 2]
@@ -0,0 +1,162 @@
+# test_live_stream.py
+"""LiveStream: initial snapshots, update fan-out, backlog overflow and resync, dataset validation"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import live_stream
+from live_stream import LiveStream
+
+
+class Store:
+    """The parts of SnapshotStore LiveStream uses, swapped by hand"""
+
+    def __init__(self):
+        self.snapshots = {}
+        self.listeners = []
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def get(self, name):
+        return self.snapshots.get(name)
+
+    def swap(self, name, version):
+        self.snapshots[name] = SimpleNamespace(name=name, version=version)
+        for listener in self.listeners:
+            listener(self.snapshots[name])
+
+
+def parse(message: bytes):
+    fields = dict(line.split(": ", 1) for line in message.decode().strip().split("\n"))
+    return fields["event"], int(fields["id"]), json.loads(fields["data"])
+
+
+async def started(records):
+    """LiveStream over quotes.json and movers.json, whose records come from the records dict"""
+    store = Store()
+    store.snapshots["quotes.json"] = SimpleNamespace(name="quotes.json", version=1000)
+    store.snapshots["movers.json"] = SimpleNamespace(name="movers.json", version=2000)
+    stream = LiveStream(store)
+
+    async def quotes():
+        return dict(records["quotes"])
+
+    async def movers():
+        return dict(records["movers"])
+
+    stream.register("quotes", "quotes.json", quotes)
+    stream.register("movers", "movers.json", movers)
+    await stream.start()
+    return store, stream
+
+
+async def swap(store, records, dataset, version, **changes):
+    records[dataset] = {**records[dataset], **changes}
+    store.swap(f"{dataset}.json", version)
+    # Let the refresh scheduled from the "watcher thread" run
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def next_message(events):
+    return await asyncio.wait_for(events.__anext__(), 1)
+
+
+def test_new_clients_get_snapshots_with_snapshot_versions():
+    async def run():
+        records = {"quotes": {"NIFTY": {"price": 1}}, "movers": {"TCS": {"rank": 1}}}
+        store, stream = await started(records)
+        events = stream.events_for(["quotes", "movers"])
+        assert await next_message(events) == b"retry: 5000\n\n"
+        first = parse(await next_message(events))
+        second = parse(await next_message(events))
+        await events.aclose()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == ("snapshot", 1000, {"dataset": "quotes", "version": 1000, "records": {"NIFTY": {"price": 1}}})
+    assert second[:2] == ("snapshot", 2000)
+
+
+def test_updates_reach_only_subscribed_clients():
+    async def run():
+        records = {"quotes": {"NIFTY": {"price": 1}, "SENSEX": {"price": 5}}, "movers": {}}
+        store, stream = await started(records)
+        quotes_client = stream.events_for(["quotes"])
+        movers_client = stream.events_for(["movers"])
+        for _ in range(2):
+            await next_message(quotes_client)
+        await next_message(movers_client)
+        await next_message(movers_client)
+
+        records["quotes"].pop("SENSEX")
+        await swap(store, records, "quotes", 1500, NIFTY={"price": 2})
+        update = parse(await next_message(quotes_client))
+        idle = movers_client.__anext__()
+        try:
+            await asyncio.wait_for(idle, 0.05)
+            delivered = True
+        except asyncio.TimeoutError:
+            delivered = False
+        stats = stream.stats()
+        await quotes_client.aclose()
+        return update, delivered, stats
+
+    update, delivered, stats = asyncio.run(run())
+    assert update == ("update", 1500, {
+        "dataset": "quotes", "version": 1500, "changed": {"NIFTY": {"price": 2}}, "removed": ["SENSEX"],
+    })
+    assert not delivered
+    assert stats["versions"] == {"quotes": 1500, "movers": 2000}
+    assert stats["events"] == 1
+
+
+def test_unchanged_records_send_nothing_and_versions_never_go_back():
+    async def run():
+        records = {"quotes": {"NIFTY": {"price": 1}}, "movers": {}}
+        store, stream = await started(records)
+        await swap(store, records, "quotes", 1100)
+        unchanged_events = stream.events
+        # A file restored with an older mtime still gets a newer event version
+        await swap(store, records, "quotes", 900, NIFTY={"price": 3})
+        return unchanged_events, stream.stats()["versions"]["quotes"]
+
+    unchanged_events, version = asyncio.run(run())
+    assert unchanged_events == 0
+    assert version == 1001
+
+
+def test_slow_client_is_resynced_with_snapshots(monkeypatch):
+    monkeypatch.setattr(live_stream, "MAX_BACKLOG", 2)
+
+    async def run():
+        records = {"quotes": {"NIFTY": {"price": 0}}, "movers": {}}
+        store, stream = await started(records)
+        slow = stream.events_for(["quotes"])
+        for _ in range(2):
+            await next_message(slow)
+        # Three updates overflow a backlog of two without ever blocking the broadcaster
+        for price in (1, 2, 3):
+            await swap(store, records, "quotes", 1000 + price, NIFTY={"price": price})
+        resync = parse(await next_message(slow))
+        resyncs = stream.stats()["resyncs"]
+        await slow.aclose()
+        return resync, resyncs
+
+    resync, resyncs = asyncio.run(run())
+    assert resync == ("snapshot", 1003, {"dataset": "quotes", "version": 1003, "records": {"NIFTY": {"price": 3}}})
+    assert resyncs == 1
+
+
+def test_unknown_datasets_are_rejected():
+    import app as app_module
+
+    client = TestClient(app_module.app)
+    response = client.get("/stream", params={"datasets": "index_quotes,options"})
+    assert response.status_code == 400
+    assert "options" in response.json()["detail"]
+    assert client.get("/stream", params={"datasets": " , "}).status_code == 400
@@ -0,0 +1,39 @@
+# test_market_db.py
+"""MarketDB writes: dataset versions only move when stored data changes"""
+
+import pytest
+
+from market_db import MarketDB
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = MarketDB(str(tmp_path / "market.db"))
+    yield db
+    db.close()
+
+
+def test_unchanged_past_results_keep_the_version(db):
+    results = {"tcs": {"status": "success", "quarters": [1, 2]}, "INFY": {"status": "success", "quarters": [3]}}
+    db.upsert_past_results(results)
+    assert db.version("past_results") == 1
+
+    db.upsert_past_results({"TCS": {"status": "success", "quarters": [1, 2]}})
+    assert db.version("past_results") == 1
+
+    db.upsert_past_results({"TCS": {"status": "success", "quarters": [1, 2, 3]}})
+    assert db.version("past_results") == 2
+    assert db.past_result("tcs")["quarters"] == [1, 2, 3]
+    assert db.past_result_symbols() == ["INFY", "TCS"]
+
+
+def test_repeated_deals_fetch_keeps_the_version(db):
+    payload = {
+        "status": "success",
+        "timestamp": "2024-05-02T10:00:00",
+        "data": [{"BD_DT_DATE": "02-May-2024", "BD_SYMBOL": "TCS", "BD_QTY_TRD": "1,000"}],
+    }
+    assert db.upsert_deals("block", payload) == 1
+    payload["timestamp"] = "2024-05-02T11:00:00"
+    assert db.upsert_deals("block", payload) == 0
+    assert db.version("block_deals") == 1
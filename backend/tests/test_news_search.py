@@ -0,0 +1,56 @@
+# test_news_search.py
+"""Tokenizing, Marathi stemming and index maintenance of news_search"""
+
+from news_search import NewsSearchIndex, stem, tokenize
+
+
+def article(n, english="", marathi=""):
+    return {
+        "url": f"https://example.com/{n}",
+        "english_title": english,
+        "marathi_title": marathi,
+        "source": "test",
+        "published_at": f"2025-01-01T00:00:{n:02d}",
+    }
+
+
+def test_marathi_inflections_share_their_stem():
+    assert stem("सेन्सेक्समध्ये") == "सेन्सेक्स"
+    assert stem("बाजाराला") == "बाजार"
+    assert stem("सरकारच्या") == "सरकार"
+    assert stem("शहरात") == "शहर"
+
+
+def test_short_words_and_bare_stems_are_kept():
+    assert stem("भारत") == "भारत"
+    assert stem("सोने") == "सोने"
+    assert stem("sensex") == "sensex"
+    # A standalone postposition is a stopword, not an empty stem
+    assert tokenize("निफ्टी मध्ये तेजी") == ["निफ्टी", "तेजी"]
+
+
+def test_inflected_headline_matches_stem_query():
+    index = NewsSearchIndex()
+    index.apply([article(1, marathi="सेन्सेक्समध्ये मोठी घसरण"), article(2, marathi="सोन्याचे दर स्थिर")], [], True)
+
+    hits, matched = index.search("सेन्सेक्स")
+    assert matched == 1
+    assert hits[0]["url"] == "https://example.com/1"
+
+    # And the other way round: an inflected query finds the bare form
+    index.apply([article(3, marathi="सेन्सेक्स वधारला")], [], False)
+    hits, matched = index.search("सेन्सेक्सच्या")
+    assert matched == 2
+
+
+def test_dropped_articles_are_compacted_away():
+    index = NewsSearchIndex()
+    index.apply([article(n, english=f"market update {n}") for n in range(10)], [], True)
+    index.apply([], [f"https://example.com/{n}" for n in range(6)], False)
+
+    # Dead articles outnumbered live ones, so the index was rebuilt
+    assert index.stats() == {"documents": 4, "dropped": 0, "terms": 6}
+    hits, matched = index.search("market")
+    assert matched == 4
+    assert {hit["url"] for hit in hits} == {f"https://example.com/{n}" for n in range(6, 10)}
+    assert index.search("0") == ([], 0)
@@ -0,0 +1,104 @@
+# test_news_store.py
+"""NewsStore merging of the scraped CSV: appends, partial lines, rewrites; atomic rewrites by the scraper"""
+
+import os
+
+import pytest
+
+from news_store import NewsStore
+
+HEADER = "\ufeffSource,English Title,Marathi Title,URL,Published\n"
+
+
+def row(n, source="ET"):
+    return f"{source},Title {n},शीर्षक {n},https://example.com/{n},2025-01-01T10:00:{n:02d}\n"
+
+
+def touch(path, step):
+    """Move the mtime so the store sees a change even within one timestamp tick"""
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + step * 10**9))
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "news.csv"
+    path.write_text(HEADER + row(1) + row(2), encoding="utf-8")
+    return path
+
+
+def urls(store):
+    articles, _, _ = store.query(limit=50)
+    return [article["url"].rsplit("/", 1)[1] for article in articles]
+
+
+def test_appended_rows_are_merged_incrementally(csv_path):
+    store = NewsStore(str(csv_path))
+    assert urls(store) == ["2", "1"]
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write(row(3, "MC") + row(2))
+    touch(csv_path, 1)
+    assert urls(store) == ["3", "2", "1"]
+    assert (store.full_reloads, store.incremental_reloads) == (1, 1)
+    assert store.query(source="mc")[1] == 1
+
+
+def test_partial_lines_wait_for_their_newline(csv_path):
+    store = NewsStore(str(csv_path))
+    store.check()
+    line = row(3)
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write(line[:10])
+    touch(csv_path, 1)
+    assert urls(store) == ["2", "1"]
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write(line[10:])
+    touch(csv_path, 2)
+    assert urls(store) == ["3", "2", "1"]
+    assert store.full_reloads == 1
+
+
+def test_in_place_rewrite_is_detected_by_the_tail_digest(csv_path):
+    store = NewsStore(str(csv_path))
+    store.check()
+    inode = os.stat(csv_path).st_ino
+    # Same inode and a longer file, but the bytes already read changed
+    with open(csv_path, "r+", encoding="utf-8") as f:
+        f.write(HEADER + row(7) + row(8) + row(9))
+    touch(csv_path, 1)
+    assert os.stat(csv_path).st_ino == inode
+    assert urls(store) == ["9", "8", "7"]
+    assert store.full_reloads == 2
+
+
+def test_scraper_rewrites_replace_the_file_atomically(tmp_path, monkeypatch):
+    for module in ("pandas", "bs4", "requests", "dotenv"):
+        pytest.importorskip(module)
+    import scape_market_news as scraper
+
+    path = tmp_path / "news.csv"
+    monkeypatch.setattr(scraper, "NEWS_CSV", str(path))
+    monkeypatch.setattr(scraper, "MAX_SAVED_ARTICLES", 3)
+
+    def article(n):
+        return {"Source": "ET", "English Title": f"Title {n}", "Marathi Title": f"शीर्षक {n}",
+                "URL": f"https://example.com/{n}", "Published": f"2025-01-01T10:00:{n:02d}"}
+
+    scraper.save_articles(scraper.load_saved_articles(), [article(1), article(2)])
+    store = NewsStore(str(path))
+    assert urls(store) == ["2", "1"]
+
+    # Fits: appended in place
+    inode = os.stat(path).st_ino
+    scraper.save_articles(scraper.load_saved_articles(), [article(3)])
+    touch(path, 1)
+    assert os.stat(path).st_ino == inode
+    assert urls(store) == ["3", "2", "1"]
+    assert store.incremental_reloads == 1
+
+    # Over the limit: rewritten through a temp file and a rename
+    scraper.save_articles(scraper.load_saved_articles(), [article(4)])
+    assert os.stat(path).st_ino != inode
+    assert sorted(os.listdir(tmp_path)) == ["news.csv"]
+    assert urls(store) == ["4", "3", "2"]
+    assert path.read_bytes().startswith(b"\xef\xbb\xbf")
@@ -0,0 +1,98 @@
+# test_pcr_view.py
+"""PCRView queries: PCR ranges, symbol prefixes, offset and cursor pagination in both orders"""
+
+import random
+
+import pytest
+
+from pagination import InvalidCursor
+from pcr_view import PCRView, ORDERS
+
+SYMBOLS = ["NIFTY", "BANKNIFTY", "FINNIFTY", "TCS", "TATAMOTORS", "TATASTEEL", "INFY", "SBIN", "SBICARD"]
+
+
+@pytest.fixture(scope="module")
+def view():
+    rng = random.Random(7)
+    items = []
+    for i in range(200):
+        name = rng.choice(SYMBOLS)
+        # Rounded so many rows share a PCR and ties fall back to tradingSymbol
+        items.append({"name": name, "tradingSymbol": f"{name}{i:03d}", "pcr": round(rng.uniform(0.2, 2.0), 1)})
+    payload = {"status": "ok", "exchange": "NSE", "data": items}
+    return PCRView.build(payload, lambda items: [item["name"] for item in items])
+
+
+def expected(view, order, min_pcr=None, max_pcr=None, prefix=None):
+    rows = [
+        row for row in view.rows
+        if (min_pcr is None or row["pcr"] >= min_pcr)
+        and (max_pcr is None or row["pcr"] <= max_pcr)
+        and (not prefix or row["symbol"].startswith(prefix))
+    ]
+    return rows if order == "asc" else rows[::-1]
+
+
+FILTERS = [
+    {},
+    {"min_pcr": 0.8, "max_pcr": 1.2},
+    {"prefix": "TATA"},
+    {"prefix": "SBI", "min_pcr": 0.5},
+    {"prefix": "NIFTY", "max_pcr": 1.0},
+    {"prefix": "ZZZ"},
+]
+
+
+def test_rows_are_sorted_by_pcr_then_trading_symbol(view):
+    keys = [(row["pcr"], row["tradingSymbol"]) for row in view.rows]
+    assert keys == sorted(keys)
+    assert view.min_pcr == keys[0][0] and view.max_pcr == keys[-1][0]
+
+
+@pytest.mark.parametrize("order", ORDERS)
+@pytest.mark.parametrize("filters", FILTERS)
+def test_offset_pages_match_a_full_scan(view, order, filters):
+    want = expected(view, order, **filters)
+    for offset in (0, 7, len(want) - 3, len(want) + 5):
+        rows, matched, _ = view.query(order=order, limit=10, offset=max(0, offset), **filters)
+        assert matched == len(want)
+        assert rows == want[max(0, offset):max(0, offset) + 10]
+
+
+@pytest.mark.parametrize("order", ORDERS)
+@pytest.mark.parametrize("filters", FILTERS)
+def test_cursor_pages_walk_every_row_once(view, order, filters):
+    want = expected(view, order, **filters)
+    seen, cursor = [], None
+    while True:
+        rows, matched, cursor = view.query(order=order, limit=9, cursor=cursor, **filters)
+        assert matched == len(want)
+        seen.extend(rows)
+        if cursor is None:
+            break
+    assert seen == want
+
+
+@pytest.mark.parametrize("order", ORDERS)
+def test_cursor_combines_with_offset(view, order):
+    want = expected(view, order, prefix="TATA")
+    _, _, cursor = view.query(order=order, limit=5, prefix="TATA")
+    rows, _, _ = view.query(order=order, limit=5, offset=3, cursor=cursor, prefix="TATA")
+    assert rows == want[8:13]
+
+
+def test_last_page_has_no_cursor(view):
+    want = expected(view, "asc", prefix="INFY")
+    rows, _, cursor = view.query(order="asc", limit=len(want), prefix="INFY")
+    assert rows == want and cursor is None
+
+
+def test_bad_cursor_is_rejected(view):
+    with pytest.raises(InvalidCursor):
+        view.query(cursor="not-a-cursor")
+
+
+def test_build_skips_unusable_payloads():
+    assert PCRView.build({"status": "error"}, lambda items: []) is None
+    empty = PCRView.build({"status": "ok", "data": []}, lambda items: [])
+    assert empty.query() == ([], 0, None)
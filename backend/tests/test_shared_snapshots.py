@@ -0,0 +1,88 @@
+# test_shared_snapshots.py
+"""Loader / reader hand-off of shared_snapshots through mapped files"""
+
+import os
+import json
+
+import pytest
+
+from data_writer import write_json_atomic
+from index_history import IndexHistory, append_snapshot
+from shared_snapshots import SharedSnapshots, fcntl
+from snapshot_store import SnapshotStore
+
+pytestmark = pytest.mark.skipif(fcntl is None, reason="loader election needs fcntl")
+
+
+@pytest.fixture
+def workers(tmp_path):
+    data_dir = tmp_path / "data"
+    history_dir = data_dir / "history"
+    shm_dir = tmp_path / "shm"
+    data_dir.mkdir()
+    shm_dir.mkdir()
+    write_json_atomic(str(data_dir / "index_quotes.json"), {"NIFTY": {"status": "ok", "price": 100.0}})
+    for ts in range(1000, 1010):
+        append_snapshot({"NIFTY": {"status": "ok", "price": float(ts)}}, ts=ts, directory=str(history_dir))
+
+    started = []
+
+    def worker():
+        shared = SharedSnapshots(
+            store=SnapshotStore(str(data_dir), poll_interval=0.05),
+            history=IndexHistory(str(history_dir), poll_interval=0.05),
+            prefix="test", directory=str(shm_dir), enabled=True, poll_interval=0.05, wait=1,
+        )
+        shared.start()
+        started.append(shared)
+        return shared
+
+    yield worker, data_dir, shm_dir
+    for shared in reversed(started):
+        shared.stop()
+
+
+def test_reader_serves_the_loaders_snapshot_and_maps_history(workers):
+    worker, data_dir, shm_dir = workers
+    loader, reader = worker(), worker()
+    assert (loader.role, reader.role) == ("loader", "reader")
+
+    ours, theirs = loader.store.get("index_quotes.json"), reader.store.get("index_quotes.json")
+    assert theirs.data == ours.data
+    assert (theirs.version, theirs.digest) == (ours.version, ours.digest)
+
+    ts, price = reader.history.points("NIFTY")
+    assert ts.tolist() == list(range(1000, 1010))
+    assert price[-1] == 1009.0
+    # Viewed in place from the read-only mapping, not copied
+    assert not ts.flags.writeable and not ts.flags.owndata
+
+    write_json_atomic(str(data_dir / "index_quotes.json"), {"NIFTY": {"status": "ok", "price": 101.0}})
+    loader.store.check()
+    reader._follow()
+    assert reader.store.get("index_quotes.json").version == loader.store.get("index_quotes.json").version
+    assert reader.store.get("index_quotes.json").data["NIFTY"]["price"] == 101.0
+
+
+def test_files_have_stable_names_and_leave_with_the_loader(workers):
+    worker, data_dir, shm_dir = workers
+    loader = worker()
+    names = sorted(os.listdir(shm_dir))
+    assert names == ["test-history-NIFTY", "test-manifest", "test-snapshot-index_quotes.json"]
+
+    # A republish replaces the file under the same name
+    write_json_atomic(str(data_dir / "index_quotes.json"), {"NIFTY": {"status": "ok", "price": 101.0}})
+    loader.store.check()
+    assert sorted(os.listdir(shm_dir)) == names
+    with open(shm_dir / "test-snapshot-index_quotes.json", "rb") as f:
+        assert json.loads(f.read()[8:]) == {"NIFTY": {"status": "ok", "price": 101.0}}
+
+    loader.stop()
+    assert os.listdir(shm_dir) == []
+
+
+def test_new_loader_removes_files_it_does_not_publish(workers):
+    worker, data_dir, shm_dir = workers
+    (shm_dir / "test-history-GONE").write_bytes(b"\0" * 8)
+    worker()
+    assert "test-history-GONE" not in os.listdir(shm_dir)
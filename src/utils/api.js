@@ -356,7 +356,7 @@ export const newsAPI = {
           source: a.source || 'Unknown',
           url: a.url || '#',
           category: 'Market Update',
-          publishedAt: new Date().toISOString(),
+          publishedAt: a.published_at || new Date().toISOString(),
         }));
         if (normalized.length > 0) {
           setCachedData(cacheKey, normalized);